@@ -0,0 +1,775 @@
+import os
+import re
+import sys
+import gzip
+import time
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from translate import (
+    load_config,
+    chunk_token_budget,
+    estimate_tokens,
+    create_translation_memory,
+    create_translation_manifest,
+    create_man_installer,
+    record_manifest,
+    create_run_metrics,
+    write_run_metrics,
+    get_translation_service,
+    get_service_scheduler,
+    translate_worker,
+    SingleFlightCache,
+    TranslationQueue,
+)
+from incremental import load_sidecar, save_sidecar, plan_segments
+from translation_memory import content_digest
+from roff import VERBATIM_REGIONS, is_roff, macro_name
+
+# 翻译后的 man 文件目录（与 translate_man.sh 保持一致）
+TRANSLATED_DIR = "/usr/local/share/man/zh_CN"
+# 至少出现在这么多个手册页中的翻译单元作为共享段落，整批只翻译一次
+MIN_SHARED_PAGES = 2
+# 共享段落在手册页内容块中的占位行（roff 注释，屏蔽格式标记时原样保留）
+SHARED_MARKER = '.\\" manzh-shared {}'
+SHARED_MARKER_PATTERN = re.compile(r'^\.\\" manzh-shared ([0-9a-f]+)$', re.MULTILINE)
+
+
+class ManPage:
+    """待翻译的单个手册页"""
+
+    def __init__(self, name, section, loader, source_path=None):
+        """
+        Args:
+            name: 手册页名称
+            section: 章节号
+            loader: 无参函数，返回手册页的原文内容
+            source_path: 原文文件路径，记入译文清单用于检查译文是否过期
+        """
+        self.name = name
+        self.section = str(section)
+        self.loader = loader
+        self.source_path = source_path
+        self.queue = None
+        self.units = None
+        self.plan = None
+        self.output_path = None
+        self.pending = 0
+        self.failed = False
+
+    def __repr__(self):
+        return f"{self.name}({self.section})"
+
+
+def render_man_page(name, section=None):
+    """
+    获取格式化后的手册页文本（等价于 translate_man.sh 中的 man <命令> | col -b）
+
+    Args:
+        name: 手册页名称
+        section: 可选的章节号
+
+    Returns:
+        str: 手册页文本
+
+    Raises:
+        RuntimeError: 当手册页不存在时
+    """
+    command = ["man", str(section), name] if section else ["man", name]
+    man = subprocess.run(command, capture_output=True)
+    if man.returncode != 0 or not man.stdout.strip():
+        raise RuntimeError(f"未找到手册页: {name}" + (f"（章节 {section}）" if section else ""))
+
+    col = subprocess.run(["col", "-b"], input=man.stdout, capture_output=True)
+    text = col.stdout if col.returncode == 0 else man.stdout
+    return text.decode("utf-8", errors="replace")
+
+
+def read_roff_source(path):
+    """
+    读取 roff 源文件（支持 .gz 压缩）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        str: 文件内容
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return f.read().decode("utf-8", errors="replace")
+
+
+def locate_man_page(name, section=None):
+    """
+    查找手册页的源文件（man -w）
+
+    Args:
+        name: 手册页名称
+        section: 可选的章节号
+
+    Returns:
+        str: 源文件路径，找不到时返回 None
+    """
+    command = ["man", "-w", str(section), name] if section else ["man", "-w", name]
+    located = subprocess.run(command, capture_output=True, text=True)
+    path = located.stdout.strip().split("\n")[0] if located.returncode == 0 else ""
+    return path if path and os.path.isfile(path) else None
+
+
+def read_man_page(name, section=None, path=None):
+    """
+    获取手册页内容：优先读取 roff 源文件（格式标记保留在本地，只翻译正文），
+    源文件不可用或为 .so 重定向时使用格式化后的文本
+
+    Args:
+        name: 手册页名称
+        section: 可选的章节号
+        path: 已知的源文件路径，默认通过 man -w 查找
+
+    Returns:
+        str: 手册页内容
+
+    Raises:
+        RuntimeError: 当手册页不存在时
+    """
+    if path is None:
+        path = locate_man_page(name, section)
+    if path and os.path.isfile(path):
+        try:
+            content = read_roff_source(path)
+        except OSError:
+            content = ""
+        if is_roff(content) and not content.lstrip().startswith(".so "):
+            return content
+    return render_man_page(name, section)
+
+
+def split_page_filename(filename):
+    """
+    从手册文件名中解析名称和章节，如 ls.1.gz -> ("ls", "1")
+
+    Returns:
+        tuple: (名称, 章节)，无法解析时返回 None
+    """
+    if filename.endswith(".gz"):
+        filename = filename[:-3]
+    name, dot, section = filename.rpartition(".")
+    if not dot or not name or not section or not section[0].isdigit():
+        return None
+    return name, section
+
+
+def pages_from_commands(commands):
+    """根据命令名称列表生成手册页（保存到 man1，与 translate_man.sh 一致）"""
+    pages = []
+    for cmd in commands:
+        path = locate_man_page(cmd)
+        pages.append(ManPage(cmd, "1", lambda cmd=cmd, path=path: read_man_page(cmd, path=path),
+                             source_path=path))
+    return pages
+
+
+def pages_from_section(section):
+    """
+    列出 MANPATH 中某一章节的全部手册页
+
+    Args:
+        section: 章节号
+
+    Returns:
+        list: ManPage 列表
+    """
+    manpath = subprocess.run(["manpath"], capture_output=True, text=True).stdout.strip()
+    if not manpath:
+        manpath = os.environ.get("MANPATH", "/usr/share/man:/usr/local/share/man")
+
+    pages = {}
+    for root in manpath.split(":"):
+        section_dir = os.path.join(root, f"man{section}")
+        if not os.path.isdir(section_dir) or root.rstrip("/") == TRANSLATED_DIR:
+            continue
+        for filename in sorted(os.listdir(section_dir)):
+            parsed = split_page_filename(filename)
+            if parsed and parsed[0] not in pages:
+                name, page_section = parsed
+                path = os.path.join(section_dir, filename)
+                pages[name] = ManPage(
+                    name, page_section,
+                    lambda name=name, s=page_section, path=path: read_man_page(name, s, path),
+                    source_path=path
+                )
+    return list(pages.values())
+
+
+def pages_from_directory(directory):
+    """
+    列出目录中的 roff 源文件（如 man1/ls.1 或 ls.1.gz）
+
+    Args:
+        directory: 源文件目录，递归扫描
+
+    Returns:
+        list: ManPage 列表
+    """
+    pages = []
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            parsed = split_page_filename(filename)
+            if parsed:
+                path = os.path.join(root, filename)
+                pages.append(ManPage(parsed[0], parsed[1], lambda path=path: read_roff_source(path),
+                                     source_path=path))
+    return pages
+
+
+def normalize_unit(unit):
+    """
+    规范化翻译单元用于跨页面去重：去掉首尾空行和行尾空白，合并行内连续空白，
+    保留换行和行首缩进；原样保留的区域（.nf、.EX、表格等）中的行只去掉行尾空白，
+    行内空白有意义
+
+    Args:
+        unit: 翻译单元
+
+    Returns:
+        str: 去重键
+    """
+    lines = []
+    region_end = None  # 与 split_roff_units 相同，区域不会跨越翻译单元
+    for line in unit.strip("\n").split("\n"):
+        line = line.rstrip()
+        name = macro_name(line)
+        if region_end is None:
+            body = line.lstrip()
+            line = line[:len(line) - len(body)] + " ".join(body.split())
+            region_end = VERBATIM_REGIONS.get(name)
+        elif name == region_end or (region_end == '..' and line.strip() == '..'):
+            region_end = None
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def page_output_path(page, output_dir):
+    """
+    获取手册页译文的保存路径
+
+    Returns:
+        str: 保存路径，如 <output_dir>/man1/ls.1
+    """
+    return os.path.join(output_dir, f"man{page.section}", f"{page.name}.{page.section}")
+
+
+def save_page(page, content, installer):
+    """
+    保存翻译后的手册页（按安装器的设置压缩并原子替换）
+
+    Returns:
+        str: 实际保存的路径，如 <output_dir>/man1/ls.1.gz
+    """
+    return installer.install(page.output_path, content + "\n")
+
+
+class BatchTranslator:
+    """
+    批量翻译调度器
+
+    所有手册页的所有块进入同一个线程池，共享翻译服务、缓存、翻译记忆和并发上限；
+    某个手册页的全部块完成后立即写入磁盘。使用完毕后调用 close（或使用 with 语句）
+    关闭翻译记忆和译文清单。
+
+    提交前先拆分全部手册页并统计翻译单元：在多个 roff 手册页中重复出现的单元（如
+    "display this help and exit" 选项、固定的 REPORTING BUGS 段落）在各手册页的内容块中
+    替换为占位行，所有不重复的共享单元合并成块单独翻译一次，保存手册页时再把译文填回。
+    """
+
+    def __init__(self, config, output_dir=TRANSLATED_DIR, max_workers=None, incremental=True,
+                 metrics=None, dedup=True, readonly=False):
+        if max_workers is None:
+            # 实际并发由服务调度器自适应控制，线程数取其上限
+            max_workers = get_service_scheduler(config).max_concurrency
+        if max_workers <= 0:
+            raise ValueError("max_workers 必须大于 0")
+
+        self.config = config
+        self.output_dir = output_dir
+        self.incremental = incremental
+        self.dedup = dedup
+        self.shared_units = {}  # 去重键 -> (占位标识, 共享单元的规范内容)
+        self.shared_translations = {}  # 占位标识 -> 译文
+        self.shared_occurrences = 0
+        self.shared_pending = 0  # 未完成的共享段落块数
+        self.deferred_pages = []  # 等待共享段落译文的手册页
+        self.max_workers = max_workers
+        self.chunk_size = chunk_token_budget(config)
+        self.cache = SingleFlightCache()
+        self.readonly = readonly
+        if readonly:
+            # 只做容量估算（plan）：只读打开翻译记忆，不打开译文清单和安装器，不写入任何文件
+            self.memory = create_translation_memory(readonly=True)
+            self.manifest = None
+            self.installer = None
+        else:
+            self.memory = create_translation_memory()
+            self.manifest = create_translation_manifest()
+            # 每个手册页完成后立即安装，全部完成后只更新一次 man 索引
+            self.installer = create_man_installer(self.manifest)
+        self.metrics = metrics  # 可选的运行指标（RunMetrics）
+        self.service = None  # 开始翻译时创建，只做容量估算时无需创建服务
+        self.lock = threading.Lock()
+        self.pages_total = 0
+        self.pages_done = 0
+        self.pages_failed = []
+        self.chunks_total = 0
+        self.chunks_done = 0
+
+    def run(self, pages):
+        """
+        翻译全部手册页
+
+        Args:
+            pages: ManPage 列表
+
+        Returns:
+            dict: 运行统计（man 索引在 close 时统一更新）
+        """
+        if self.readonly:
+            raise RuntimeError("只读的 BatchTranslator 只能用于容量估算")
+        start_time = time.time()
+        self.pages_total = len(pages)
+        self.service = get_translation_service(self.config)
+
+        loaded, failed = self._load_pages(pages)
+        for page in failed:
+            self._finish_page(page, failed=True)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            if self.shared_units:
+                self._submit_shared_units(executor)
+            for page in loaded:
+                try:
+                    todo = self._plan_page(page)
+                except Exception as e:
+                    print(f"\n跳过 {page}：{str(e)}", file=sys.stderr)
+                    self._finish_page(page, failed=True)
+                    continue
+
+                if not todo:
+                    # 原文未改变，全部复用已有译文
+                    self._save_page(page)
+                    continue
+
+                page.pending = len(todo)
+                with self.lock:
+                    self.chunks_total += len(todo)
+                for i, chunk in todo:
+                    future = executor.submit(
+                        translate_worker, (i, chunk), self.config, page.queue, self.service,
+                        submitted_at=time.monotonic()
+                    )
+                    future.add_done_callback(lambda f, page=page: self._chunk_done(page, f))
+
+        elapsed = max(time.time() - start_time, 1e-6)
+        stats = {
+            "pages": self.pages_done,
+            "failed_pages": len(self.pages_failed),
+            "chunks": self.chunks_done,
+            "shared_units": len(self.shared_units),
+            "shared_occurrences": self.shared_occurrences,
+            "elapsed": elapsed,
+            "pages_per_min": self.pages_done / elapsed * 60,
+            "chunks_per_sec": self.chunks_done / elapsed,
+        }
+        return stats
+
+    def close(self):
+        """更新尚未更新的 man 索引，关闭翻译记忆和译文清单"""
+        if self.installer is not None:
+            self.installer.close()
+        if self.manifest is not None:
+            self.manifest.close()
+        if self.memory is not None:
+            self.memory.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def plan(self, pages):
+        """
+        只拆分手册页、对比已有译文的记录并跨页面去重，不发送请求（供容量估算使用）
+
+        Args:
+            pages: ManPage 列表
+
+        Returns:
+            tuple: (需要翻译的 [(内容格式, 内容块)], 复用已有译文的块数, 成功读取的手册页数)
+        """
+        loaded, _ = self._load_pages(pages)
+        chunks = []
+        if self.shared_units:
+            chunks = [('roff', chunk) for chunk in self._shared_chunks(self._shared_queue())]
+        reused = 0
+        for page in loaded:
+            try:
+                todo = self._plan_page(page)
+            except Exception as e:
+                print(f"跳过 {page}：{str(e)}", file=sys.stderr)
+                continue
+            reused += len(page.plan) - len(todo)
+            chunks.extend((page.queue.content_format, chunk) for _, chunk in todo)
+        return chunks, reused, len(loaded)
+
+    def _load_pages(self, pages):
+        """
+        读取并拆分手册页，启用去重时统计跨页面的共享段落
+
+        Returns:
+            tuple: (成功读取的手册页列表, 读取失败的手册页列表)
+        """
+        loaded = []
+        failed = []
+        for page in pages:
+            try:
+                content = page.loader()
+                page.queue = TranslationQueue(
+                    chunk_size=self.chunk_size,
+                    max_retries=3,
+                    memory=self.memory,
+                    cache=self.cache,
+                    show_progress=False,
+                    size_func=estimate_tokens,
+                )
+                page.queue.metrics = self.metrics
+                page.queue.document = str(page)
+                page.units = page.queue.split_units(content)
+            except Exception as e:
+                print(f"\n跳过 {page}：{str(e)}", file=sys.stderr)
+                failed.append(page)
+                continue
+            loaded.append(page)
+
+        if self.dedup:
+            self._find_shared_units(loaded)
+            if self.shared_units:
+                print(f"跨页面去重：{len(self.shared_units)} 个重复段落，"
+                      f"共出现 {self.shared_occurrences} 次", file=sys.stderr)
+        return loaded, failed
+
+    def _unit_key(self, page, unit):
+        return page.queue.content_format, normalize_unit(unit)
+
+    def _find_shared_units(self, pages):
+        """
+        统计所有 roff 手册页的翻译单元，找出在多个手册页中出现的单元
+
+        纯文本内容没有可在译文中保留的占位行，不参与去重。
+        """
+        page_counts = {}
+        canonical = {}
+        for page in pages:
+            if page.queue.content_format != 'roff':
+                continue
+            keys = set()
+            for unit in page.units:
+                key = self._unit_key(page, unit)
+                canonical.setdefault(key, unit)
+                keys.add(key)
+            for key in keys:
+                page_counts[key] = page_counts.get(key, 0) + 1
+
+        self.shared_units = {}
+        for key, count in page_counts.items():
+            if count >= MIN_SHARED_PAGES:
+                self.shared_units[key] = (content_digest(key[1])[:16], canonical[key])
+        self.shared_occurrences = sum(
+            1 for page in pages if page.queue.content_format == 'roff'
+            for unit in page.units if self._unit_key(page, unit) in self.shared_units
+        )
+
+    def _mark_shared(self, page, unit):
+        """共享单元替换为占位行，其余单元保持不变"""
+        shared = self.shared_units.get(self._unit_key(page, unit))
+        return SHARED_MARKER.format(shared[0]) if shared else unit
+
+    def _group_units(self, page, units):
+        """
+        按替换共享单元后的大小分组（共享单元只占一行），返回原始单元的分组
+
+        Args:
+            page: 手册页
+            units: 翻译单元列表
+
+        Returns:
+            list: 翻译单元分组列表
+        """
+        groups = []
+        position = 0
+        for group in page.queue.group_units([self._mark_shared(page, u) for u in units]):
+            groups.append(units[position:position + len(group)])
+            position += len(group)
+        return groups
+
+    def _shared_queue(self):
+        """共享段落块使用的翻译队列，译文交给 _shared_result 处理"""
+        queue = TranslationQueue(
+            chunk_size=self.chunk_size,
+            max_retries=3,
+            memory=self.memory,
+            cache=self.cache,
+            show_progress=False,
+            size_func=estimate_tokens,
+            result_handler=self._shared_result,
+        )
+        queue.content_format = 'roff'
+        queue.separator = '\n'
+        queue.metrics = self.metrics
+        queue.document = "shared"
+        return queue
+
+    def _shared_chunks(self, queue):
+        """每个共享单元前加上占位行，按块大小合并为内容块"""
+        units = [SHARED_MARKER.format(marker) + "\n" + unit
+                 for marker, unit in sorted(self.shared_units.values())]
+        return queue.pack_units(units)
+
+    def _submit_shared_units(self, executor):
+        """
+        提交共享段落的翻译：每个单元前加上占位行，按块大小合并，
+        译文按占位行拆分回各单元
+        """
+        queue = self._shared_queue()
+        chunks = self._shared_chunks(queue)
+        queue.total_chunks = len(chunks)
+        self.shared_pending = len(chunks)
+        with self.lock:
+            self.chunks_total += len(chunks)
+        for i, chunk in enumerate(chunks):
+            future = executor.submit(
+                translate_worker, (i, chunk), self.config, queue, self.service,
+                submitted_at=time.monotonic()
+            )
+            future.add_done_callback(self._shared_chunk_done)
+
+    def _shared_result(self, index, result):
+        """按占位行拆分共享段落块的译文"""
+        parts = SHARED_MARKER_PATTERN.split(result)
+        translations = dict(zip(parts[1::2], (part.strip("\n") for part in parts[2::2])))
+        with self.lock:
+            self.shared_translations.update(translations)
+
+    def _shared_chunk_done(self, future):
+        """共享段落块完成回调，全部完成后保存等待中的手册页"""
+        try:
+            future.result()
+        except Exception as e:
+            print(f"\n共享段落翻译出错：{str(e)}", file=sys.stderr)
+
+        with self.lock:
+            self.chunks_done += 1
+            self.shared_pending -= 1
+            if self.shared_pending > 0:
+                return
+            pages, self.deferred_pages = self.deferred_pages, []
+
+        for page in pages:
+            self._save_page(page)
+
+    def _expand_shared(self, text):
+        """
+        将译文中的共享段落占位行替换为共享段落的译文
+
+        Raises:
+            RuntimeError: 当共享段落翻译失败时
+        """
+        def replace(match):
+            translation = self.shared_translations.get(match.group(1))
+            if translation is None:
+                raise RuntimeError("共享段落翻译失败")
+            return translation
+        return SHARED_MARKER_PATTERN.sub(replace, text)
+
+    def _plan_page(self, page):
+        """
+        为手册页生成翻译计划，已有译文时只翻译新增或修改的段落
+
+        Returns:
+            list: 需要翻译的 (块索引, 内容块) 列表
+        """
+        page.output_path = page_output_path(page, self.output_dir)
+        units, page.units = page.units, None
+        previous = (load_sidecar(page.output_path, self.config, page.queue.content_format)
+                    if self.incremental else [])
+        group_units = page.queue.group_units
+        if self.shared_units:
+            group_units = lambda run: self._group_units(page, run)
+        page.plan = plan_segments(units, previous, group_units)
+        page.queue.total_chunks = len(page.plan)
+
+        todo = []
+        for i, (segment_units, translation) in enumerate(page.plan):
+            if translation is None:
+                chunk_units = segment_units
+                if self.shared_units:
+                    chunk_units = [self._mark_shared(page, unit) for unit in segment_units]
+                todo.append((i, page.queue.join_units(chunk_units)))
+            else:
+                page.queue.add_result(i, translation)
+        return todo
+
+    def _save_page(self, page):
+        """保存手册页译文及增量翻译记录"""
+        try:
+            # 记录中保存填回共享段落后的完整译文，与原文单元一一对应
+            translations = [self._expand_shared(translation)
+                            for translation in page.queue.get_ordered_results()]
+            man_path = save_page(page, page.queue.separator.join(translations), self.installer)
+            save_sidecar(man_path, self.config, page.queue.content_format,
+                         [(segment_units, translation) for (segment_units, _), translation
+                          in zip(page.plan, translations)])
+            record_manifest(self.manifest, man_path, page.source_path, self.config,
+                            len(page.plan))
+            print(f"\n已保存：{man_path}", file=sys.stderr)
+            self._finish_page(page)
+        except Exception as e:
+            print(f"\n保存 {page} 失败：{str(e)}", file=sys.stderr)
+            self._finish_page(page, failed=True)
+
+    def _chunk_done(self, page, future):
+        """块完成回调，手册页的所有块完成后写入结果"""
+        try:
+            ok = future.result()
+        except Exception as e:
+            print(f"\n{page} 翻译出错：{str(e)}", file=sys.stderr)
+            ok = False
+
+        with self.lock:
+            self.chunks_done += 1
+            page.pending -= 1
+            if not ok:
+                page.failed = True
+            if page.pending > 0:
+                return
+
+        if page.failed or page.queue.failed_chunks:
+            self._finish_page(page, failed=True)
+            return
+
+        with self.lock:
+            if self.shared_pending > 0:
+                self.deferred_pages.append(page)
+                return
+        self._save_page(page)
+
+    def _finish_page(self, page, failed=False):
+        """记录手册页完成情况并更新进度"""
+        with self.lock:
+            if failed:
+                self.pages_failed.append(page)
+            else:
+                self.pages_done += 1
+            finished = self.pages_done + len(self.pages_failed)
+            print(f"\r批量翻译进度：{finished}/{self.pages_total} 页，"
+                  f"{self.chunks_done}/{self.chunks_total} 块", end="", file=sys.stderr)
+        # 释放已完成手册页的结果，避免整批结果常驻内存
+        page.queue = None
+        page.units = None
+        page.plan = None
+
+
+def plan_batch(pages, args):
+    """估算批量翻译的用量和耗时（只读取一次手册页），结果输出到标准输出"""
+    # planner 依赖 translate，在需要时才导入
+    from planner import configured_services, format_plan, plan_service
+
+    for page in pages:
+        try:
+            content = page.loader()
+        except Exception:
+            continue  # 读取失败的手册页在估算时跳过并提示
+        page.loader = lambda content=content: content
+
+    if args.service:
+        services = [(args.service, load_config(service_name=args.service))]
+    else:
+        services = configured_services()
+    for name, config in services:
+        with BatchTranslator(config, output_dir=args.output_dir, max_workers=args.workers,
+                             incremental=not args.no_incremental, dedup=not args.no_dedup,
+                             readonly=True) as translator:
+            chunks, reused, loaded = translator.plan(pages)
+            print(format_plan(plan_service(name, config, chunks, reused=reused, pages=loaded,
+                                           memory=translator.memory, max_workers=args.workers)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量翻译 man 手册")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("commands", nargs="*", default=[], help="要翻译的命令名称列表")
+    source.add_argument("-s", "--section", help="翻译 MANPATH 中指定章节的全部手册页")
+    source.add_argument("-d", "--dir", help="翻译目录中的 roff 源文件")
+    parser.add_argument("-o", "--output-dir", default=TRANSLATED_DIR, help="译文保存目录")
+    parser.add_argument("-j", "--workers", type=int,
+                        help="全局线程数上限（默认使用服务配置的 max_concurrency）")
+    parser.add_argument("--service", help="使用的翻译服务名称（默认使用 default_service）")
+    parser.add_argument("--no-incremental", action="store_true",
+                        help="忽略已有译文的记录，完整重新翻译")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="不进行跨页面的重复段落去重")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="将每个块的耗时、重试和 token 用量追加到 JSON Lines 文件")
+    parser.add_argument("--plan", action="store_true",
+                        help="不发送请求，估算块数、token 用量、缓存命中率和耗时"
+                             "（未指定 --service 时估算每个已配置的服务）")
+    args = parser.parse_args()
+
+    if args.section:
+        pages = pages_from_section(args.section)
+    elif args.dir:
+        pages = pages_from_directory(args.dir)
+    else:
+        pages = pages_from_commands(args.commands)
+
+    if not pages:
+        print("没有找到需要翻译的手册页", file=sys.stderr)
+        sys.exit(1)
+
+    if args.plan:
+        plan_batch(pages, args)
+        return
+
+    config = load_config(service_name=args.service)
+    metrics = create_run_metrics(config, mode="batch", path=args.metrics)
+    with BatchTranslator(config, output_dir=args.output_dir, max_workers=args.workers,
+                         incremental=not args.no_incremental, metrics=metrics,
+                         dedup=not args.no_dedup) as translator:
+        print(f"共 {len(pages)} 个手册页，使用 {translator.max_workers} 个线程进行翻译...",
+              file=sys.stderr)
+
+        try:
+            stats = translator.run(pages)
+        finally:
+            write_run_metrics(metrics)
+
+    print(file=sys.stderr)
+    print(f"完成 {stats['pages']} 页（失败 {stats['failed_pages']} 页），"
+          f"共 {stats['chunks']} 块，用时 {stats['elapsed']:.1f} 秒", file=sys.stderr)
+    print(f"吞吐量：{stats['pages_per_min']:.1f} 页/分钟，"
+          f"{stats['chunks_per_sec']:.2f} 块/秒", file=sys.stderr)
+
+    if translator.pages_failed:
+        print(f"以下手册页翻译失败：{', '.join(map(str, translator.pages_failed))}",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n翻译被用户中断", file=sys.stderr)
+        sys.exit(1)
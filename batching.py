@@ -0,0 +1,208 @@
+import json
+import threading
+
+# 批量请求的附加说明：输入为 JSON 字符串数组，要求按相同顺序和数量输出
+BATCH_PROMPT_NOTE = """
+
+本次输入是一个 JSON 字符串数组，每个元素是一段相互独立的文本：
+1. 按上述规则逐个翻译每个元素，不要合并、拆分或省略元素
+2. 只输出一个 JSON 字符串数组，元素个数和顺序与输入完全一致，不要输出其他内容"""
+
+
+class BatchMismatchError(ValueError):
+    """批量请求的返回结果无法解析，或段数与请求不一致"""
+
+
+def pack_segments(segments):
+    """
+    将多个片段编码为批量请求的内容
+
+    Args:
+        segments: 文本片段列表
+
+    Returns:
+        str: JSON 字符串数组
+    """
+    return json.dumps(segments, ensure_ascii=False, indent=0)
+
+
+def unpack_segments(text, count):
+    """
+    解析批量请求的返回结果
+
+    Args:
+        text: 服务返回的文本（可带有 ``` 代码块标记或前后说明）
+        count: 期望的片段数
+
+    Returns:
+        list: 译文列表
+
+    Raises:
+        BatchMismatchError: 无法解析为字符串数组或片段数不一致时
+    """
+    start = text.find('[')
+    end = text.rfind(']')
+    if start == -1 or end < start:
+        raise BatchMismatchError("批量译文不是 JSON 数组")
+    try:
+        segments = json.loads(text[start:end + 1])
+    except ValueError as e:
+        raise BatchMismatchError(f"批量译文不是有效的 JSON：{str(e)}")
+    if not isinstance(segments, list) or not all(isinstance(s, str) for s in segments):
+        raise BatchMismatchError("批量译文不是字符串数组")
+    if len(segments) != count:
+        raise BatchMismatchError(f"批量译文段数不一致（请求 {count} 段，返回 {len(segments)} 段）")
+    if not all(s.strip() for s in segments):
+        raise BatchMismatchError("批量译文中存在空白片段")
+    return [s.strip() for s in segments]
+
+
+class _BatchItem:
+    def __init__(self, text, size, stats):
+        self.text = text
+        self.size = size
+        self.stats = stats
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.size = 0
+        self.ready = threading.Event()
+
+
+class RequestBatcher:
+    """
+    将多个小片段合并为一次批量请求
+
+    第一个加入批次的线程作为发送者，最多等待 max_wait 秒收集其他线程提交的片段，
+    批次达到 token 预算或片段数上限时立即发送；其余线程阻塞等待自己片段的译文。
+    返回结果的段数不一致（或出现 split_errors 中的其他错误）时把批次对半拆分重新请求，
+    直至退回单段请求。
+    """
+
+    def __init__(self, budget, size_func=len, max_wait=0.02, max_segments=32,
+                 split_errors=(BatchMismatchError,)):
+        """
+        Args:
+            budget: 每个批量请求的输入大小上限（按 size_func 度量）
+            size_func: 片段大小度量函数
+            max_wait: 发送者等待其他片段加入的最长时间（秒）
+            max_segments: 每个批量请求的最大片段数
+            split_errors: 需要拆分批次重试的异常类型
+
+        Raises:
+            ValueError: 当参数无效时
+        """
+        if budget <= 0:
+            raise ValueError("budget 必须大于 0")
+        if max_wait < 0:
+            raise ValueError("max_wait 不能小于 0")
+        if max_segments < 2:
+            raise ValueError("max_segments 至少为 2")
+
+        self.budget = budget
+        self.size_func = size_func
+        self.max_wait = max_wait
+        self.max_segments = max_segments
+        self.split_errors = split_errors
+        self.lock = threading.Lock()
+        self.batches = {}  # 批次标识 -> 正在收集的批次
+
+    def accepts(self, text):
+        """
+        片段是否适合合并发送（不超过预算的一半，否则合并后没有空间容纳其他片段）
+
+        Args:
+            text: 文本片段
+
+        Returns:
+            bool: 是否适合批量发送
+        """
+        return self.size_func(text) * 2 <= self.budget
+
+    def submit(self, key, text, send_batch, send_single, stats=None):
+        """
+        提交片段并等待译文
+
+        Args:
+            key: 批次标识，只有标识相同（同一服务、同一提示词）的片段会合并
+            text: 文本片段
+            send_batch: 批量发送函数 send_batch(texts, usage) -> 译文列表，
+                        段数不一致时抛出 BatchMismatchError
+            send_single: 单段发送函数 send_single(text, usage) -> 译文
+            stats: 可选的块指标，写入按输入大小分摊的 token 用量（usage 中以 _tokens 结尾的项，
+                   其余项原样复制）和批次大小（batch_size）
+
+        Returns:
+            str: 译文
+
+        Raises:
+            Exception: 片段所在请求失败时抛出该请求的异常
+        """
+        item = _BatchItem(text, self.size_func(text), stats)
+        with self.lock:
+            batch = self.batches.get(key)
+            if batch is not None and (batch.size + item.size > self.budget
+                                      or len(batch.items) >= self.max_segments):
+                # 当前批次放不下，立即发送并开始新的批次
+                del self.batches[key]
+                batch.ready.set()
+                batch = None
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self.batches[key] = batch
+            batch.items.append(item)
+            batch.size += item.size
+            if len(batch.items) >= self.max_segments or batch.size >= self.budget:
+                del self.batches[key]
+                batch.ready.set()
+
+        if leader:
+            batch.ready.wait(self.max_wait)
+            with self.lock:
+                if self.batches.get(key) is batch:
+                    del self.batches[key]
+            self._dispatch(batch.items, send_batch, send_single)
+
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _dispatch(self, items, send_batch, send_single):
+        """发送一组片段，段数不一致时对半拆分重试"""
+        usage = {}
+        try:
+            if len(items) == 1:
+                results = [send_single(items[0].text, usage)]
+            else:
+                results = send_batch([item.text for item in items], usage)
+        except Exception as e:
+            if isinstance(e, self.split_errors) and len(items) > 1:
+                middle = len(items) // 2
+                self._dispatch(items[:middle], send_batch, send_single)
+                self._dispatch(items[middle:], send_batch, send_single)
+                return
+            for item in items:
+                item.error = e
+                item.done.set()
+            return
+
+        total = sum(item.size for item in items) or 1
+        for item, result in zip(items, results):
+            if item.stats is not None:
+                item.stats.batch_size = len(items)
+                for field, value in usage.items():
+                    if field == 'warnings' and item is not items[0]:
+                        # 警告只由第一个片段的翻译线程输出一次
+                        continue
+                    if value is not None and field.endswith('_tokens'):
+                        value = round(value * item.size / total)
+                    item.stats.usage[field] = value
+            item.result = result
+            item.done.set()
@@ -0,0 +1,61 @@
+"""
+连接复用基准测试
+
+对比每块新建服务实例（每块一个新的 Session 和连接）与进程内共享服务实例
+（复用连接池和长连接）时的单块延迟。
+
+用法：
+    python3 benchmarks/bench_connection_reuse.py [--chunks 200] [--workers 4] [--latency 0.005]
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translate import create_translation_service, get_translation_service  # noqa: E402
+from mock_server import MockOpenAIServer, mock_service_config  # noqa: E402
+
+
+def run(get_service, config, chunks, workers):
+    """以指定的服务获取方式翻译 chunks 个块，返回每块耗时列表"""
+    def one(i):
+        start = time.perf_counter()
+        get_service(config).translate(f"chunk {i}: display this help and exit", "system")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(one, range(chunks)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="连接复用基准测试")
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.005, help="模拟服务的固定延迟（秒）")
+    args = parser.parse_args()
+
+    report = {}
+    for name, get_service in (("per_chunk_service", create_translation_service),
+                              ("shared_service", get_translation_service)):
+        with MockOpenAIServer(latency=args.latency) as server:
+            config = mock_service_config(server.url, max_concurrency=args.workers)
+            latencies = run(get_service, config, args.chunks, args.workers)
+            report[name] = {
+                "mean_ms": statistics.mean(latencies) * 1000,
+                "p50_ms": statistics.median(latencies) * 1000,
+                "connections": server.connections,
+                "requests": server.requests,
+            }
+
+    saved = report["per_chunk_service"]["mean_ms"] - report["shared_service"]["mean_ms"]
+    report["saved_per_chunk_ms"] = saved
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
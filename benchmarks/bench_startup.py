@@ -0,0 +1,127 @@
+"""
+冷启动耗时基准测试
+
+在新的解释器中导入 translate 并创建翻译服务，使用 python -X importtime 统计模块导入耗时，
+比较 ChatGPT / Ollama（OpenAI 兼容接口）与 Gemini 两条路径，以及在导入 translate 前
+先导入 Gemini SDK（服务实现按需导入之前的行为）作为基线。不会发送任何请求。
+
+用法：
+    python3 benchmarks/bench_startup.py --runs 5 --output startup.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+CHATGPT_CONFIG = {
+    "type": "chatgpt",
+    "api_key": "benchmark",
+    "url": "http://127.0.0.1:11434/v1/chat/completions",
+    "model": "qwen2.5:7b",
+    "language": "zh-CN",
+    "max_context_length": 8192,
+    "max_output_length": 4096,
+}
+GEMINI_CONFIG = dict(CHATGPT_CONFIG, type="gemini", model="gemini-pro")
+GEMINI_CONFIG.pop("url")
+
+SCENARIOS = {
+    "chatgpt": f"import translate; translate.create_translation_service({CHATGPT_CONFIG!r})",
+    "gemini": f"import translate; translate.create_translation_service({GEMINI_CONFIG!r})",
+    "baseline_eager_gemini_sdk": (
+        "import google.generativeai; import translate; "
+        f"translate.create_translation_service({CHATGPT_CONFIG!r})"
+    ),
+}
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 的输出
+
+    Returns:
+        tuple: (顶层导入总耗时（微秒）, 导入的模块数, {顶层模块: 累计耗时（微秒）})
+    """
+    top_level = {}
+    modules = 0
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_PATTERN.match(line)
+        if not match:
+            continue
+        modules += 1
+        # 缩进表示被其他模块导入，只累计顶层导入避免重复计算
+        if len(match.group(3)) == 1:
+            name = match.group(4)
+            top_level[name] = top_level.get(name, 0) + int(match.group(2))
+    return sum(top_level.values()), modules, top_level
+
+
+def measure(code, runs):
+    """
+    在新的解释器中多次执行代码
+
+    Args:
+        code: 要执行的代码
+        runs: 次数
+
+    Returns:
+        dict: 墙钟时间、导入耗时（取中位数）、模块数和耗时最多的顶层模块
+    """
+    wall_times = []
+    samples = []
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1", PYTHONWARNINGS="ignore")
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                cwd=ROOT, env=env, capture_output=True, text=True)
+        wall_times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"执行失败：{result.stderr.strip().splitlines()[-1:]}")
+        samples.append(parse_importtime(result.stderr))
+
+    # 模块明细取导入耗时为中位数的那次运行
+    samples.sort(key=lambda sample: sample[0])
+    total, modules, top_level = samples[len(samples) // 2]
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        "wall_ms": statistics.median(wall_times) * 1000,
+        "import_ms": total / 1000,
+        "modules": modules,
+        "slowest_imports_ms": {name: us / 1000 for name, us in slowest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每个场景的运行次数")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="只运行指定场景（可重复，默认全部）")
+    parser.add_argument("--output", help="结果 JSON 文件（默认输出到标准输出）")
+    args = parser.parse_args()
+
+    result = {"python": sys.version.split()[0], "runs": args.runs, "scenarios": {}}
+    for name in args.scenario or SCENARIOS:
+        try:
+            result["scenarios"][name] = measure(SCENARIOS[name], args.runs)
+        except RuntimeError as e:
+            # 未安装 Gemini SDK 时跳过相关场景
+            result["scenarios"][name] = {"error": str(e)}
+
+    report = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+本地模拟翻译服务
+
+提供与 ChatGPTService 期望格式一致的 /v1/chat/completions 接口，以及可注入
+GeminiService 的模拟模型，用于在不调用真实服务的情况下测量 translate.py 的性能。
+两者都支持可配置的延迟、抖动、延迟尖峰、429/5xx 错误注入和输出截断，以及流式响应
+（OpenAI 的 SSE 和 Gemini 的 stream=True）。
+"""
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FaultProfile:
+    """
+    模拟服务的延迟与故障配置
+
+    每个请求依次判定：限流（429）、服务端错误（5xx）、截断，其余正常返回。
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit_rate=0.0, error_rate=0.0,
+                 truncate_rate=0.0, retry_after=0.2, seed=None, slow_rate=0.0, slow_latency=0.0):
+        """
+        Args:
+            latency: 基础延迟（秒）
+            jitter: 延迟抖动幅度（秒），实际延迟在 latency ± jitter 内均匀分布
+            rate_limit_rate: 返回 429 的概率
+            error_rate: 返回 5xx 的概率
+            truncate_rate: 截断输出（finish_reason 为 length）的概率
+            retry_after: 429 响应中的 Retry-After 秒数
+            seed: 随机数种子
+            slow_rate: 延迟尖峰的概率（模拟服务降级）
+            slow_latency: 延迟尖峰时额外增加的延迟（秒）
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "rate_limited": 0, "errors": 0, "truncated": 0, "slow": 0}
+
+    def decide(self):
+        """
+        决定本次请求的结果并等待模拟延迟
+
+        Returns:
+            str: "rate_limited"、"error"、"truncated" 或 "ok"
+        """
+        with self.lock:
+            self.counts["requests"] += 1
+            roll = self.random.random()
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            if self.slow_rate and self.random.random() < self.slow_rate:
+                delay += self.slow_latency
+                self.counts["slow"] += 1
+            if roll < self.rate_limit_rate:
+                outcome = "rate_limited"
+            elif roll < self.rate_limit_rate + self.error_rate:
+                outcome = "errors"
+            elif roll < self.rate_limit_rate + self.error_rate + self.truncate_rate:
+                outcome = "truncated"
+            else:
+                outcome = "ok"
+            if outcome != "ok":
+                self.counts[outcome] += 1
+
+        # 限流响应立即返回
+        if outcome != "rate_limited" and delay:
+            time.sleep(delay)
+        return outcome
+
+
+def split_stream(text, parts=4):
+    """将译文拆分为若干段，模拟流式响应"""
+    size = max(len(text) // parts, 1)
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def fake_translation(content):
+    """模拟译文：原文的大写形式；批量请求（JSON 字符串数组）逐个元素转换"""
+    start = content.find("[")
+    if start != -1:
+        try:
+            segments = json.loads(content[start:])
+        except ValueError:
+            segments = None
+        if isinstance(segments, list) and all(isinstance(s, str) for s in segments):
+            return json.dumps([s.upper() for s in segments], ensure_ascii=False)
+    return content.upper()
+
+
+class MockOpenAIServer:
+    """
+    OpenAI 兼容的本地模拟服务
+
+    使用 HTTP/1.1 长连接，记录请求数和新建连接数。与 OpenAI 的自动前缀缓存一样，
+    系统提示词与之前的请求相同时在 usage 中报告命中缓存的 token 数。
+    """
+
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0, faults=None):
+        """
+        Args:
+            latency: 每个请求的固定延迟（秒），提供 faults 时忽略
+            host: 监听地址
+            port: 监听端口，0 表示自动分配
+            faults: FaultProfile 实例
+        """
+        self.faults = faults or FaultProfile(latency=latency)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.prefixes = set()  # 已出现过的系统提示词
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length))
+                with server.lock:
+                    server.requests += 1
+                status, headers, body = server.respond(payload)
+                if status == 200 and payload.get("stream"):
+                    self.send_stream(payload, body)
+                    return
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_stream(self, payload, body):
+                """以 SSE 分段返回译文（分块传输编码，保持长连接）"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def event(data):
+                    line = f"data: {data}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+                    self.wfile.flush()
+
+                choice = body["choices"][0]
+                for piece in split_stream(choice["message"]["content"]):
+                    event(json.dumps({"choices": [
+                        {"index": 0, "delta": {"content": piece}, "finish_reason": None}]}))
+                event(json.dumps({"choices": [
+                    {"index": 0, "delta": {}, "finish_reason": choice["finish_reason"]}]}))
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    event(json.dumps({"choices": [], "usage": body["usage"]}))
+                event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+    def respond(self, payload):
+        """
+        生成响应
+
+        Args:
+            payload: 请求体
+
+        Returns:
+            tuple: (HTTP 状态码, 额外响应头, 响应体)
+        """
+        outcome = self.faults.decide()
+        if outcome == "rate_limited":
+            return 429, {"Retry-After": str(self.faults.retry_after)}, {
+                "error": {"message": "Rate limit exceeded", "type": "rate_limit"}}
+        if outcome == "errors":
+            return 503, {}, {"error": {"message": "Service unavailable"}}
+
+        content = payload["messages"][-1]["content"]
+        prefix = "".join(message["content"] for message in payload["messages"][:-1])
+        with self.lock:
+            cached = prefix in self.prefixes
+            self.prefixes.add(prefix)
+        translated = fake_translation(content)
+        finish_reason = "stop"
+        if outcome == "truncated":
+            translated = translated[:len(translated) // 2]
+            finish_reason = "length"
+        return 200, {}, {
+            "choices": [{
+                "message": {"role": "assistant", "content": translated},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {
+                "prompt_tokens": (len(prefix) + len(content)) // 3,
+                "completion_tokens": len(translated) // 3,
+                "prompt_tokens_details": {"cached_tokens": len(prefix) // 3 if cached else 0},
+            },
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class ResourceExhausted(Exception):
+    """与 google.api_core.exceptions.ResourceExhausted 同名的模拟限流异常"""
+
+
+class ServiceUnavailable(Exception):
+    """模拟的 Gemini 服务端错误"""
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeGeminiResponse:
+    def __init__(self, text, finish_reason="STOP", prompt_tokens=0):
+        self.text = text
+        self.finish_reason = finish_reason
+        self.usage_metadata = FakeUsageMetadata(prompt_tokens, len(text) // 3)
+
+
+class FakeGeminiModel:
+    """
+    可注入 GeminiService 的模拟模型（GeminiService(config, model=FakeGeminiModel())）
+    """
+
+    def __init__(self, faults=None):
+        self.faults = faults or FaultProfile()
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        outcome = self.faults.decide()
+        if outcome == "rate_limited":
+            raise ResourceExhausted("429 Resource has been exhausted")
+        if outcome == "errors":
+            raise ServiceUnavailable("503 Service unavailable")
+
+        content = prompt.split("\n\n", 1)[-1] if isinstance(prompt, str) else str(prompt)
+        translated = fake_translation(content)
+        prompt_tokens = len(str(prompt)) // 3
+        finish_reason = "STOP"
+        if outcome == "truncated":
+            translated = translated[:len(translated) // 2]
+            finish_reason = "MAX_TOKENS"
+        if not stream:
+            return FakeGeminiResponse(translated, finish_reason, prompt_tokens)
+        # 流式响应：结束原因和用量只出现在最后一段
+        pieces = split_stream(translated)
+        return [FakeGeminiResponse(piece, None, prompt_tokens) for piece in pieces[:-1]] + \
+            [FakeGeminiResponse(pieces[-1], finish_reason, prompt_tokens)]
+
+
+def mock_service_config(url=None, **overrides):
+    """
+    生成指向模拟服务的服务配置
+
+    Args:
+        url: 模拟服务地址，为 None 时生成 Gemini 类型的配置
+        overrides: 覆盖的配置项
+
+    Returns:
+        dict: 服务配置
+    """
+    config = {
+        "type": "chatgpt" if url else "gemini",
+        "service": "mock",
+        "api_key": "mock",
+        "model": "mock-model",
+        "language": "zh-CN",
+        "max_context_length": 8192,
+        "max_output_length": 4096,
+    }
+    if url:
+        config["url"] = url
+    config.update(overrides)
+    return config
@@ -0,0 +1,238 @@
+"""
+翻译吞吐量基准测试
+
+使用本地模拟服务（OpenAI 兼容接口或注入 GeminiService 的模拟模型），
+让 TranslationQueue 和 translate_worker 翻译一批真实的 roff 手册页，
+输出机器可读的 JSON 结果：块/秒、块延迟和页面耗时的 p50/p95/p99、重试次数和总耗时。
+--pool 时再启动一个无故障的模拟服务，两者组成服务池（故障参数只作用于第一个服务），
+用于比较服务降级时对冲请求和故障转移的效果。
+
+用法：
+    python3 benchmarks/run_benchmark.py --corpus /usr/share/man/man1 --pages 50 \
+        --latency 0.2 --jitter 0.1 --rate-limit-rate 0.05 --error-rate 0.02 --output result.json
+    python3 benchmarks/run_benchmark.py --slow-rate 0.1 --slow-latency 3 --pool
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translate import (  # noqa: E402
+    ChatGPTService,
+    GeminiService,
+    SingleFlightCache,
+    TranslationQueue,
+    TranslationService,
+    build_pool_config,
+    chunk_token_budget,
+    create_translation_service,
+    estimate_tokens,
+    get_service_scheduler,
+    translate_worker,
+)
+from batch_translate import pages_from_directory  # noqa: E402
+from metrics import percentile  # noqa: E402
+from mock_server import (  # noqa: E402
+    FaultProfile,
+    FakeGeminiModel,
+    MockOpenAIServer,
+    mock_service_config,
+)
+
+
+class CountingService(TranslationService):
+    """统计底层服务调用次数的包装"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def translate(self, content, system_prompt, usage=None):
+        with self.lock:
+            self.calls += 1
+        try:
+            return self.inner.translate(content, system_prompt, usage)
+        except Exception:
+            with self.lock:
+                self.failures += 1
+            raise
+
+
+def load_corpus(directory, limit):
+    """读取 roff 手册页语料"""
+    corpus = []
+    for page in pages_from_directory(directory):
+        try:
+            content = page.loader()
+        except OSError:
+            continue
+        if content.strip():
+            corpus.append((str(page), content))
+        if len(corpus) >= limit:
+            break
+    return corpus
+
+
+def run_benchmark(service, config, corpus, workers):
+    """
+    翻译整个语料并统计
+
+    Args:
+        service: 翻译服务实例
+        config: 服务配置
+        corpus: [(名称, 内容)]
+        workers: 线程数
+
+    Returns:
+        dict: 统计结果
+    """
+    counting = CountingService(service)
+    cache = SingleFlightCache()
+    latencies = []
+    failed = []
+    pages = {}  # 页面序号 -> [第一个块开始时间, 最后一个块结束时间]
+    lock = threading.Lock()
+
+    def timed_worker(page, index, chunk, queue):
+        start = time.perf_counter()
+        try:
+            ok = translate_worker((index, chunk), config, queue, counting)
+        except Exception:
+            ok = False
+        end = time.perf_counter()
+        with lock:
+            latencies.append(end - start)
+            if not ok:
+                failed.append(index)
+            span = pages.setdefault(page, [start, end])
+            span[0] = min(span[0], start)
+            span[1] = max(span[1], end)
+
+    chunk_count = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for page, (_, content) in enumerate(corpus):
+            queue = TranslationQueue(chunk_size=chunk_token_budget(config), max_retries=3,
+                                     cache=cache, show_progress=False,
+                                     size_func=estimate_tokens)
+            chunks = queue.prepare_content(content)
+            chunk_count += len(chunks)
+            for i, chunk in enumerate(chunks):
+                executor.submit(timed_worker, page, i, chunk, queue)
+    wall_time = time.perf_counter() - start
+    page_times = [end - begin for begin, end in pages.values()]
+
+    return {
+        "pages": len(corpus),
+        "chunks": chunk_count,
+        "failed_chunks": len(failed),
+        "wall_time_s": wall_time,
+        "chunks_per_sec": chunk_count / wall_time if wall_time else 0.0,
+        "chunk_latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+        },
+        # 页面耗时：第一个块开始至最后一个块完成
+        "page_time_ms": {
+            "p50": percentile(page_times, 50) * 1000,
+            "p95": percentile(page_times, 95) * 1000,
+            "p99": percentile(page_times, 99) * 1000,
+        },
+        "requests": counting.calls,
+        # 每次失败的请求都会触发一次重试（单飞缓存合并的相同块不计入）
+        "retries": counting.failures,
+        "final_concurrency": get_service_scheduler(config).limiter.current_limit,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="翻译吞吐量基准测试")
+    parser.add_argument("--backend", choices=("openai", "gemini"), default="openai",
+                        help="模拟的服务类型")
+    parser.add_argument("--corpus", default="/usr/share/man/man1", help="roff 手册页目录")
+    parser.add_argument("--pages", type=int, default=50, help="最多使用的手册页数")
+    parser.add_argument("--workers", type=int, help="线程数（默认使用 max_concurrency）")
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--max-context-length", type=int, default=8192)
+    parser.add_argument("--max-output-length", type=int, default=4096)
+    parser.add_argument("--latency", type=float, default=0.2, help="基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="延迟抖动（秒）")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 概率")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="5xx 概率")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="输出截断概率")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="延迟尖峰概率")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="延迟尖峰增加的秒数")
+    parser.add_argument("--pool", action="store_true",
+                        help="再启动一个无故障的模拟服务，两者组成服务池（仅 openai）")
+    parser.add_argument("--hedge-percentile", type=float, default=95,
+                        help="服务池发送对冲请求的延迟百分位（0 表示不对冲）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果 JSON 文件（默认输出到标准输出）")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.pages)
+    if not corpus:
+        print(f"语料目录中没有可用的手册页：{args.corpus}", file=sys.stderr)
+        sys.exit(1)
+
+    faults = FaultProfile(latency=args.latency, jitter=args.jitter,
+                          rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+                          truncate_rate=args.truncate_rate, seed=args.seed,
+                          slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    overrides = {
+        "max_concurrency": args.max_concurrency,
+        "max_context_length": args.max_context_length,
+        "max_output_length": args.max_output_length,
+    }
+    workers = args.workers or args.max_concurrency
+
+    if args.pool:
+        healthy = FaultProfile(latency=args.latency, jitter=args.jitter, seed=args.seed + 1)
+        with MockOpenAIServer(faults=faults) as primary, \
+                MockOpenAIServer(faults=healthy) as secondary:
+            members = {
+                "primary": mock_service_config(primary.url, service="primary", **overrides),
+                "secondary": mock_service_config(secondary.url, service="secondary",
+                                                 **overrides),
+            }
+            config = build_pool_config("pool", {
+                "members": {"primary": 1, "secondary": 1},
+                "hedge_percentile": args.hedge_percentile,
+            }, members)
+            service = create_translation_service(config)
+            result = run_benchmark(service, config, corpus, workers)
+            result["pool"] = service.pool.status()
+            result["secondary_server"] = dict(healthy.counts)
+    elif args.backend == "openai":
+        with MockOpenAIServer(faults=faults) as server:
+            config = mock_service_config(server.url, **overrides)
+            result = run_benchmark(ChatGPTService(config), config, corpus, workers)
+            result["connections"] = server.connections
+    else:
+        config = mock_service_config(**overrides)
+        service = GeminiService(config, model=FakeGeminiModel(faults))
+        result = run_benchmark(service, config, corpus, workers)
+
+    result["backend"] = args.backend
+    result["server"] = dict(faults.counts)
+    result["parameters"] = vars(args)
+
+    report = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
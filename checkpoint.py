@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+import threading
+
+from translation_memory import content_digest
+
+# 检查点文件格式版本
+CHECKPOINT_VERSION = 1
+
+
+def document_id(chunks, config, prompt_version=""):
+    """
+    计算文档的检查点标识
+
+    相同的分块结果、服务类型、模型、目标语言和提示词版本对应同一个检查点（与翻译记忆的键一致，
+    切换提示词模板后不会恢复用其他提示词翻译的块）。
+
+    Args:
+        chunks: 内容块列表
+        config: 服务配置
+        prompt_version: 系统提示词版本（包含模板名称）
+
+    Returns:
+        str: 检查点标识
+    """
+    digest = hashlib.sha256()
+    for part in (config.get('type', 'chatgpt').lower(), config.get('model', ''),
+                 config.get('language', ''), str(prompt_version)):
+        digest.update(part.encode('utf-8') + b'\0')
+    for chunk in chunks:
+        digest.update(content_digest(chunk).encode('ascii'))
+    return digest.hexdigest()
+
+
+class CheckpointJournal:
+    """
+    文档翻译检查点日志
+
+    以 JSON Lines 格式追加记录每个已完成块的译文。第一行记录各块的摘要，
+    恢复时只有分块完全一致才会复用已有结果。
+    """
+
+    def __init__(self, directory, chunks, config, prompt_version=""):
+        """
+        Args:
+            directory: 检查点目录
+            chunks: 内容块列表
+            config: 服务配置
+            prompt_version: 系统提示词版本（包含模板名称）
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory,
+                                 f"{document_id(chunks, config, prompt_version)}.jsonl")
+        self.chunk_digests = [content_digest(chunk) for chunk in chunks]
+        self.lock = threading.Lock()
+        self._file = None
+
+    def load(self):
+        """
+        读取已完成块的译文
+
+        Returns:
+            dict: {块索引: 译文}，检查点不存在或与当前分块不一致时返回空字典
+        """
+        if not os.path.exists(self.path):
+            return {}
+
+        results = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            try:
+                header = json.loads(f.readline())
+            except json.JSONDecodeError:
+                return {}
+            if (header.get("version") != CHECKPOINT_VERSION or
+                    header.get("chunks") != self.chunk_digests):
+                return {}
+
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 中断时可能留下不完整的最后一行
+                    break
+                index = record.get("index")
+                if isinstance(index, int) and 0 <= index < len(self.chunk_digests):
+                    results[index] = record["result"]
+        return results
+
+    def open(self, resume=True):
+        """
+        打开检查点以追加记录
+
+        Args:
+            resume: 为 True 时保留已有记录，否则重新开始
+        """
+        with self.lock:
+            keep = resume and bool(self.load())
+            self._file = open(self.path, "a" if keep else "w", encoding="utf-8")
+            if not keep:
+                header = {"version": CHECKPOINT_VERSION, "chunks": self.chunk_digests}
+                self._file.write(json.dumps(header) + "\n")
+                self._file.flush()
+
+    def record(self, index, result):
+        """
+        记录已完成块的译文
+
+        Args:
+            index: 块索引
+            result: 译文
+        """
+        line = json.dumps({"index": index, "result": result}, ensure_ascii=False)
+        with self.lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        """关闭检查点文件"""
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        """翻译全部完成后删除检查点"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,5 +1,7 @@
 #!/bin/bash
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
 # 翻译手册目录
 MAN_DIR="/usr/local/share/man/zh_CN"
 
@@ -8,6 +10,12 @@ function list_translated_commands() {
     echo "已翻译的命令列表："
     echo "==================="
     
+    # 读取译文清单，并列出章节目录中未记录的译文（本版本之前的译文）；无法运行时遍历章节目录
+    if python3 "$SCRIPT_DIR/manifest.py" list --dir "$MAN_DIR" 2> /dev/null; then
+        echo "==================="
+        return
+    fi
+    
     local total=0
     # 遍历所有章节目录
     for section_dir in "$MAN_DIR"/man*; do
@@ -22,7 +30,7 @@ function list_translated_commands() {
             local count=0
             for file in "$section_dir"/*; do
                 if [[ -f "$file" ]]; then
-                    local cmd=$(basename "$file")
+                    local cmd=$(basename "$file" .gz)
                     cmd=${cmd%.*}
                     echo "  $cmd"
                     ((count++))
@@ -58,10 +66,14 @@ function delete_command() {
             for f in $file; do
                 if [[ -f "$f" ]]; then
                     rm -f "$f"
+                    python3 "$SCRIPT_DIR/manifest.py" forget "$f" > /dev/null 2>&1
                     echo "已删除：$f"
                     found=true
                 fi
             done
+            
+            # 删除增量翻译使用的原文/译文记录
+            rm -f "$section_dir/.manzh/$cmd".*.json
         fi
     done
     
@@ -70,6 +82,8 @@ function delete_command() {
         return 1
     fi
     
+    # 从 man 索引中删除已删除的手册页
+    python3 "$SCRIPT_DIR/man_install.py" index --dir "$MAN_DIR" > /dev/null 2>&1
     return 0
 }
 
@@ -80,6 +94,8 @@ function clean_all() {
     
     if [[ "$confirm" == "y" || "$confirm" == "Y" ]]; then
         rm -rf "$MAN_DIR"/man*
+        python3 "$SCRIPT_DIR/manifest.py" forget --dir "$MAN_DIR" > /dev/null 2>&1
+        python3 "$SCRIPT_DIR/man_install.py" index --dir "$MAN_DIR" > /dev/null 2>&1
         echo "已清空所有翻译结果"
     else
         echo "操作已取消"
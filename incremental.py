@@ -0,0 +1,143 @@
+import os
+import json
+import difflib
+
+from prompts import build_system_prompt
+
+# 译文旁记录文件的格式版本（2：服务字段加入提示词版本）
+SIDECAR_VERSION = 2
+# 记录文件保存在手册目录下的隐藏子目录中，不影响 man 和目录列表
+SIDECAR_DIR = ".manzh"
+
+
+def sidecar_path(output_path):
+    """
+    获取译文对应的原文/译文记录文件路径，如 man1/ls.1 -> man1/.manzh/ls.1.json
+
+    压缩的译文（man1/ls.1.gz）使用相同的记录文件，切换压缩设置后仍可增量翻译。
+
+    Args:
+        output_path: 译文文件路径
+
+    Returns:
+        str: 记录文件路径
+    """
+    directory, filename = os.path.split(os.path.abspath(output_path))
+    if filename.endswith(".gz"):
+        filename = filename[:-3]
+    return os.path.join(directory, SIDECAR_DIR, filename + ".json")
+
+
+def _service_fields(config, content_format):
+    # 提示词版本与翻译记忆、断点续传记录一致，切换提示词模板或修改提示词后不复用旧译文
+    return {
+        "type": config.get('type', 'chatgpt').lower(),
+        "model": config.get('model', ''),
+        "language": config.get('language', ''),
+        "prompt_version": build_system_prompt(content_format, config)[1],
+    }
+
+
+def load_sidecar(output_path, config, content_format):
+    """
+    读取译文对应的记录文件
+
+    Args:
+        output_path: 译文文件路径
+        config: 当前服务配置，服务类型、模型、语言或提示词版本不一致时不复用
+        content_format: 原文的内容格式（'text' 或 'roff'），决定使用的提示词
+
+    Returns:
+        list: [(翻译单元列表, 译文)]，不存在或不可复用时返回空列表
+    """
+    path = sidecar_path(output_path)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    if data.get("version") != SIDECAR_VERSION or data.get("service") != _service_fields(config, content_format):
+        return []
+    return [(segment["units"], segment["translation"]) for segment in data.get("segments", [])]
+
+
+def save_sidecar(output_path, config, content_format, segments):
+    """
+    原子地写入译文对应的记录文件
+
+    Args:
+        output_path: 译文文件路径
+        config: 服务配置
+        content_format: 原文的内容格式（'text' 或 'roff'）
+        segments: [(翻译单元列表, 译文)]
+    """
+    path = sidecar_path(output_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        "version": SIDECAR_VERSION,
+        "service": _service_fields(config, content_format),
+        "segments": [{"units": units, "translation": translation}
+                     for units, translation in segments],
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def plan_segments(units, previous, group_units):
+    """
+    对比新旧原文的翻译单元，生成增量翻译计划
+
+    旧记录中的某段（一个内容块）只有在其全部单元都未改变且仍然连续时才会复用；
+    新增、修改的单元以及被打断的旧段中的单元重新按块大小分组翻译。
+
+    Args:
+        units: 新原文的翻译单元列表（与 TranslationQueue.split_units 一致）
+        previous: load_sidecar 返回的旧记录
+        group_units: 分组函数（TranslationQueue.group_units）
+
+    Returns:
+        list: [(翻译单元列表, 译文或 None)]，译文为 None 的段需要翻译
+    """
+    if not previous:
+        return [(group, None) for group in group_units(units)]
+
+    old_units = []
+    segment_starts = {}
+    for segment_index, (segment_units, _) in enumerate(previous):
+        segment_starts[len(old_units)] = segment_index
+        old_units.extend(segment_units)
+
+    # 新单元位置 -> (旧单元位置, 所在相等区间的旧结束位置)
+    matches = {}
+    matcher = difflib.SequenceMatcher(None, old_units, units, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(j2 - j1):
+                matches[j1 + offset] = (i1 + offset, i2)
+
+    plan = []
+    pending = []
+    position = 0
+    while position < len(units):
+        match = matches.get(position)
+        segment_index = segment_starts.get(match[0]) if match else None
+        if segment_index is not None:
+            segment_units, translation = previous[segment_index]
+            if match[0] + len(segment_units) <= match[1]:
+                if pending:
+                    plan.extend((group, None) for group in group_units(pending))
+                    pending = []
+                plan.append((segment_units, translation))
+                position += len(segment_units)
+                continue
+        pending.append(units[position])
+        position += 1
+
+    if pending:
+        plan.extend((group, None) for group in group_units(pending))
+    return plan
@@ -495,7 +495,7 @@ function create_dirs() {
 # 复制文件
 function copy_files() {
     log "复制程序文件..."
-    local files=(manzh.sh translate_man.sh translate.py config_manager.sh clean.sh)
+    local files=(manzh.sh translate_man.sh translate.py translation_memory.py rate_limit.py checkpoint.py incremental.py metrics.py roff.py batching.py service_pool.py manifest.py work_queue.py planner.py man_install.py prompts.py manzh_client.py translate_daemon.py batch_translate.py config_manager.sh clean.sh)
     
     for file in "${files[@]}"; do
         if [[ ! -f "$file" ]]; then
@@ -519,7 +519,7 @@ function copy_files() {
     
     # 设置权限
     chmod +x "$INSTALL_DIR"/*.sh || handle_error "设置执行权限失败"
-    chmod 644 "$INSTALL_DIR/config.json" "$INSTALL_DIR/translate.py" || handle_error "设置文件权限失败"
+    chmod 644 "$INSTALL_DIR/config.json" "$INSTALL_DIR"/*.py || handle_error "设置文件权限失败"
 }
 
 # 验证安装
@@ -532,6 +532,22 @@ function verify_installation() {
         "manzh.sh"
         "translate_man.sh"
         "translate.py"
+        "translation_memory.py"
+        "rate_limit.py"
+        "checkpoint.py"
+        "incremental.py"
+        "metrics.py"
+        "roff.py"
+        "batching.py"
+        "service_pool.py"
+        "manifest.py"
+        "work_queue.py"
+        "planner.py"
+        "man_install.py"
+        "prompts.py"
+        "manzh_client.py"
+        "translate_daemon.py"
+        "batch_translate.py"
         "config_manager.sh"
         "clean.sh"
         "config.json"
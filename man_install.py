@@ -0,0 +1,345 @@
+"""
+ManZH 译文安装
+
+把翻译后的手册页写入手册目录：按配置写成 gzip 压缩的 <名称>.<章节>.gz，先写入同目录下的隐藏
+临时文件、设置好权限后再原子替换，man 不会读到写了一半的文件；一批手册页全部写入后，每个
+手册目录只运行一次增量的 mandb，使 man -k / apropos 能查到新的译文。只使用标准库，shell 脚本
+调用时无需导入翻译服务。
+
+用法：
+    python3 man_install.py help <命令> [--source 文件] < 译文   # 由 --help 输出的译文生成手册页
+    python3 man_install.py index [--dir 目录]                   # 更新手册目录的 man 索引
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from manifest import open_manifest
+
+# 翻译后的手册目录
+TRANSLATED_DIR = "/usr/local/share/man/zh_CN"
+# 译文文件和手册目录的权限
+PAGE_MODE = 0o644
+DIR_MODE = 0o755
+
+
+def install_settings(config_path="config.json"):
+    """
+    读取配置文件中的 install 设置（只使用标准库，供 shell 调用）
+
+    Returns:
+        dict: {"compress": 是否压缩, "update_index": 是否更新 man 索引}
+    """
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            settings = json.load(f).get("install") or {}
+    except (OSError, ValueError, AttributeError):
+        settings = {}
+    return {
+        "compress": settings.get("compress", True),
+        "update_index": settings.get("update_index", True),
+    }
+
+
+def manifest_service(config_path="config.json"):
+    """
+    读取默认服务记入译文清单的字段（只使用标准库，与 translate.load_config 的结果一致）
+
+    Returns:
+        dict: {"type", "model", "language"}，服务池另有 "service"；无法读取时返回 None
+    """
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        services = config.get("services") or {}
+        defaults = config.get("defaults") or {}
+        name = config["default_service"]
+        service = dict(defaults, **services[name])
+        if service.get("type") == "pool":
+            # 与 build_pool_config 一致：模型为成员名称，目标语言各成员相同
+            members = list(service["members"])
+            return {
+                "service": name,
+                "type": "pool",
+                "model": "+".join(members),
+                "language": dict(defaults, **services[members[0]]).get("language", ""),
+            }
+    except (OSError, ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+    return {
+        "type": service.get("type", "chatgpt"),
+        "model": service.get("model", ""),
+        "language": service.get("language", ""),
+    }
+
+
+def page_path(path, compress=True):
+    """
+    获取手册页实际安装的路径，如 man1/ls.1 -> man1/ls.1.gz（不压缩时去掉 .gz）
+
+    Args:
+        path: 译文文件路径（带或不带 .gz）
+        compress: 是否压缩
+
+    Returns:
+        str: 安装路径
+    """
+    if path.endswith(".gz"):
+        path = path[:-3]
+    return path + ".gz" if compress else path
+
+
+def man_root(path):
+    """
+    获取手册页所在的手册目录，如 /usr/local/share/man/zh_CN/man1/ls.1.gz -> /usr/local/share/man/zh_CN
+
+    Returns:
+        str: 手册目录，路径不在 man<章节> 目录下时返回 None
+    """
+    section_dir = os.path.dirname(os.path.abspath(path))
+    if not os.path.basename(section_dir).startswith("man"):
+        return None
+    return os.path.dirname(section_dir)
+
+
+def write_page(path, text, mode=PAGE_MODE):
+    """
+    原子写入手册页：路径以 .gz 结尾时压缩写入
+
+    先写入同目录下以点开头的临时文件（mandb 和 man 不会读取），设置权限后再替换目标文件，
+    无需写入后再单独 chmod。压缩时不记录文件名和时间戳（与 gzip -n 相同），相同的译文
+    生成相同的文件。
+
+    Args:
+        path: 目标文件路径
+        text: 手册页内容
+        mode: 文件权限
+    """
+    directory, filename = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            data = text.encode("utf-8")
+            if path.endswith(".gz"):
+                with gzip.GzipFile(filename="", mode="wb", fileobj=f, mtime=0) as gz:
+                    gz.write(data)
+            else:
+                f.write(data)
+            os.fchmod(f.fileno(), mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def update_man_index(roots, log=None):
+    """
+    对每个手册目录运行一次增量的 mandb（只处理修改时间变化的手册页）
+
+    Args:
+        roots: 手册目录列表
+        log: 错误信息的输出流（默认 sys.stderr）
+
+    Returns:
+        bool: 是否全部更新成功，系统没有 mandb（如 macOS）时返回 False
+    """
+    log = log or sys.stderr
+    roots = sorted({root for root in roots if root})
+    if not roots:
+        return True
+    mandb = shutil.which("mandb")
+    if mandb is None:
+        return False
+
+    ok = True
+    for root in roots:
+        try:
+            result = subprocess.run([mandb, "-q", root], stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, text=True, timeout=600)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"警告：更新 {root} 的 man 索引失败：{str(e)}", file=log)
+            ok = False
+            continue
+        if result.returncode != 0:
+            print(f"警告：更新 {root} 的 man 索引失败：{result.stderr.strip()}", file=log)
+            ok = False
+    return ok
+
+
+class ManInstaller:
+    """
+    批量安装翻译后的手册页
+
+    install 在任意线程中原子写入单个手册页，并删除另一种格式（压缩或未压缩）的旧译文，
+    避免 man 读到过时的版本；close 时对本批写入过的每个手册目录运行一次增量的 mandb。
+    """
+
+    def __init__(self, compress=True, update_index=True, manifest=None, log=None):
+        """
+        Args:
+            compress: 是否写成 gzip 压缩的手册页
+            update_index: 结束时是否更新 man 索引
+            manifest: 可选的译文清单，删除旧格式的译文时同时删除其记录
+            log: 错误信息的输出流（默认 sys.stderr）
+        """
+        self.compress = compress
+        self.update_index = update_index
+        self.manifest = manifest
+        self.log = log or sys.stderr
+        self.lock = threading.Lock()
+        self.roots = set()
+
+    def path(self, path):
+        """获取手册页实际安装的路径"""
+        return page_path(path, self.compress)
+
+    def install(self, path, text, index=True):
+        """
+        安装一个手册页
+
+        Args:
+            path: 译文文件路径（带或不带 .gz，按 compress 设置决定实际路径）
+            text: 手册页内容
+            index: 是否在 close 时为该手册页更新 man 索引，并删除另一种格式的旧译文
+                   （预览等临时内容传 False，翻译失败时仍可恢复原有的译文）
+
+        Returns:
+            str: 实际安装的路径
+        """
+        target = self.path(path)
+        directory = os.path.dirname(os.path.abspath(target))
+        os.makedirs(directory, mode=DIR_MODE, exist_ok=True)
+        write_page(target, text)
+
+        # 删除另一种格式的旧译文（如切换为压缩前保存的 ls.1）
+        stale = page_path(path, not self.compress)
+        if index and os.path.exists(stale):
+            os.remove(stale)
+            if self.manifest is not None:
+                try:
+                    self.manifest.remove([stale])
+                except Exception as e:
+                    print(f"警告：无法删除 {stale} 的清单记录：{str(e)}", file=self.log)
+
+        if index:
+            with self.lock:
+                self.roots.add(man_root(target))
+        return target
+
+    def discard(self, path):
+        """删除已安装的手册页（如翻译失败后的预览）"""
+        target = self.path(path)
+        if os.path.exists(target):
+            os.remove(target)
+            with self.lock:
+                self.roots.add(man_root(target))
+
+    def close(self):
+        """
+        更新本批手册页所在目录的 man 索引
+
+        Returns:
+            bool: 是否更新成功（未启用或没有写入时返回 True）
+        """
+        with self.lock:
+            roots, self.roots = self.roots, set()
+        if not self.update_index:
+            return True
+        return update_man_index(roots, self.log)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def help_page(command, content):
+    """
+    把 --help 输出的译文转换为 man 格式
+
+    Args:
+        command: 命令名称
+        content: 译文
+
+    Returns:
+        str: roff 格式的手册页
+    """
+    content = content.rstrip("\n")
+    summary = content.split("\n", 1)[0]
+    return (f'.TH {command} 1 "{time.strftime("%B %Y")}" "Help Output" "User Commands"\n'
+            f".SH 名称\n"
+            f"{command} \\- {summary}\n"
+            f".SH 描述\n"
+            f"{content}\n"
+            f".SH 注意\n"
+            f"本手册页由 ManZH 根据 '{command} --help' 输出自动生成。\n")
+
+
+def cmd_help(args, settings):
+    """由标准输入的 --help 译文生成手册页并安装到 man1"""
+    content = sys.stdin.read()
+    if not content.strip():
+        print("错误：翻译内容为空，不保存结果", file=sys.stderr)
+        return 1
+
+    manifest = open_manifest(create=True)
+    try:
+        with ManInstaller(manifest=manifest, **settings) as installer:
+            path = installer.install(os.path.join(args.dir, "man1", f"{args.command}.1"),
+                                     help_page(args.command, content))
+        # 以命令的可执行文件作为原文记入译文清单，命令升级后显示为过期
+        service = manifest_service()
+        if service is None:
+            print("警告：无法读取默认服务的配置，未记录到译文清单", file=sys.stderr)
+        else:
+            try:
+                manifest.record(path, args.source, service, 0)
+            except (OSError, sqlite3.Error) as e:
+                print(f"警告：无法记录到译文清单：{str(e)}", file=sys.stderr)
+    finally:
+        manifest.close()
+    print(f"翻译后的帮助文档已保存到：{path}")
+    return 0
+
+
+def cmd_index(args, settings):
+    """更新手册目录的 man 索引"""
+    if not os.path.isdir(args.dir):
+        return 0
+    if shutil.which("mandb") is None:
+        print("未找到 mandb，跳过更新 man 索引", file=sys.stderr)
+        return 0
+    return 0 if update_man_index([args.dir]) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ManZH 译文安装")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--dir", default=TRANSLATED_DIR, help="翻译后的手册目录")
+    subparsers = parser.add_subparsers(dest="command_name", required=True)
+
+    helper = subparsers.add_parser("help", parents=[common],
+                                   help="由标准输入的 --help 译文生成手册页并安装")
+    helper.add_argument("command", help="命令名称")
+    helper.add_argument("--source", help="原文文件路径（如命令的可执行文件）")
+    helper.set_defaults(func=cmd_help)
+
+    index = subparsers.add_parser("index", parents=[common], help="更新手册目录的 man 索引")
+    index.set_defaults(func=cmd_index)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args, install_settings()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+ManZH 译文清单
+
+记录每个已翻译手册页的原文路径、原文摘要、翻译服务和模型、目标语言、块数和翻译时间。
+检查译文是否过期时先比较原文的修改时间和大小（一次 stat），只有两者变化时才重新计算原文摘要；
+不读取、不计算译文文件的摘要。查询命令只使用标准库，无需导入翻译服务。
+
+用法：
+    python3 manifest.py status            # 统计并列出过期的手册页
+    python3 manifest.py status --all      # 列出全部手册页及其状态
+    python3 manifest.py list [--dir 目录]  # 按章节列出已翻译的手册页（含目录中未记录的译文）
+    python3 manifest.py check <译文路径>   # 译文是最新的时返回 0
+    python3 manifest.py forget <译文路径>  # 删除译文的记录
+"""
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+from manzh_client import data_dir
+
+MANIFEST_NAME = "manifest.db"
+
+# 译文状态
+FRESH = "fresh"
+STALE = "stale"
+SOURCE_MISSING = "source_missing"
+OUTPUT_MISSING = "output_missing"
+NO_SOURCE = "no_source"
+
+STATUS_LABELS = {
+    FRESH: "最新",
+    STALE: "原文已更新",
+    SOURCE_MISSING: "原文已删除",
+    OUTPUT_MISSING: "译文已删除",
+    NO_SOURCE: "原文未知",
+}
+
+_COLUMNS = ("output_path", "name", "section", "source_path", "source_digest", "source_mtime_ns",
+            "source_size", "service", "model", "language", "chunks", "translated_at")
+
+
+def file_digest(path):
+    """
+    计算文件内容的 SHA-256 摘要（.gz 文件按压缩后的内容计算，无需解压）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def split_output_name(path):
+    """
+    从译文文件名中解析名称和章节，如 man1/ls.1 -> ("ls", "1")
+
+    Returns:
+        tuple: (名称, 章节)，无法解析时章节为空字符串
+    """
+    filename = os.path.basename(path)
+    if filename.endswith(".gz"):
+        filename = filename[:-3]
+    name, dot, section = filename.rpartition(".")
+    if not dot or not name:
+        return filename, ""
+    return name, section
+
+
+def scan_pages(directory):
+    """
+    列出手册目录的各章节目录（man<章节>）中的译文文件，不含以点开头的临时文件、备份和记录
+
+    Args:
+        directory: 手册目录
+
+    Returns:
+        list: 译文文件的绝对路径
+    """
+    directory = os.path.abspath(directory)
+    pages = []
+    try:
+        sections = sorted(os.listdir(directory))
+    except OSError:
+        return pages
+    for section in sections:
+        section_dir = os.path.join(directory, section)
+        if not section.startswith("man") or not os.path.isdir(section_dir):
+            continue
+        for filename in sorted(os.listdir(section_dir)):
+            path = os.path.join(section_dir, filename)
+            if not filename.startswith(".") and os.path.isfile(path):
+                pages.append(path)
+    return pages
+
+
+def default_manifest_path():
+    """
+    Returns:
+        str: 数据目录下的清单数据库路径
+    """
+    return os.path.join(data_dir(), MANIFEST_NAME)
+
+
+class TranslationManifest:
+    """
+    译文清单（SQLite）
+
+    以译文文件的绝对路径为键，每个手册页一行。同一译文重新翻译时覆盖原有记录。
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self.lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS manifest (
+                    output_path TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    section TEXT NOT NULL,
+                    source_path TEXT NOT NULL,
+                    source_digest TEXT NOT NULL,
+                    source_mtime_ns INTEGER NOT NULL,
+                    source_size INTEGER NOT NULL,
+                    service TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    chunks INTEGER NOT NULL,
+                    translated_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def record(self, output_path, source_path, config, chunks, name=None, section=None):
+        """
+        记录一个译文
+
+        Args:
+            output_path: 译文文件路径
+            source_path: 原文文件路径（如 man -w 的结果），未知或不是文件时按原文未知记录
+            config: 翻译使用的服务配置（使用 service、type、model、language）
+            chunks: 译文的块数
+            name: 手册页名称，默认从译文文件名解析
+            section: 章节号，默认从译文文件名解析
+        """
+        output_path = os.path.abspath(output_path)
+        parsed_name, parsed_section = split_output_name(output_path)
+        digest, mtime_ns, size = "", 0, 0
+        if source_path and os.path.isfile(source_path):
+            source_path = os.path.abspath(source_path)
+            # 先 stat 再计算摘要：两者之间原文被修改时，下次检查会发现 stat 不一致并重新计算
+            stat = os.stat(source_path)
+            mtime_ns, size = stat.st_mtime_ns, stat.st_size
+            digest = file_digest(source_path)
+        row = (
+            output_path,
+            name or parsed_name,
+            str(section or parsed_section),
+            source_path if digest else "",
+            digest,
+            mtime_ns,
+            size,
+            config.get('service') or config.get('type', 'chatgpt'),
+            config.get('model', ''),
+            config.get('language', ''),
+            int(chunks or 0),
+            time.time(),
+        )
+        with self.lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO manifest ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                row
+            )
+            self._conn.commit()
+
+    def get(self, output_path):
+        """
+        Returns:
+            dict: 译文的记录，未记录时返回 None
+        """
+        with self.lock:
+            row = self._conn.execute("SELECT * FROM manifest WHERE output_path=?",
+                                     (os.path.abspath(output_path),)).fetchone()
+        return dict(row) if row is not None else None
+
+    def entries(self, directory=None):
+        """
+        列出记录的译文
+
+        Args:
+            directory: 只列出该目录下的译文
+
+        Returns:
+            list: 按章节、名称排序的记录
+        """
+        query = "SELECT * FROM manifest"
+        params = ()
+        if directory:
+            query += " WHERE output_path LIKE ? ESCAPE '\\'"
+            params = (_prefix_pattern(directory),)
+        with self.lock:
+            rows = self._conn.execute(query + " ORDER BY section, name", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove(self, paths=(), directory=None):
+        """
+        删除译文的记录
+
+        Args:
+            paths: 译文文件路径列表
+            directory: 删除该目录下全部译文的记录
+
+        Returns:
+            int: 删除的记录数
+        """
+        with self.lock:
+            cursor = self._conn.executemany("DELETE FROM manifest WHERE output_path=?",
+                                            [(os.path.abspath(p),) for p in paths])
+            removed = max(cursor.rowcount, 0)
+            if directory:
+                cursor = self._conn.execute(
+                    "DELETE FROM manifest WHERE output_path LIKE ? ESCAPE '\\'",
+                    (_prefix_pattern(directory),))
+                removed += max(cursor.rowcount, 0)
+            self._conn.commit()
+        return removed
+
+    def check(self, entry):
+        """
+        检查译文是否与已安装的原文一致
+
+        原文的修改时间和大小与记录一致时直接判定为最新；不一致时重新计算原文摘要，
+        摘要未变（如重新安装了相同的软件包）则更新记录的修改时间和大小。
+
+        Args:
+            entry: get / entries 返回的记录
+
+        Returns:
+            str: 状态（FRESH、STALE、SOURCE_MISSING、OUTPUT_MISSING 或 NO_SOURCE）
+        """
+        if not os.path.exists(entry["output_path"]):
+            return OUTPUT_MISSING
+        if not entry["source_path"]:
+            return NO_SOURCE
+        try:
+            stat = os.stat(entry["source_path"])
+        except OSError:
+            return SOURCE_MISSING
+        if stat.st_mtime_ns == entry["source_mtime_ns"] and stat.st_size == entry["source_size"]:
+            return FRESH
+
+        try:
+            digest = file_digest(entry["source_path"])
+        except OSError:
+            return SOURCE_MISSING
+        if digest != entry["source_digest"]:
+            return STALE
+        try:
+            with self.lock:
+                self._conn.execute(
+                    "UPDATE manifest SET source_mtime_ns=?, source_size=? WHERE output_path=?",
+                    (stat.st_mtime_ns, stat.st_size, entry["output_path"]))
+                self._conn.commit()
+        except sqlite3.Error:
+            # 没有写权限（如普通用户查看 root 的清单）时只是下次仍需计算摘要
+            pass
+        return FRESH
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self._conn.close()
+
+
+def _prefix_pattern(directory):
+    """目录前缀的 LIKE 模式（转义 % 和 _）"""
+    prefix = os.path.join(os.path.abspath(directory), "")
+    for char in ("\\", "%", "_"):
+        prefix = prefix.replace(char, "\\" + char)
+    return prefix + "%"
+
+
+def open_manifest(path=None, create=False):
+    """
+    打开清单数据库
+
+    Args:
+        path: 数据库路径，默认为数据目录下的 manifest.db
+        create: 数据库不存在时是否创建
+
+    Returns:
+        TranslationManifest: 清单，数据库不存在且 create 为 False 时返回 None
+    """
+    path = path or default_manifest_path()
+    if not create and not os.path.exists(path):
+        return None
+    return TranslationManifest(path)
+
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+def cmd_status(manifest, args):
+    """统计各状态的手册页数，列出需要重新翻译的手册页"""
+    entries = manifest.entries(args.dir)
+    counts = {}
+    for entry in entries:
+        entry["status"] = manifest.check(entry)
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+
+    shown = [e for e in entries if args.all or e["status"] in (STALE, SOURCE_MISSING)]
+    for entry in shown:
+        label = STATUS_LABELS[entry["status"]]
+        # 中文标签按两个字符宽度对齐
+        print(f"{label}{' ' * (10 - 2 * len(label))}  {entry['name']}({entry['section']})  "
+              f"{entry['service']}/{entry['model']}  {_format_time(entry['translated_at'])}  "
+              f"{entry['source_path'] or '-'}")
+    if shown:
+        print()
+    summary = "，".join(f"{STATUS_LABELS[status]} {counts[status]}"
+                       for status in STATUS_LABELS if counts.get(status))
+    print(f"共 {len(entries)} 个手册页" + (f"：{summary}" if summary else ""))
+
+    stale = [e for e in entries if e["status"] == STALE]
+    if stale and not args.all:
+        names = " ".join(sorted({e["name"] for e in stale}))
+        print(f"重新翻译过期的手册页（只翻译修改过的段落）：./manzh.sh batch {names}")
+    return 1 if stale else 0
+
+
+def cmd_list(manifest, args):
+    """
+    按章节列出已翻译的手册页
+
+    指定 --dir 时同时列出目录中未记录在清单里的译文（如引入清单之前翻译的手册页），
+    清单不存在时只列出目录中的译文。
+    """
+    entries = manifest.entries(args.dir) if manifest is not None else []
+    unrecorded = 0
+    if args.dir:
+        recorded = {entry["output_path"] for entry in entries}
+        for path in scan_pages(args.dir):
+            if path not in recorded:
+                name, section = split_output_name(path)
+                entries.append({"output_path": path, "name": name, "section": section})
+                unrecorded += 1
+        entries.sort(key=lambda entry: (entry["section"], entry["name"]))
+
+    section = None
+    for entry in entries:
+        if entry["section"] != section:
+            if section is not None:
+                print()
+            section = entry["section"]
+            print(f"=== {section} 章节 ===")
+        if "service" not in entry:
+            print(f"  {entry['name']:<24} （未记录在译文清单中）")
+            continue
+        print(f"  {entry['name']:<24} {entry['service']}/{entry['model']}  "
+              f"{entry['language']}  {entry['chunks']} 块  {_format_time(entry['translated_at'])}")
+    if section is not None:
+        print()
+    print(f"总计：{len(entries)} 个已翻译的手册页"
+          + (f"（其中 {unrecorded} 个未记录在译文清单中）" if unrecorded else ""))
+    return 0
+
+
+def cmd_check(manifest, args):
+    """检查单个译文，最新时返回 0"""
+    entry = manifest.get(args.output)
+    if entry is None:
+        return 1
+    return 0 if manifest.check(entry) in (FRESH, NO_SOURCE) else 1
+
+
+def cmd_record(manifest, args):
+    """记录不经过 translate.py 保存的译文（如由 --help 输出生成的手册页），使用当前的服务配置"""
+    from translate import load_config
+
+    manifest.record(args.output, args.source, load_config(), args.chunks)
+    return 0
+
+
+def cmd_forget(manifest, args):
+    """删除译文的记录"""
+    removed = manifest.remove(args.paths, directory=args.dir)
+    print(f"已删除 {removed} 条清单记录")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ManZH 译文清单")
+    parser.add_argument("--db", help="清单数据库路径（默认为数据目录下的 manifest.db）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    status = subparsers.add_parser("status", help="列出原文已更新或已删除的手册页")
+    status.add_argument("--all", action="store_true", help="列出全部手册页及其状态")
+    status.add_argument("--dir", help="只检查该目录下的译文")
+    status.set_defaults(func=cmd_status)
+
+    listing = subparsers.add_parser("list", help="按章节列出已翻译的手册页")
+    listing.add_argument("--dir", help="只列出该目录下的译文")
+    listing.set_defaults(func=cmd_list)
+
+    check = subparsers.add_parser("check", help="译文是最新的时返回 0")
+    check.add_argument("output", help="译文文件路径")
+    check.set_defaults(func=cmd_check)
+
+    record = subparsers.add_parser("record", help="记录一个译文")
+    record.add_argument("output", help="译文文件路径")
+    record.add_argument("--source", help="原文文件路径（如命令的可执行文件）")
+    record.add_argument("--chunks", type=int, default=0, help="译文的块数")
+    record.set_defaults(func=cmd_record)
+
+    forget = subparsers.add_parser("forget", help="删除译文的记录")
+    forget.add_argument("paths", nargs="*", default=[], help="译文文件路径")
+    forget.add_argument("--dir", help="删除该目录下全部译文的记录")
+    forget.set_defaults(func=cmd_forget)
+
+    args = parser.parse_args()
+    manifest = open_manifest(args.db, create=args.command == "record")
+    if manifest is None:
+        if args.command == "list" and args.dir:
+            sys.exit(cmd_list(None, args))
+        if args.command in ("status", "list"):
+            print("译文清单不存在：还没有通过 ManZH 翻译过手册", file=sys.stderr)
+            sys.exit(2)
+        sys.exit(1 if args.command == "check" else 0)
+    try:
+        sys.exit(args.func(manifest, args))
+    finally:
+        manifest.close()
+
+
+if __name__ == "__main__":
+    main()
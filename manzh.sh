@@ -115,8 +115,11 @@ function list_translated() {
         return
     fi
     
-    # 遍历所有章节目录
-    for section_dir in "$man_dir"/man*; do
+    # 读取译文清单，并列出章节目录中未记录的译文（本版本之前的译文）；无法运行时遍历章节目录
+    if python3 "$SCRIPT_DIR/manifest.py" list --dir "$man_dir" 2> /dev/null; then
+        man_dir=""
+    fi
+    for section_dir in ${man_dir:+"$man_dir"/man*}; do
         if [[ -d "$section_dir" ]]; then
             local section=$(basename "$section_dir")
             echo "=== ${section#man} 章节 ==="
@@ -124,7 +127,7 @@ function list_translated() {
             # 列出该章节的所有手册
             for man_file in "$section_dir"/*; do
                 if [[ -f "$man_file" ]]; then
-                    local name=$(basename "$man_file")
+                    local name=$(basename "$man_file" .gz)
                     name=${name%.*}
                     echo "  $name"
                 fi
@@ -146,17 +149,32 @@ EOF
     read
 }
 
+# 启动翻译守护进程（未运行时），返回 0 表示由本次调用启动
+function start_daemon() {
+    if python3 "$SCRIPT_DIR/translate_daemon.py" status &> /dev/null; then
+        return 1
+    fi
+    python3 "$SCRIPT_DIR/translate_daemon.py" start
+}
+
 # 交互式翻译
 function interactive_translate() {
     echo "=== 翻译命令手册 ==="
     echo
     
+    # 连续翻译多个命令时由常驻的守护进程翻译，避免每个命令重新启动解释器和加载翻译服务
+    local started_daemon=0
+    check_root
+    if start_daemon; then
+        started_daemon=1
+    fi
+    
     # 输入命令名称
     while true; do
         read -p "请输入要翻译的命令名称（输入 q 返回）: " cmd
         
         if [[ "$cmd" == "q" ]]; then
-            return
+            break
         fi
         
         if [[ -z "$cmd" ]]; then
@@ -182,6 +200,10 @@ function interactive_translate() {
         fi
         echo
     done
+    
+    if [[ $started_daemon -eq 1 ]]; then
+        python3 "$SCRIPT_DIR/translate_daemon.py" stop
+    fi
 }
 
 # 显示版本信息
@@ -259,6 +281,42 @@ function main() {
                 check_root
                 "$SCRIPT_DIR/translate_man.sh" "$@"
                 ;;
+            batch)
+                shift
+                if [[ $# -eq 0 ]]; then
+                    echo "错误：请指定要翻译的命令、章节或源文件目录"
+                    echo "用法：$0 batch <命令名...> | --section <章节> | --dir <目录>"
+                    exit 1
+                fi
+                # 只估算用量时不写入手册目录，无需 root 权限
+                [[ " $* " == *" --plan "* ]] || check_root
+                python3 "$SCRIPT_DIR/batch_translate.py" "$@"
+                ;;
+            queue)
+                shift
+                if [[ $# -eq 0 ]]; then
+                    echo "用法：$0 queue enqueue|work|status|collect|retry [选项]"
+                    exit 1
+                fi
+                # 写出译文需要 root 权限，其余操作（如在其他机器上运行 worker）不需要
+                if [[ " $* " == *" collect "* ]]; then
+                    check_root
+                fi
+                python3 "$SCRIPT_DIR/work_queue.py" "$@"
+                ;;
+            daemon)
+                shift
+                case "$1" in
+                    start|stop|status)
+                        check_root
+                        python3 "$SCRIPT_DIR/translate_daemon.py" "$1"
+                        ;;
+                    *)
+                        echo "用法：$0 daemon start|stop|status"
+                        exit 1
+                        ;;
+                esac
+                ;;
             config)
                 "$SCRIPT_DIR/config_manager.sh"
                 ;;
@@ -269,6 +327,11 @@ function main() {
             list)
                 list_translated
                 ;;
+            status)
+                shift
+                # 列出原文已更新或已删除（如软件包升级后）的手册页
+                python3 "$SCRIPT_DIR/manifest.py" status --dir /usr/local/share/man/zh_CN "$@"
+                ;;
             version)
                 echo "Man手册中文翻译工具 v1.0.0"
                 ;;
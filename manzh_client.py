@@ -0,0 +1,158 @@
+"""
+ManZH 翻译守护进程的轻量客户端
+
+参数与 translate.py 相同：从标准输入读取原文，交给常驻的翻译守护进程翻译。
+守护进程未运行时直接改为执行 translate.py，调用方无需区分两种情况。
+本模块只使用标准库，避免每次调用都导入 requests 和 google.generativeai。
+
+用法：
+    man ls | col -b | python3 manzh_client.py --output ls.1
+"""
+import os
+import sys
+import json
+import socket
+
+# 客户端与守护进程的通信协议版本
+PROTOCOL_VERSION = 3
+SOCKET_NAME = "manzh.sock"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def data_dir(config_path="config.json"):
+    """
+    获取数据目录，优先级与 translate.get_data_dir 一致：
+    环境变量 MANZH_DATA_DIR > 配置项 data_dir > 程序目录下的 data
+
+    Returns:
+        str: 数据目录路径
+    """
+    path = os.environ.get("MANZH_DATA_DIR")
+    if not path:
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                path = json.load(f).get("data_dir")
+        except (OSError, ValueError, AttributeError):
+            path = None
+    return path or os.path.join(SCRIPT_DIR, "data")
+
+
+def default_socket_path():
+    """
+    获取守护进程的 Unix 套接字路径（环境变量 MANZH_SOCKET 优先）
+
+    Returns:
+        str: 套接字路径
+    """
+    return os.environ.get("MANZH_SOCKET") or os.path.join(data_dir(), SOCKET_NAME)
+
+
+def connect(path=None, timeout=None):
+    """
+    连接翻译守护进程
+
+    Args:
+        path: 套接字路径，默认为 default_socket_path()
+        timeout: 连接和读写超时（秒），None 表示不超时
+
+    Returns:
+        socket.socket: 已连接的套接字，守护进程未运行时返回 None
+    """
+    path = path or default_socket_path()
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def send_message(stream, message):
+    """以 JSON Lines 格式发送一条消息"""
+    stream.write(json.dumps(message, ensure_ascii=False) + "\n")
+    stream.flush()
+
+
+def read_messages(stream):
+    """
+    逐条读取 JSON Lines 消息
+
+    Yields:
+        dict: 消息
+    """
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def call(message, path=None, timeout=None):
+    """
+    发送一个请求并返回守护进程的全部响应
+
+    Args:
+        message: 请求消息（自动附带协议版本）
+        path: 套接字路径
+        timeout: 超时（秒）
+
+    Returns:
+        list: 响应消息列表，守护进程未运行时返回 None
+    """
+    sock = connect(path, timeout)
+    if sock is None:
+        return None
+    with sock, sock.makefile("rw", encoding="utf-8") as stream:
+        send_message(stream, dict(message, version=PROTOCOL_VERSION))
+        return list(read_messages(stream))
+
+
+def run_local(argv):
+    """守护进程不可用时，在当前进程中执行 translate.py（标准输入未被读取）"""
+    script = os.path.join(SCRIPT_DIR, "translate.py")
+    os.execv(sys.executable, [sys.executable, script] + argv)
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # 容量估算（--plan）不发送请求，无需交给守护进程
+    if os.environ.get("MANZH_NO_DAEMON") or "--plan" in argv:
+        run_local(argv)
+    sock = connect()
+    if sock is None:
+        run_local(argv)
+
+    exit_code = 1
+    with sock, sock.makefile("rw", encoding="utf-8") as stream:
+        send_message(stream, {
+            "version": PROTOCOL_VERSION,
+            "action": "translate",
+            "argv": argv,
+            # 相对路径（--output、--metrics）按客户端的工作目录解析
+            "cwd": os.getcwd(),
+            "content": sys.stdin.read(),
+        })
+        try:
+            for message in read_messages(stream):
+                if "error" in message:
+                    print(f"翻译守护进程错误：{message['error']}", file=sys.stderr)
+                elif message.get("stream") == "stdout":
+                    sys.stdout.write(message["data"])
+                    sys.stdout.flush()
+                elif message.get("stream") == "stderr":
+                    sys.stderr.write(message["data"])
+                    sys.stderr.flush()
+                if "exit" in message:
+                    exit_code = message["exit"]
+                    break
+            else:
+                print("与翻译守护进程的连接意外断开", file=sys.stderr)
+        except KeyboardInterrupt:
+            print("\n翻译被用户中断", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+import os
+import json
+import time
+import threading
+
+# 指标记录格式版本
+METRICS_VERSION = 1
+
+
+def percentile(values, pct):
+    """
+    计算百分位数（线性插值）
+
+    Args:
+        values: 数值列表
+        pct: 百分位（0-100）
+
+    Returns:
+        float: 百分位数，列表为空时返回 0.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class ChunkStats:
+    """
+    单个块的翻译指标
+
+    由 translate_worker 在翻译过程中填写：
+        queue_wait: 提交到线程池至开始处理的等待时间（秒）
+        schedule_wait: 在调度器中等待限速和并发槽位的时间（秒）
+        latency: 最后一次成功请求的耗时（秒）
+        first_token_latency: 流式响应中收到第一段译文的耗时（秒），非流式请求为 None
+        request_time: 所有请求（含失败重试）的总耗时（秒）
+        requests / retries / rate_limited: 请求次数、失败重试次数、被限流次数
+        resplits: 译文被截断后拆分为更小的块重新翻译的次数
+        batch_size: 所在批量请求合并的块数（1 为单独请求；批量请求只计入发送者的 requests）
+        backend: 使用服务池时提供译文的成员服务，hedged / failovers 为是否发送了对冲请求
+                 和故障转移次数
+        input_tokens / output_tokens: 服务返回的 token 用量，未返回时为估算值
+        cached_input_tokens: 输入中命中服务端前缀缓存的 token 数，服务未返回时为 None
+        cache: "miss"（调用了翻译服务）、"memory"（翻译记忆命中）、
+               "shared"（与进程内相同内容的块共享结果）或 "local"（只有格式标记，无需翻译）
+    """
+
+    def __init__(self, index, content, config, submitted_at=None, document=None):
+        now = time.monotonic()
+        self.index = index
+        self.document = document
+        self.service = config.get('service') or config.get('type', 'chatgpt')
+        self.model = config.get('model', '')
+        self.started_at = now
+        self.queue_wait = now - submitted_at if submitted_at is not None else 0.0
+        self.schedule_wait = 0.0
+        self.latency = 0.0
+        self.first_token_latency = None
+        self.request_time = 0.0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.resplits = 0
+        self.batch_size = 1
+        self.backend = None
+        self.hedged = False
+        self.failovers = 0
+        self.input_chars = len(content)
+        self.output_chars = 0
+        self.input_tokens = None
+        self.output_tokens = None
+        self.cached_input_tokens = None
+        self.tokens_source = None
+        self._content = content
+        # 服务在 usage 中写入 input_tokens / output_tokens / cached_input_tokens
+        self.usage = {}
+        self.cache = "miss"
+        self.status = None
+        self.elapsed = 0.0
+
+    def finish(self, ok, output=None, estimate_tokens=None):
+        """
+        结束记录
+
+        Args:
+            ok: 是否翻译成功
+            output: 译文
+            estimate_tokens: 服务未返回 token 用量时使用的估算函数
+
+        Returns:
+            ChunkStats: 自身
+        """
+        self.status = "ok" if ok else "failed"
+        self.elapsed = time.monotonic() - self.started_at
+        if output:
+            self.output_chars = len(output)
+        self.first_token_latency = self.usage.get('first_token_latency')
+        self.backend = self.usage.get('backend')
+        self.hedged = bool(self.usage.get('hedged'))
+        self.failovers = self.usage.get('failovers') or 0
+
+        if self.cache != "miss":
+            # 未调用翻译服务，不消耗 token
+            self.input_tokens = self.output_tokens = 0
+        else:
+            self.input_tokens = self.usage.get('input_tokens')
+            self.output_tokens = self.usage.get('output_tokens')
+            self.cached_input_tokens = self.usage.get('cached_input_tokens')
+            if self.input_tokens is not None and self.output_tokens is not None:
+                self.tokens_source = "usage"
+            elif estimate_tokens is not None:
+                self.tokens_source = "estimate"
+                if self.input_tokens is None:
+                    self.input_tokens = estimate_tokens(self._content)
+                if self.output_tokens is None:
+                    self.output_tokens = estimate_tokens(output or "")
+        self._content = None
+        return self
+
+    def to_dict(self):
+        """
+        转换为可序列化的字典
+
+        Returns:
+            dict: 指标记录
+        """
+        return {
+            "type": "chunk",
+            "document": self.document,
+            "index": self.index,
+            "service": self.service,
+            "model": self.model,
+            "status": self.status,
+            "cache": self.cache,
+            "queue_wait": round(self.queue_wait, 6),
+            "schedule_wait": round(self.schedule_wait, 6),
+            "latency": round(self.latency, 6),
+            "first_token_latency": (round(self.first_token_latency, 6)
+                                    if self.first_token_latency is not None else None),
+            "request_time": round(self.request_time, 6),
+            "elapsed": round(self.elapsed, 6),
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "resplits": self.resplits,
+            "batch_size": self.batch_size,
+            "backend": self.backend,
+            "hedged": self.hedged,
+            "failovers": self.failovers,
+            "input_chars": self.input_chars,
+            "output_chars": self.output_chars,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_input_tokens": self.cached_input_tokens,
+            "tokens_source": self.tokens_source,
+        }
+
+
+class RunMetrics:
+    """
+    一次翻译运行的指标汇总
+
+    线程安全；运行结束后把每个块的记录和运行汇总追加到 JSON Lines 文件，
+    并可选地写出 Prometheus textfile（供 node_exporter 的 textfile collector 采集）。
+    """
+
+    def __init__(self, config, mode="translate", path=None, prometheus_path=None,
+                 record_chunks=True):
+        """
+        Args:
+            config: 服务配置
+            mode: 运行模式标签（translate / batch）
+            path: JSON Lines 文件路径，为 None 时不写出
+            prometheus_path: Prometheus textfile 路径，为 None 时不写出
+            record_chunks: 是否在 JSON Lines 中写出每个块的记录
+        """
+        self.service = config.get('service') or config.get('type', 'chatgpt')
+        self.model = config.get('model', '')
+        self.mode = mode
+        self.path = path
+        self.prometheus_path = prometheus_path
+        self.record_chunks = record_chunks
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.chunks = []
+
+    def record(self, stats):
+        """
+        记录一个块的指标
+
+        Args:
+            stats: 已结束的 ChunkStats
+        """
+        entry = stats.to_dict()
+        with self.lock:
+            self.chunks.append(entry)
+
+    def summary(self):
+        """
+        汇总本次运行的指标
+
+        Returns:
+            dict: 运行汇总
+        """
+        with self.lock:
+            chunks = list(self.chunks)
+
+        requested = [c for c in chunks if c["cache"] == "miss" and c["status"] == "ok"]
+        # 批量请求的延迟只按发送者记录一次
+        latencies = [c["latency"] for c in requested if c["requests"]]
+        first_token = [c["first_token_latency"] for c in requested
+                       if c["requests"] and c.get("first_token_latency") is not None]
+        queue_waits = [c["queue_wait"] for c in chunks]
+        input_tokens = [c["input_tokens"] or 0 for c in requested]
+        request_time = sum(c["request_time"] for c in chunks)
+        total_input = sum(c["input_tokens"] or 0 for c in chunks)
+        total_output = sum(c["output_tokens"] or 0 for c in chunks)
+        requested_output = sum(c["output_tokens"] or 0 for c in requested)
+        backends = {}
+        for c in requested:
+            if c.get("backend"):
+                backends[c["backend"]] = backends.get(c["backend"], 0) + 1
+
+        return {
+            "type": "run",
+            "version": METRICS_VERSION,
+            "run_id": self.run_id,
+            "mode": self.mode,
+            "service": self.service,
+            "model": self.model,
+            "started": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            "wall_time": round(time.time() - self.started, 3),
+            "chunks": len(chunks),
+            "failed": sum(1 for c in chunks if c["status"] != "ok"),
+            "cache_miss": sum(1 for c in chunks if c["cache"] == "miss"),
+            "cache_memory": sum(1 for c in chunks if c["cache"] == "memory"),
+            "cache_shared": sum(1 for c in chunks if c["cache"] == "shared"),
+            "cache_local": sum(1 for c in chunks if c["cache"] == "local"),
+            "requests": sum(c["requests"] for c in chunks),
+            "batched_chunks": sum(1 for c in chunks if c.get("batch_size", 1) > 1),
+            "resplits": sum(c.get("resplits", 0) for c in chunks),
+            # 使用服务池时各成员服务提供译文的块数，以及发送了对冲请求、发生故障转移的块数
+            "backends": backends,
+            "hedged_chunks": sum(1 for c in requested if c.get("hedged")),
+            "failover_chunks": sum(1 for c in requested if c.get("failovers")),
+            "retries": sum(c["retries"] for c in chunks),
+            "rate_limited": sum(c["rate_limited"] for c in chunks),
+            "input_chars": sum(c["input_chars"] for c in chunks),
+            "output_chars": sum(c["output_chars"] for c in chunks),
+            "input_tokens": total_input,
+            "output_tokens": total_output,
+            # 输入中命中服务端前缀缓存的 token 数（服务未返回时不计入）
+            "cached_input_tokens": sum(c.get("cached_input_tokens") or 0 for c in chunks),
+            "request_time": round(request_time, 3),
+            "schedule_wait": round(sum(c["schedule_wait"] for c in chunks), 3),
+            "latency_p50": round(percentile(latencies, 50), 3),
+            "latency_p95": round(percentile(latencies, 95), 3),
+            "latency_max": round(max(latencies, default=0.0), 3),
+            "first_token_p50": round(percentile(first_token, 50), 3),
+            "first_token_p95": round(percentile(first_token, 95), 3),
+            "queue_wait_p50": round(percentile(queue_waits, 50), 3),
+            "queue_wait_p95": round(percentile(queue_waits, 95), 3),
+            # 每 1000 个输出 token 的请求耗时，用于比较不同服务的速度
+            "seconds_per_1k_output_tokens": (
+                round(sum(latencies) / requested_output * 1000, 3) if requested_output else None
+            ),
+            "chunk_tokens_p50": percentile(input_tokens, 50),
+            "chunk_tokens_max": max(input_tokens, default=0),
+        }
+
+    def format_summary(self, summary=None):
+        """
+        生成一行可读的运行汇总
+
+        Returns:
+            str: 汇总文本
+        """
+        s = summary or self.summary()
+        cached = f"（缓存 {s['cached_input_tokens']}）" if s.get("cached_input_tokens") else ""
+        pool = ""
+        if s.get("backends"):
+            served = " / ".join(f"{name} {count}" for name, count in sorted(s["backends"].items()))
+            pool = (f"，服务 {served}（对冲 {s['hedged_chunks']} 块，"
+                    f"故障转移 {s['failover_chunks']} 块）")
+        return (f"指标：{s['chunks']} 块（请求 {s['cache_miss']}，翻译记忆 {s['cache_memory']}，"
+                f"共享 {s['cache_shared']}，无需翻译 {s['cache_local']}，失败 {s['failed']}），"
+                f"API 请求 {s['requests']} 次（合并 {s['batched_chunks']} 块），"
+                f"重试 {s['retries']} 次，限流 {s['rate_limited']} 次，截断拆分 {s['resplits']} 次，"
+                f"token {s['input_tokens']}/{s['output_tokens']}{cached}，"
+                f"延迟 p50 {s['latency_p50']:.2f}s p95 {s['latency_p95']:.2f}s，"
+                f"首 token p50 {s['first_token_p50']:.2f}s，"
+                f"排队 p95 {s['queue_wait_p95']:.2f}s{pool}")
+
+    def write(self):
+        """
+        写出本次运行的指标
+
+        Returns:
+            dict: 运行汇总
+        """
+        summary = self.summary()
+        if self.path:
+            self._write_jsonl(summary)
+        if self.prometheus_path:
+            self._write_prometheus(summary)
+        return summary
+
+    def _write_jsonl(self, summary):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            chunks = list(self.chunks) if self.record_chunks else []
+        lines = []
+        for chunk in chunks:
+            lines.append(json.dumps(dict(chunk, run_id=self.run_id), ensure_ascii=False))
+        lines.append(json.dumps(summary, ensure_ascii=False))
+        # 一次写入整次运行的记录，多个进程同时追加时不会交错
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _write_prometheus(self, summary):
+        labels = (f'mode="{_escape_label(self.mode)}",service="{_escape_label(self.service)}",'
+                  f'model="{_escape_label(self.model)}"')
+        lines = []
+
+        def metric(name, help_text, metric_type, samples):
+            lines.append(f"# HELP manzh_{name} {help_text}")
+            lines.append(f"# TYPE manzh_{name} {metric_type}")
+            for extra, value in samples:
+                label_text = labels + (f",{extra}" if extra else "")
+                lines.append(f"manzh_{name}{{{label_text}}} {value}")
+
+        metric("last_run_timestamp_seconds", "Start time of the last translation run.", "gauge",
+               [("", int(self.started))])
+        metric("last_run_duration_seconds", "Wall time of the last translation run.", "gauge",
+               [("", summary["wall_time"])])
+        metric("last_run_chunks", "Chunks processed in the last run by cache result.", "gauge",
+               [('cache="miss"', summary["cache_miss"]),
+                ('cache="memory"', summary["cache_memory"]),
+                ('cache="shared"', summary["cache_shared"]),
+                ('cache="local"', summary["cache_local"])])
+        metric("last_run_failed_chunks", "Chunks that failed in the last run.", "gauge",
+               [("", summary["failed"])])
+        metric("last_run_requests", "API requests sent in the last run.", "gauge",
+               [("", summary["requests"])])
+        metric("last_run_batched_chunks", "Chunks sent in batched requests in the last run.",
+               "gauge", [("", summary["batched_chunks"])])
+        metric("last_run_resplits", "Truncated chunks re-split in the last run.", "gauge",
+               [("", summary["resplits"])])
+        if summary["backends"]:
+            metric("last_run_backend_chunks", "Chunks served by each pool member in the last run.",
+                   "gauge", [(f'backend="{_escape_label(name)}"', count)
+                             for name, count in sorted(summary["backends"].items())])
+            metric("last_run_hedged_chunks", "Chunks with a hedged request in the last run.",
+                   "gauge", [("", summary["hedged_chunks"])])
+            metric("last_run_failover_chunks", "Chunks failed over to another pool member "
+                   "in the last run.", "gauge", [("", summary["failover_chunks"])])
+        metric("last_run_retries", "Failed requests retried in the last run.", "gauge",
+               [("", summary["retries"])])
+        metric("last_run_rate_limited", "Rate limited requests in the last run.", "gauge",
+               [("", summary["rate_limited"])])
+        metric("last_run_tokens", "Tokens used in the last run.", "gauge",
+               [('direction="input"', summary["input_tokens"]),
+                ('direction="output"', summary["output_tokens"])])
+        metric("last_run_cached_input_tokens", "Input tokens served from the provider's prompt "
+               "cache in the last run.", "gauge", [("", summary["cached_input_tokens"])])
+        metric("last_run_request_latency_seconds", "Request latency in the last run.", "gauge",
+               [('quantile="0.5"', summary["latency_p50"]),
+                ('quantile="0.95"', summary["latency_p95"]),
+                ('quantile="1"', summary["latency_max"])])
+        metric("last_run_first_token_seconds", "Time to first streamed token in the last run.",
+               "gauge", [('quantile="0.5"', summary["first_token_p50"]),
+                         ('quantile="0.95"', summary["first_token_p95"])])
+        metric("last_run_queue_wait_seconds", "Chunk queue wait in the last run.", "gauge",
+               [('quantile="0.5"', summary["queue_wait_p50"]),
+                ('quantile="0.95"', summary["queue_wait_p95"])])
+
+        directory = os.path.dirname(os.path.abspath(self.prometheus_path))
+        os.makedirs(directory, exist_ok=True)
+        # textfile collector 可能随时读取，先写临时文件再原子替换
+        tmp_path = f"{self.prometheus_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
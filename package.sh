@@ -10,6 +10,22 @@ mkdir -p "dist/${PACKAGE_NAME}"
 cp manzh.sh "dist/${PACKAGE_NAME}/"
 cp translate_man.sh "dist/${PACKAGE_NAME}/"
 cp translate.py "dist/${PACKAGE_NAME}/"
+cp translation_memory.py "dist/${PACKAGE_NAME}/"
+cp rate_limit.py "dist/${PACKAGE_NAME}/"
+cp checkpoint.py "dist/${PACKAGE_NAME}/"
+cp incremental.py "dist/${PACKAGE_NAME}/"
+cp metrics.py "dist/${PACKAGE_NAME}/"
+cp roff.py "dist/${PACKAGE_NAME}/"
+cp batching.py "dist/${PACKAGE_NAME}/"
+cp service_pool.py "dist/${PACKAGE_NAME}/"
+cp manifest.py "dist/${PACKAGE_NAME}/"
+cp work_queue.py "dist/${PACKAGE_NAME}/"
+cp planner.py "dist/${PACKAGE_NAME}/"
+cp man_install.py "dist/${PACKAGE_NAME}/"
+cp prompts.py "dist/${PACKAGE_NAME}/"
+cp manzh_client.py "dist/${PACKAGE_NAME}/"
+cp translate_daemon.py "dist/${PACKAGE_NAME}/"
+cp batch_translate.py "dist/${PACKAGE_NAME}/"
 cp config_manager.sh "dist/${PACKAGE_NAME}/"
 cp clean.sh "dist/${PACKAGE_NAME}/"
 cp install.sh "dist/${PACKAGE_NAME}/"
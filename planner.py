@@ -0,0 +1,323 @@
+"""
+翻译任务的容量估算（--plan）
+
+只在本地分块、查询翻译记忆并去重，不调用翻译服务，估算每个服务需要的请求数、
+输入/输出 token 数、缓存命中率，以及在调度器的并发爬升和 RPM/TPM 限速下的预计耗时。
+翻译记忆以只读方式打开，估算不创建、不修改任何文件。
+"""
+import os
+import sys
+import json
+import math
+from collections import deque
+
+from translate import (
+    BATCH_PROMPT_NOTE,
+    MIN_CHUNK_TOKENS,
+    OUTPUT_EXPANSION_RATIO,
+    REQUEST_OVERHEAD_TOKENS,
+    ConfigCache,
+    chunk_token_budget,
+    estimate_tokens,
+    get_data_dir,
+    load_config,
+    TranslationQueue,
+)
+from incremental import load_sidecar, plan_segments
+from prompts import build_system_prompt
+from translation_memory import TranslationMemory, content_digest
+from metrics import percentile
+from rate_limit import AdaptiveConcurrencyLimiter
+from roff import MaskedText
+
+# 没有该服务的历史运行指标时假定的请求速度：每 1000 个输出 token 的请求耗时（秒）
+DEFAULT_SECONDS_PER_1K_OUTPUT = 20.0
+# 估算请求速度时使用的最近运行数
+HISTORY_RUNS = 20
+# 批量请求最多合并的片段数（与 RequestBatcher 的默认值一致）
+BATCH_MAX_SEGMENTS = 32
+
+
+def configured_services():
+    """
+    获取配置文件中全部可用的服务配置
+
+    Returns:
+        list: [(服务名称, 服务配置)]，配置无效的服务跳过
+    """
+    services = []
+    for name in ConfigCache.get_setting('services', {}) or {}:
+        try:
+            services.append((name, load_config(service_name=name)))
+        except ValueError as e:
+            print(f"跳过服务 {name}：{str(e)}", file=sys.stderr)
+    return services
+
+
+def history_speed(config, path=None):
+    """
+    从历史运行指标中获取服务的请求速度
+
+    Args:
+        config: 服务配置
+        path: 运行指标的 JSON Lines 文件，默认与 create_run_metrics 相同
+
+    Returns:
+        float: 最近运行的每 1000 个输出 token 请求耗时（秒）的中位数，没有记录时返回 None
+    """
+    settings = ConfigCache.get_setting('metrics', {}) or {}
+    path = path or settings.get('path')
+    if not path:
+        path = os.path.join(get_data_dir(create=False), 'metrics.jsonl')
+    service = config.get('service') or config.get('type', 'chatgpt')
+    speeds = deque(maxlen=HISTORY_RUNS)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if (entry.get("type") == "run" and entry.get("service") == service
+                        and entry.get("model") == config.get('model', '')
+                        and entry.get("seconds_per_1k_output_tokens")):
+                    speeds.append(entry["seconds_per_1k_output_tokens"])
+    except OSError:
+        return None
+    return percentile(list(speeds), 50) if speeds else None
+
+
+def pack_requests(sizes, config):
+    """
+    按 RequestBatcher 的规则估算合并后的请求：不超过批量预算一半的块合并发送
+
+    假定合并的块同时在等待发送（批量翻译时通常如此），估算结果是合并效果的上限。
+
+    Args:
+        sizes: [(内容格式, 发送的 token 数)]
+        config: 服务配置
+
+    Returns:
+        list: 每个请求的 (内容格式, 发送的 token 数, 片段数)
+    """
+    requests = []
+    if not config.get('batch_requests', True):
+        return [(content_format, tokens, 1) for content_format, tokens in sizes]
+
+    budget = max(chunk_token_budget(config) - estimate_tokens(BATCH_PROMPT_NOTE),
+                 MIN_CHUNK_TOKENS)
+    batches = {}  # 内容格式 -> [token 数, 片段数]（同一提示词的片段才会合并）
+    for content_format, tokens in sizes:
+        if tokens * 2 > budget:
+            requests.append((content_format, tokens, 1))
+            continue
+        batch = batches.get(content_format)
+        if batch is not None and (batch[0] + tokens > budget
+                                  or batch[1] >= BATCH_MAX_SEGMENTS):
+            requests.append((content_format, batch[0], batch[1]))
+            batch = None
+        if batch is None:
+            batch = batches[content_format] = [0, 0]
+        batch[0] += tokens
+        batch[1] += 1
+    requests.extend((content_format, tokens, count)
+                    for content_format, (tokens, count) in batches.items())
+    return requests
+
+
+def ramp_duration(latencies, initial, ceiling):
+    """
+    估算调度器从初始并发逐步增加到上限时完成全部请求的耗时
+
+    按 AdaptiveConcurrencyLimiter 的加性增规则（不考虑拥塞和限流时的降低）逐个完成请求，
+    以当前并发完成一个平均耗时的请求需要 平均耗时 / 并发 秒。
+
+    Args:
+        latencies: 各请求的预计耗时（秒）
+        initial: 初始并发数（服务配置的 concurrency）
+        ceiling: 并发上限（max_concurrency 与线程数中较小的一项）
+
+    Returns:
+        float: 预计耗时（秒）
+    """
+    if not latencies:
+        return 0.0
+    average = sum(latencies) / len(latencies)
+    limiter = AdaptiveConcurrencyLimiter(initial=initial, min_limit=1, max_limit=ceiling)
+    total = 0.0
+    for _ in latencies:
+        total += average / limiter.current_limit
+        limiter.on_success(average)
+    return total
+
+
+def plan_service(name, config, chunks, reused=0, pages=1, memory=None, max_workers=None):
+    """
+    估算一个服务翻译给定内容块的用量和耗时
+
+    Args:
+        name: 服务名称
+        config: 服务配置
+        chunks: 需要翻译的 [(内容格式, 内容块)]（已排除复用已有译文的块）
+        reused: 复用已有译文的块数
+        pages: 手册页数
+        memory: 可选的翻译记忆，命中的块不发送请求
+        max_workers: 线程数，同时是并发的上限，默认为服务的 max_concurrency
+
+    Returns:
+        dict: 估算结果
+    """
+    local = remembered = duplicate = 0
+    seen = set()
+    sizes = []
+    for content_format, chunk in chunks:
+        text = chunk
+        if content_format == 'roff':
+            masked = MaskedText(chunk)
+            if not masked.translatable:
+                local += 1
+                continue
+            text = masked.text
+        if memory is not None:
+            key = TranslationMemory.make_key(chunk, config,
+                                             build_system_prompt(content_format, config)[1])
+            if memory.contains(key):
+                remembered += 1
+                continue
+        # 相同内容的块在一次运行中只请求一次
+        digest = content_digest(chunk)
+        if digest in seen:
+            duplicate += 1
+            continue
+        seen.add(digest)
+        sizes.append((content_format, estimate_tokens(text)))
+
+    requests = pack_requests(sizes, config)
+    input_tokens = output_tokens = 0
+    latencies = []
+    speed = history_speed(config)
+    speed_source = "history" if speed is not None else "default"
+    speed = speed or DEFAULT_SECONDS_PER_1K_OUTPUT
+    for content_format, tokens, segments in requests:
+        prompt = build_system_prompt(content_format, config)[0]
+        if segments > 1:
+            prompt += BATCH_PROMPT_NOTE
+        input_tokens += estimate_tokens(prompt) + REQUEST_OVERHEAD_TOKENS + tokens
+        output = math.ceil(tokens * OUTPUT_EXPANSION_RATIO)
+        output_tokens += output
+        latencies.append(output * speed / 1000)
+
+    total = len(chunks) + reused
+    # 调度器从 concurrency 开始按请求完成情况增加并发，max_concurrency（及线程数）只是上限
+    max_concurrency = config.get('max_concurrency', 16)
+    if max_workers:
+        max_concurrency = min(max_concurrency, max_workers)
+    concurrency = min(config.get('concurrency', 4), max_concurrency)
+    # 预计耗时取各项下限中最大的一项：并发、单个最长请求、RPM、TPM
+    bounds = {
+        "concurrency": ramp_duration(latencies, concurrency, max_concurrency),
+        "longest_request": max(latencies, default=0.0),
+    }
+    if config.get('rpm'):
+        bounds["rpm"] = len(requests) / config['rpm'] * 60
+    if config.get('tpm'):
+        # 调度器按原文和预计译文的 token 数扣除 TPM 额度
+        bounds["tpm"] = sum(tokens for _, tokens, _ in requests) * (1 + OUTPUT_EXPANSION_RATIO) \
+            / config['tpm'] * 60
+    bottleneck = max(bounds, key=bounds.get)
+
+    return {
+        "service": name,
+        "type": config.get('type', 'chatgpt'),
+        "model": config.get('model', ''),
+        "chunk_budget": chunk_token_budget(config),
+        "pages": pages,
+        "chunks": total,
+        "reused": reused,
+        "local": local,
+        "memory": remembered,
+        "duplicate": duplicate,
+        "requested_chunks": len(sizes),
+        "requests": len(requests),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "hit_rate": (total - len(sizes)) / total if total else 0.0,
+        "seconds_per_1k_output_tokens": speed,
+        "speed_source": speed_source,
+        "concurrency": concurrency,
+        "max_concurrency": max_concurrency,
+        "wall_time": bounds[bottleneck],
+        "bottleneck": bottleneck,
+    }
+
+
+def plan_document(name, config, content, output=None, incremental=True, memory=None):
+    """
+    估算一个服务翻译单个文档的用量和耗时（分块方式与 translate_document 一致）
+
+    Args:
+        name: 服务名称
+        config: 服务配置
+        content: 原文
+        output: 译文文件路径，存在记录时只计算新增或修改的段落
+        incremental: 是否与已有译文的记录对比
+        memory: 可选的翻译记忆
+
+    Returns:
+        dict: plan_service 的估算结果
+
+    Raises:
+        ValueError: 当内容为空时
+    """
+    queue = TranslationQueue(chunk_size=chunk_token_budget(config), show_progress=False,
+                             size_func=estimate_tokens)
+    units = queue.split_units(content)
+    previous = (load_sidecar(output, config, queue.content_format)
+                if output and incremental else [])
+    plan = plan_segments(units, previous, queue.group_units)
+    chunks = [(queue.content_format, queue.join_units(segment_units))
+              for segment_units, translation in plan if translation is None]
+    return plan_service(name, config, chunks, reused=len(plan) - len(chunks), memory=memory)
+
+
+_BOTTLENECK_LABELS = {
+    "concurrency": "并发",
+    "longest_request": "单个最长请求",
+    "rpm": "RPM 限速",
+    "tpm": "TPM 限速",
+}
+
+
+def _format_duration(seconds):
+    seconds = int(math.ceil(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600} 小时 {seconds % 3600 // 60} 分"
+    if seconds >= 60:
+        return f"{seconds // 60} 分 {seconds % 60} 秒"
+    return f"{seconds} 秒"
+
+
+def format_plan(plan):
+    """
+    生成可读的估算结果
+
+    Args:
+        plan: plan_service 的返回值
+
+    Returns:
+        str: 多行文本
+    """
+    speed = (f"历史速度 {plan['seconds_per_1k_output_tokens']:.1f}"
+             if plan["speed_source"] == "history"
+             else f"假定速度 {plan['seconds_per_1k_output_tokens']:.0f}")
+    return "\n".join([
+        f"服务 {plan['service']}（{plan['type']} / {plan['model']}，每块 {plan['chunk_budget']} token）",
+        f"  手册页 {plan['pages']}，内容块 {plan['chunks']}：需要请求 {plan['requested_chunks']}，"
+        f"复用已有译文 {plan['reused']}，翻译记忆 {plan['memory']}，重复 {plan['duplicate']}，"
+        f"无需翻译 {plan['local']}（命中率 {plan['hit_rate']:.1%}）",
+        f"  API 请求约 {plan['requests']} 次，输入约 {plan['input_tokens']:,} token，"
+        f"输出约 {plan['output_tokens']:,} token（按 {OUTPUT_EXPANSION_RATIO} 倍估算，偏保守）",
+        f"  预计耗时约 {_format_duration(plan['wall_time'])}"
+        f"（并发 {plan['concurrency']}→{plan['max_concurrency']}，"
+        f"{speed} 秒/1000 输出 token，瓶颈：{_BOTTLENECK_LABELS[plan['bottleneck']]}）",
+    ])
@@ -0,0 +1,117 @@
+"""
+翻译提示词模板
+
+每种模板（prompt_style）为每种内容格式提供一个固定的系统提示词，并带有版本号：修改提示词时
+递增 PROMPT_VERSION，使旧的翻译记忆失效。请求中系统提示词在前，只随模板和内容格式变化、
+逐字节相同；每块不同的原文放在用户消息的最后，服务端可以缓存相同的请求前缀（OpenAI 兼容接口的
+自动前缀缓存、Gemini 的 system_instruction 和缓存内容）。
+
+模板：
+    full     完整的翻译规则（默认）
+    compact  精简的规则，每个请求的输入 token 更少，适合大量小块
+"""
+
+# 提示词版本，修改任一模板的内容时需递增
+PROMPT_VERSION = 1
+
+DEFAULT_PROMPT_STYLE = "full"
+
+SYSTEM_PROMPT = """你是一位专业的技术文档翻译专家，特别擅长将英文命令行文档翻译成中文。请遵循以下规则：
+
+1. 保持专业术语的准确性，必要时保留英文原文，采用"中文（英文）"的格式
+2. 对于 man 手册：
+   - 严格保持所有 nroff/troff 格式标记
+   - 保持命令语法和参数格式不变
+3. 对于 help 输出：
+   - 保持选项格式（如 --help, -h）不变
+   - 保持示例命令和路径不变
+4. 命令行选项说明采用："选项名称 - 中文说明"的格式
+5. 确保翻译准确、专业、通俗易懂
+6. 保持所有空格、缩进和换行格式"""
+
+HELP_OUTPUT_NOTE = "\n注意：这是命令的 help 输出，不是 man 手册，请保持命令行格式和示例的原样显示。"
+
+# roff 源文件的格式标记在本地替换为 ⟦编号⟧ 占位符，只发送正文文字
+ROFF_SYSTEM_PROMPT = """你是一位专业的技术文档翻译专家，负责翻译 man 手册的正文。文本中的 ⟦数字⟧ 是格式占位符，请遵循以下规则：
+
+1. 原样保留所有占位符，不得删除、修改或新增
+2. 独占一行的占位符保持独占一行，且顺序不变
+3. 行内占位符代表命令、选项或字体标记，可按译文语序调整位置
+4. 保持专业术语的准确性，必要时保留英文原文，采用"中文（英文）"的格式
+5. 只输出译文，保持原有的换行"""
+
+COMPACT_SYSTEM_PROMPT = ("翻译命令行文档。命令、选项、路径、示例和格式标记保持原样；"
+                         "术语必要时写作\"中文（英文）\"；保持空格、缩进和换行。")
+
+COMPACT_ROFF_SYSTEM_PROMPT = ("翻译 man 手册正文。⟦数字⟧ 是格式占位符：全部原样保留，"
+                              "独占一行的保持独占一行且顺序不变，行内的可随语序调整；"
+                              "只输出译文，保持换行。")
+
+# 模板名称 -> {内容格式: 系统提示词}，"text" 为纯文本（格式化后的手册或 help 输出）
+PROMPT_TEMPLATES = {
+    "full": {
+        "roff": ROFF_SYSTEM_PROMPT,
+        "text": SYSTEM_PROMPT + HELP_OUTPUT_NOTE,
+    },
+    "compact": {
+        "roff": COMPACT_ROFF_SYSTEM_PROMPT,
+        "text": COMPACT_SYSTEM_PROMPT,
+    },
+}
+
+
+def prompt_style(config=None):
+    """
+    获取服务配置使用的提示词模板名称
+
+    Raises:
+        ValueError: 模板不存在时
+    """
+    style = (config or {}).get('prompt_style', DEFAULT_PROMPT_STYLE)
+    if style not in PROMPT_TEMPLATES:
+        raise ValueError(f"未知的提示词模板：{style}（可选：{', '.join(PROMPT_TEMPLATES)}）")
+    return style
+
+
+def build_system_prompt(content_format, config=None):
+    """
+    构建系统提示词
+
+    Args:
+        content_format: 内容格式，"roff" 为屏蔽格式标记后的 roff 正文，"text" 为纯文本
+        config: 服务配置，prompt_style 决定使用的模板（默认 full）
+
+    Returns:
+        tuple: (系统提示词, 提示词版本)，版本用于区分翻译记忆和合并请求
+    """
+    style = prompt_style(config)
+    kind = "roff" if content_format == "roff" else "text"
+    # full 模板的版本与引入模板之前相同，已有的翻译记忆仍然有效
+    version = f"{PROMPT_VERSION}-{'roff' if kind == 'roff' else 'help'}"
+    if style != DEFAULT_PROMPT_STYLE:
+        version += f"-{style}"
+    return PROMPT_TEMPLATES[style][kind], version
+
+
+def build_user_prompt(content, language):
+    """
+    构建用户消息：固定的翻译指令在前，每块不同的原文在最后
+
+    Args:
+        content: 要翻译的内容
+        language: 目标语言
+
+    Returns:
+        str: 用户消息
+    """
+    return f"请将以下内容翻译成{language}：\n\n{content}"
+
+
+def system_prompts(config=None):
+    """
+    获取服务配置可能使用的全部系统提示词（用于估算每个请求的提示词长度）
+
+    Returns:
+        list: 系统提示词
+    """
+    return list(PROMPT_TEMPLATES[prompt_style(config)].values())
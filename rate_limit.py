@@ -0,0 +1,268 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class RateLimitError(RuntimeError):
+    """服务端限流（HTTP 429 / Resource Exhausted）"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """
+    解析 Retry-After 响应头
+
+    Args:
+        value: 响应头的值（秒数或 HTTP 日期）
+
+    Returns:
+        float: 需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    令牌桶限速器
+
+    按每分钟 rate 个令牌的速度补充，桶容量为一分钟的额度，
+    acquire 在令牌不足时阻塞等待。
+    """
+
+    def __init__(self, rate_per_minute):
+        """
+        Args:
+            rate_per_minute: 每分钟补充的令牌数
+
+        Raises:
+            ValueError: 当速率无效时
+        """
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute 必须大于 0")
+
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """
+        获取令牌，不足时阻塞
+
+        Args:
+            amount: 需要的令牌数，超过桶容量时按桶容量计算
+        """
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 自适应并发控制
+
+    请求延迟和错误率正常时每完成一个"窗口"的请求并发数加 1（加性增），
+    遇到限流、错误或延迟明显上升时按比例降低并发（乘性减）。
+    """
+
+    # 短期平均延迟超过长期基线的倍数视为拥塞
+    LATENCY_TOLERANCE = 2.0
+    # 短期平均与长期基线的 EWMA 权重
+    RECENT_WEIGHT = 0.3
+    BASELINE_WEIGHT = 0.02
+    # 乘性减系数
+    THROTTLE_DECREASE = 0.5
+    ERROR_DECREASE = 0.75
+    LATENCY_DECREASE = 0.9
+
+    def __init__(self, initial=4, min_limit=1, max_limit=16):
+        """
+        Args:
+            initial: 初始并发数
+            min_limit: 最小并发数
+            max_limit: 最大并发数
+
+        Raises:
+            ValueError: 当并发数设置无效时
+        """
+        if min_limit <= 0 or max_limit < min_limit:
+            raise ValueError("并发数范围无效")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.baseline = None  # 长期平均延迟
+        self.recent = None  # 短期平均延迟
+        self.pause_until = 0.0
+        self.condition = threading.Condition()
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    def acquire(self):
+        """等待可用的并发槽位及限流暂停结束"""
+        with self.condition:
+            while True:
+                wait = self.pause_until - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                elif self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                else:
+                    self.condition.wait()
+
+    def release(self):
+        """释放并发槽位"""
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self, latency):
+        """
+        记录成功请求
+
+        短期平均延迟（快速 EWMA）超过长期基线（慢速 EWMA）的 LATENCY_TOLERANCE 倍时
+        视为拥塞；平滑后的比较可以避免块大小不同造成的单次延迟波动引起误判。
+
+        Args:
+            latency: 请求耗时（秒）
+        """
+        with self.condition:
+            if self.baseline is None:
+                self.baseline = self.recent = latency
+            else:
+                self.recent += (latency - self.recent) * self.RECENT_WEIGHT
+                self.baseline += (latency - self.baseline) * self.BASELINE_WEIGHT
+
+            if self.recent > self.baseline * self.LATENCY_TOLERANCE:
+                self._decrease(self.LATENCY_DECREASE)
+                # 降低并发后重新观察，避免同一次延迟上升连续触发
+                self.recent = self.baseline
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    def on_throttle(self, retry_after=None):
+        """
+        记录限流：并发减半，并在 retry_after 秒内暂停发送新请求
+
+        Args:
+            retry_after: 服务端要求的等待秒数
+        """
+        with self.condition:
+            self._decrease(self.THROTTLE_DECREASE)
+            delay = retry_after if retry_after is not None else 1.0
+            self.pause_until = max(self.pause_until, time.monotonic() + delay)
+            self.condition.notify_all()
+
+    def on_error(self):
+        """记录非限流类错误（超时、5xx 等）"""
+        with self.condition:
+            self._decrease(self.ERROR_DECREASE)
+
+    def _decrease(self, factor):
+        self.limit = max(float(self.min_limit), self.limit * factor)
+
+
+class ServiceScheduler:
+    """
+    单个翻译服务的请求调度器
+
+    组合 RPM / TPM 令牌桶与 AIMD 并发控制，所有调用该服务的线程共享同一实例。
+    只有限流和其他请求错误（超时、连接失败、5xx 等）降低并发；服务正常响应但内容不可用
+    （如译文被截断、批量结果的段数不一致）时不调整并发。
+    """
+
+    def __init__(self, config, content_errors=()):
+        """
+        Args:
+            config: 服务配置，可选字段：
+                rpm: 每分钟请求数上限
+                tpm: 每分钟 token 数上限
+                concurrency: 初始并发数（默认 4）
+                max_concurrency: 最大并发数（默认 16）
+            content_errors: 与服务负载无关的内容错误类型，不调整并发
+        """
+        self.max_concurrency = config.get('max_concurrency', 16)
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial=config.get('concurrency', 4),
+            min_limit=1,
+            max_limit=self.max_concurrency,
+        )
+        self.request_bucket = TokenBucket(config['rpm']) if config.get('rpm') else None
+        self.token_bucket = TokenBucket(config['tpm']) if config.get('tpm') else None
+        self.content_errors = content_errors
+
+    @contextmanager
+    def slot(self, tokens=1):
+        """
+        获取一次请求的发送许可，并根据结果调整并发
+
+        Args:
+            tokens: 本次请求预计消耗的 token 数
+
+        Yields:
+            None
+        """
+        if self.request_bucket:
+            self.request_bucket.acquire(1)
+        if self.token_bucket:
+            self.token_bucket.acquire(tokens)
+
+        self.limiter.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except RateLimitError as e:
+            self.limiter.on_throttle(e.retry_after)
+            raise
+        except Exception as e:
+            if not isinstance(e, self.content_errors):
+                self.limiter.on_error()
+            raise
+        else:
+            self.limiter.on_success(time.monotonic() - start)
+        finally:
+            self.limiter.release()
+
+    def call(self, func, tokens=1):
+        """
+        在调度器控制下执行一次请求
+
+        Args:
+            func: 无参请求函数
+            tokens: 本次请求预计消耗的 token 数
+
+        Returns:
+            func 的返回值
+        """
+        with self.slot(tokens):
+            return func()
@@ -0,0 +1,217 @@
+import re
+
+# 占位符格式：⟦编号⟧，模型需原样保留
+PLACEHOLDER_PATTERN = re.compile(r'⟦(\d+)⟧')
+
+# 在这些宏之前开始新的翻译单元（段落、标题、列表项等结构边界）
+STRUCTURE_MACROS = {
+    'TH', 'SH', 'SS', 'TP', 'TQ', 'IP', 'HP', 'PP', 'LP', 'P',
+    'Dd', 'Sh', 'Ss', 'Pp', 'It', 'Bl', 'El', 'Bd', 'Ed',
+}
+# 参数为可翻译标题文本的宏
+HEADING_MACROS = {'SH', 'SS'}
+# 这些区域内的全部内容保留原样（表格、示例代码、宏定义、忽略块）
+VERBATIM_REGIONS = {
+    'TS': 'TE', 'EQ': 'EN', 'PS': 'PE', 'EX': 'EE', 'nf': 'fi',
+    'de': '..', 'am': '..', 'ig': '..',
+}
+
+_CONTROL_PATTERN = re.compile(r"^[.']\s*([^\s\\]*)")
+_ROFF_DETECT_PATTERN = re.compile(r"^(?:\.(?:TH|SH|Dd|Sh)\b|['.]\\\")", re.MULTILINE)
+_LETTER_PATTERN = re.compile(r'[^\W\d_]')
+
+# 转义序列：\f 字体、\( \[ 特殊字符、\* 字符串、\n 数字寄存器、\s 字号、\" 注释等
+_ESCAPE = (r'\\(?:[fF*nN](?:\(..|\[[^\]]*\]|.)|\(..|\[[^\]]*\]|s[-+]?\d+|'
+           r'[hvwlLDoXbxZ]\'[^\']*\'|".*$|.)')
+_FONT = r'\\f(?:\(..|\[[^\]]*\]|.)'
+# 不含空白的字体区间（如 \fB\-\-all\fR、\fIFILE\fP）整体作为占位符，内容不翻译
+_MARKUP_PATTERN = re.compile(
+    rf'{_FONT}(?:[^\s\\]|(?!\\f){_ESCAPE})+{_FONT}|{_ESCAPE}'
+)
+
+
+def is_roff(content):
+    """
+    判断内容是否为 roff（man/mdoc）源文件
+
+    Args:
+        content: 文本内容
+
+    Returns:
+        bool: 包含 .TH/.SH/.Dd/.Sh 宏或 roff 注释行时返回 True
+    """
+    return bool(_ROFF_DETECT_PATTERN.search(content))
+
+
+def macro_name(line):
+    """
+    获取控制行的宏名称
+
+    Returns:
+        str: 宏名称，非控制行返回 None
+    """
+    match = _CONTROL_PATTERN.match(line)
+    return match.group(1) if match else None
+
+
+def split_roff_units(content):
+    """
+    在结构宏之前拆分 roff 源文件，得到翻译单元
+
+    表格、示例等原样保留的区域不会在内部拆分。
+
+    Args:
+        content: roff 源文件内容
+
+    Returns:
+        list: 翻译单元列表（单元内以换行连接）
+    """
+    units = []
+    current = []
+    region_end = None
+    for line in content.split('\n'):
+        name = macro_name(line)
+        if region_end is None and name in STRUCTURE_MACROS and current:
+            units.append('\n'.join(current))
+            current = []
+        current.append(line)
+        if region_end is None:
+            region_end = VERBATIM_REGIONS.get(name)
+        elif name == region_end or (region_end == '..' and line.strip() == '..'):
+            region_end = None
+    if current:
+        units.append('\n'.join(current))
+    return [unit for unit in units if unit.strip()]
+
+
+class MaskedText:
+    """
+    屏蔽 roff 格式标记后的待翻译文本
+
+    控制行、注释、原样保留区域和不含文字的行替换为独占一行的占位符，
+    行内的转义序列和字体区间替换为行内占位符；只有标题宏的参数和正文文字需要翻译。
+    """
+
+    def __init__(self, content):
+        """
+        Args:
+            content: roff 内容块
+        """
+        self.tokens = []
+        self.line_tokens = set()  # 独占一行的占位符
+        self.heading_tokens = set()  # 标题宏占位符，其后为标题文字
+        lines = []
+        pending = []  # 待合并为一个占位符的连续本地行
+        region_end = None
+
+        def flush():
+            if pending:
+                lines.append(self._placeholder('\n'.join(pending), line=True))
+                pending.clear()
+
+        for line in content.split('\n'):
+            name = macro_name(line)
+            if region_end is not None:
+                pending.append(line)
+                if name == region_end or (region_end == '..' and line.strip() == '..'):
+                    region_end = None
+                continue
+
+            if name is not None:
+                control = _CONTROL_PATTERN.match(line)
+                argument = line[control.end():].strip()
+                if name in HEADING_MACROS and _LETTER_PATTERN.search(argument):
+                    flush()
+                    self.heading_tokens.add(len(self.tokens))
+                    heading = self._placeholder(control.group(0), line=True)
+                    lines.append(heading + " " + self._mask_inline(argument.strip('"')))
+                else:
+                    region_end = VERBATIM_REGIONS.get(name)
+                    pending.append(line)
+                continue
+
+            first_token = len(self.tokens)
+            masked = self._mask_inline(line)
+            if pending or not _LETTER_PATTERN.search(PLACEHOLDER_PATTERN.sub('', masked)):
+                # 撤销该行的行内占位符，使占位符编号与行的顺序一致
+                del self.tokens[first_token:]
+                if not _LETTER_PATTERN.search(PLACEHOLDER_PATTERN.sub('', masked)):
+                    # 空行、只有选项名称或符号的行不需要翻译
+                    pending.append(line)
+                    continue
+                flush()
+                masked = self._mask_inline(line)
+            lines.append(masked)
+        flush()
+        self.text = '\n'.join(lines)
+
+    @property
+    def translatable(self):
+        """是否包含需要翻译的文字"""
+        return bool(_LETTER_PATTERN.search(PLACEHOLDER_PATTERN.sub('', self.text)))
+
+    def _placeholder(self, token, line=False):
+        index = len(self.tokens)
+        self.tokens.append(token)
+        if line:
+            self.line_tokens.add(index)
+        return f"⟦{index}⟧"
+
+    def _mask_inline(self, text):
+        return _MARKUP_PATTERN.sub(lambda m: self._placeholder(m.group(0)), text)
+
+    def unmask(self, translated):
+        """
+        将译文中的占位符还原为原始格式标记，并重建合法的 roff 文本
+
+        Args:
+            translated: 模型返回的译文
+
+        Returns:
+            str: roff 内容块
+
+        Raises:
+            ValueError: 占位符缺失、重复、顺序错乱或出现未知占位符时
+        """
+        found = [int(m.group(1)) for m in PLACEHOLDER_PATTERN.finditer(translated)]
+        if sorted(found) != list(range(len(self.tokens))):
+            raise ValueError("译文中的格式占位符与原文不一致")
+        line_order = [index for index in found if index in self.line_tokens]
+        if line_order != sorted(line_order):
+            raise ValueError("译文中的结构占位符顺序与原文不一致")
+
+        # 结构占位符必须独占一行，模型将其并入正文时拆回单独的行
+        line_pattern = re.compile(r'(⟦(?:%s)⟧)' % '|'.join(map(str, self.line_tokens))) \
+            if self.line_tokens else None
+        output = []
+        for raw_line in translated.split('\n'):
+            parts = line_pattern.split(raw_line) if line_pattern else [raw_line]
+            heading = None
+            for position, part in enumerate(parts):
+                match = PLACEHOLDER_PATTERN.fullmatch(part)
+                if match and int(match.group(1)) in self.line_tokens:
+                    index = int(match.group(1))
+                    if index in self.heading_tokens:
+                        heading = self.tokens[index]
+                    else:
+                        output.append(self.tokens[index])
+                    continue
+                # 保留行首缩进（roff 中行首空格会断行），占位符之后的片段去掉空白
+                text = part.rstrip() if position == 0 else part.strip()
+                if heading is not None:
+                    title = self._restore_inline(text).replace('"', '""')
+                    output.append(f'{heading} "{title}"' if text else heading)
+                    heading = None
+                elif text:
+                    output.append(self._text_line(self._restore_inline(text)))
+            if heading is not None:
+                output.append(heading)
+        return '\n'.join(output)
+
+    def _restore_inline(self, text):
+        return PLACEHOLDER_PATTERN.sub(lambda m: self.tokens[int(m.group(1))], text)
+
+    @staticmethod
+    def _text_line(text):
+        # 以 . 或 ' 开头的正文行会被当作控制行，需要用 \& 转义
+        return '\\&' + text if text[:1] in ('.', "'") else text
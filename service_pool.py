@@ -0,0 +1,264 @@
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import percentile
+
+# 计算延迟百分位和错误率所需的最少样本数
+MIN_SAMPLES = 5
+
+
+class PoolMember:
+    """
+    服务池中的一个后端
+
+    记录最近的请求延迟和成败，用于计算对冲等待时间和错误率。
+    """
+
+    def __init__(self, name, weight, target, window=50):
+        """
+        Args:
+            name: 后端名称
+            weight: 分配请求的权重
+            target: 发送函数使用的后端对象（如翻译服务及其调度器）
+            window: 保留的最近请求数
+        """
+        self.name = name
+        self.weight = weight
+        self.target = target
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)  # True 为成功
+        self.down_until = 0.0
+        self.served = 0
+        self.failures = 0
+
+    @property
+    def error_rate(self):
+        if len(self.outcomes) < MIN_SAMPLES:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def healthy(self, now):
+        return now >= self.down_until
+
+
+class BackendPool:
+    """
+    带对冲请求和故障转移的加权后端池
+
+    每次请求按权重选择一个健康的后端发送；等待超过该后端最近延迟的 hedge_percentile
+    百分位后仍未返回时，向另一个后端发送相同的对冲请求，采用先返回的结果。请求失败时
+    立即改由尚未尝试过的后端发送。后端最近的错误率超过 max_error_rate 时暂停使用
+    cooldown 秒，之后重新参与分配。请求在池内共享的有界线程池中发送。
+    """
+
+    def __init__(self, members, hedge_percentile=95, hedge_min=0.2, max_error_rate=0.5,
+                 cooldown=30.0, fatal_errors=(), max_workers=32):
+        """
+        Args:
+            members: PoolMember 列表
+            hedge_percentile: 触发对冲请求的延迟百分位（0 表示不发送对冲请求）
+            hedge_min: 触发对冲请求前的最短等待时间（秒）
+            max_error_rate: 暂停使用后端的错误率阈值
+            cooldown: 后端暂停使用的时间（秒）
+            fatal_errors: 不转移到其他后端、直接抛出的异常类型（如与后端无关的内容错误）
+            max_workers: 发送请求的最大线程数（包括对冲请求和输掉对冲后仍在进行的请求）
+
+        Raises:
+            ValueError: 当参数无效时
+        """
+        if not members:
+            raise ValueError("服务池至少需要一个后端")
+        if any(member.weight <= 0 for member in members):
+            raise ValueError("后端权重必须大于 0")
+        if not 0 <= hedge_percentile < 100:
+            raise ValueError("hedge_percentile 必须在 0 到 100 之间")
+        if not 0 < max_error_rate <= 1:
+            raise ValueError("max_error_rate 必须在 0 到 1 之间")
+        if max_workers <= 0:
+            raise ValueError("max_workers 必须大于 0")
+
+        self.members = list(members)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min = hedge_min
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.fatal_errors = fatal_errors
+        self.lock = threading.Lock()
+        self.random = random.Random()
+        # 线程数有上限：线程池已满时新的请求排队等待，而不是为每个对冲或故障转移新建线程
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="manzh-pool")
+
+    def choose(self, exclude=()):
+        """
+        按权重选择一个后端：优先选择健康的后端，全部暂停时在暂停的后端中选择
+
+        Args:
+            exclude: 本次请求已尝试过的后端
+
+        Returns:
+            PoolMember: 后端，没有可选的后端时返回 None
+        """
+        now = time.monotonic()
+        with self.lock:
+            candidates = [m for m in self.members if m not in exclude]
+            healthy = [m for m in candidates if m.healthy(now)]
+            candidates = healthy or candidates
+            if not candidates:
+                return None
+            return self.random.choices(candidates, [m.weight for m in candidates])[0]
+
+    def hedge_delay(self, member):
+        """
+        获取向其他后端发送对冲请求前的等待时间
+
+        使用该后端最近延迟的百分位；样本不足时使用整个池的延迟，仍不足时不对冲。
+
+        Returns:
+            float: 等待秒数，不发送对冲请求时返回 None
+        """
+        if not self.hedge_percentile or len(self.members) < 2:
+            return None
+        with self.lock:
+            latencies = list(member.latencies)
+            if len(latencies) < MIN_SAMPLES:
+                latencies = [value for m in self.members for value in m.latencies]
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return max(percentile(latencies, self.hedge_percentile), self.hedge_min)
+
+    def record(self, member, latency=None, ok=True):
+        """
+        记录一次请求的结果，错误率超过阈值时暂停使用该后端
+
+        Args:
+            member: 后端
+            latency: 成功请求的耗时（秒）
+            ok: 是否成功
+
+        Returns:
+            str: 暂停使用该后端时的提示信息，否则为 None
+        """
+        with self.lock:
+            member.outcomes.append(ok)
+            if ok:
+                member.latencies.append(latency)
+                return None
+            member.failures += 1
+            error_rate = member.error_rate
+            if error_rate <= self.max_error_rate or not member.healthy(time.monotonic()):
+                return None
+            member.down_until = time.monotonic() + self.cooldown
+            # 恢复后重新统计，避免暂停前的错误再次触发
+            member.outcomes.clear()
+        return f"服务 {member.name} 最近错误率 {error_rate:.0%}，暂停使用 {self.cooldown:.0f} 秒"
+
+    def _start(self, member, send, warnings):
+        """在共享的线程池中向后端发送请求，返回对应的 Future；暂停后端的提示记入 warnings"""
+
+        def run():
+            start = time.monotonic()
+            try:
+                result = send(member)
+            except BaseException as e:
+                if not isinstance(e, self.fatal_errors):
+                    message = self.record(member, ok=False)
+                    if message is not None:
+                        warnings.append(message)
+                raise
+            # 输掉对冲的请求同样记录延迟，后端变慢时对冲等待时间随之调整
+            self.record(member, time.monotonic() - start)
+            return result
+
+        future = self.executor.submit(run)
+        future.member = member
+        return future
+
+    def call(self, send, usage=None):
+        """
+        通过服务池发送一次请求
+
+        Args:
+            send: 发送函数 send(member) -> 结果，在池内的线程中执行
+            usage: 可选的用量字典，写入提供结果的后端（backend）、是否发送了对冲请求
+                   （hedged）和故障转移次数（failovers），暂停使用后端的提示追加到 warnings
+
+        Returns:
+            send 的返回值（最先成功的请求）
+
+        Raises:
+            Exception: 所有后端都失败时抛出最后一个错误；fatal_errors 中的错误直接抛出
+        """
+        tried = []
+        pending = set()
+        waited = False  # 是否已等待过对冲时间（每次请求最多对冲一次）
+        hedged = False
+        failovers = 0
+        last_error = None
+        # 由调用方输出到该次翻译的日志（服务池在多个文档、多个客户端之间共享）
+        warnings = usage.setdefault('warnings', []) if usage is not None else []
+
+        def launch(exclude):
+            member = self.choose(exclude)
+            if member is None:
+                return None
+            tried.append(member)
+            future = self._start(member, send, warnings)
+            pending.add(future)
+            return future
+
+        launch(tried)
+        while pending:
+            timeout = None
+            if not waited and len(pending) == 1:
+                timeout = self.hedge_delay(next(iter(pending)).member)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 超过对冲等待时间仍未返回，向另一个后端发送相同的请求
+                waited = True
+                hedged = launch(tried) is not None
+                continue
+
+            for future in done:
+                pending.discard(future)
+                error = future.exception()
+                if error is None:
+                    member = future.member
+                    with self.lock:
+                        member.served += 1
+                    if usage is not None:
+                        usage['backend'] = member.name
+                        usage['hedged'] = hedged
+                        usage['failovers'] = failovers
+                    return future.result()
+                if isinstance(error, self.fatal_errors):
+                    raise error
+                last_error = error
+
+            if not pending and launch(tried) is not None:
+                failovers += 1
+        raise last_error
+
+    def close(self):
+        """关闭线程池，不等待仍在进行的请求（如输掉对冲的请求）"""
+        self.executor.shutdown(wait=False)
+
+    def status(self):
+        """
+        Returns:
+            list: 各后端的状态
+        """
+        now = time.monotonic()
+        with self.lock:
+            return [{
+                "name": m.name,
+                "weight": m.weight,
+                "healthy": m.healthy(now),
+                "error_rate": round(m.error_rate, 3),
+                "latency_p95": round(percentile(list(m.latencies), 95), 3),
+                "served": m.served,
+                "failures": m.failures,
+            } for m in self.members]
@@ -0,0 +1,48 @@
+"""
+测试共用的辅助类
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translate import ConfigCache  # noqa: E402
+
+# 不会被实际请求的服务配置
+SERVICE_CONFIG = {
+    "type": "chatgpt",
+    "url": "http://manzh.invalid/v1/chat/completions",
+    "model": "test-model",
+    "api_key": "test",
+    "language": "中文",
+    "max_output_length": 2000,
+    "max_context_length": 8000,
+}
+
+
+class DataDirTestCase(unittest.TestCase):
+    """在临时目录中运行：配置文件只有一个服务 test，数据目录为临时目录下的 data（不预先创建）"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.tmp.name, "data")
+        with open(os.path.join(self.tmp.name, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"default_service": "test", "services": {"test": SERVICE_CONFIG},
+                       "install": {"update_index": False}}, f)
+        self.old_cwd = os.getcwd()
+        self.old_data_dir = os.environ.get("MANZH_DATA_DIR")
+        os.chdir(self.tmp.name)
+        os.environ["MANZH_DATA_DIR"] = self.data_dir
+        ConfigCache.invalidate_cache()
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        if self.old_data_dir is None:
+            os.environ.pop("MANZH_DATA_DIR", None)
+        else:
+            os.environ["MANZH_DATA_DIR"] = self.old_data_dir
+        ConfigCache.invalidate_cache()
+        self.tmp.cleanup()
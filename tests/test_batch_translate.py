@@ -0,0 +1,198 @@
+"""
+batch_translate.py 的测试：跨页面去重的共享段落只翻译一次并填回各手册页，共享段落的占位行
+经 roff 屏蔽后不发送给翻译服务并原样还原，BatchTranslator 使用完毕后关闭翻译记忆和译文清单，
+并且只更新一次 man 索引
+"""
+import os
+import sys
+import gzip
+import shutil
+import sqlite3
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_translate import (SHARED_MARKER, SHARED_MARKER_PATTERN,  # noqa: E402
+                             BatchTranslator, ManPage, normalize_unit)
+from incremental import load_sidecar  # noqa: E402
+from roff import MaskedText  # noqa: E402
+from support import SERVICE_CONFIG, DataDirTestCase  # noqa: E402
+from translate import TranslationService, register_service  # noqa: E402
+
+# 两个手册页共有的段落
+SHARED = (".SH BUGS\n"
+          "Report bugs to the maintainers and include the exact version of the program.")
+
+
+def roff_page(name, body):
+    return (f'.TH {name.upper()} 1 "2024" "GNU" "User Commands"\n'
+            f".SH NAME\n{name} \\- {body}\n"
+            f".SH DESCRIPTION\n"
+            f"The {name} command {body} and prints the result on standard output.\n"
+            f"{SHARED}\n")
+
+
+class UpperService(TranslationService):
+    """把原文转换为大写作为译文的假翻译服务（占位符不受影响），记录收到的内容"""
+
+    requests = []
+    lock = threading.Lock()
+
+    def __init__(self, config):
+        self.config = config
+
+    def translate(self, content, system_prompt, usage=None):
+        with self.lock:
+            self.requests.append(content)
+        return content.upper()
+
+
+register_service("test-upper", UpperService)
+
+DEDUP_CONFIG = dict(SERVICE_CONFIG, type="test-upper", url="http://dedup.invalid/v1",
+                    batch_requests=False)
+
+
+class SharedUnitTest(DataDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        UpperService.requests.clear()
+        self.output_dir = os.path.join(self.tmp.name, "zh_CN")
+        self.pages = [ManPage(name, 1, lambda name=name, body=body: roff_page(name, body))
+                      for name, body in [("ls", "lists directory contents"),
+                                         ("cp", "copies files and directories")]]
+
+    def translate(self, dedup=True):
+        with BatchTranslator(DEDUP_CONFIG, output_dir=self.output_dir, max_workers=2,
+                             dedup=dedup) as translator:
+            stats = translator.run(self.pages)
+        self.assertEqual(stats["failed_pages"], 0)
+        return stats
+
+    def read_page(self, name):
+        with gzip.open(os.path.join(self.output_dir, "man1", f"{name}.1.gz"), "rt",
+                       encoding="utf-8") as f:
+            return f.read()
+
+    def test_shared_unit_translated_once(self):
+        stats = self.translate()
+        self.assertEqual(stats["pages"], 2)
+        self.assertEqual(stats["shared_units"], 1)
+        self.assertEqual(stats["shared_occurrences"], 2)
+
+        sent = "\n".join(UpperService.requests)
+        self.assertEqual(sent.count("Report bugs to the maintainers"), 1)
+        self.assertNotIn("manzh-shared", sent)
+
+        for name in ("ls", "cp"):
+            page = self.read_page(name)
+            self.assertIn("REPORT BUGS TO THE MAINTAINERS", page)
+            self.assertNotIn("manzh-shared", page)
+            self.assertIn(f"THE {name.upper()} COMMAND", page)
+            # 增量翻译记录保存填回共享段落后的译文
+            translations = [translation for _, translation in load_sidecar(
+                os.path.join(self.output_dir, "man1", f"{name}.1.gz"), DEDUP_CONFIG, "roff")]
+            self.assertTrue(translations)
+            self.assertFalse(any("manzh-shared" in t for t in translations))
+
+    def test_same_pages_with_and_without_dedup(self):
+        self.translate(dedup=False)
+        expected = {name: self.read_page(name) for name in ("ls", "cp")}
+        self.assertEqual(
+            "\n".join(UpperService.requests).count("Report bugs to the maintainers"), 2)
+
+        # 清空翻译记忆并忽略已有译文，去重后重新翻译全部内容
+        shutil.rmtree(self.data_dir)
+        UpperService.requests.clear()
+        with BatchTranslator(DEDUP_CONFIG, output_dir=self.output_dir, max_workers=2,
+                             incremental=False) as translator:
+            translator.run(self.pages)
+        self.assertEqual(
+            "\n".join(UpperService.requests).count("Report bugs to the maintainers"), 1)
+        self.assertEqual({name: self.read_page(name) for name in ("ls", "cp")}, expected)
+
+    def test_normalize_unit(self):
+        self.assertEqual(normalize_unit("\na   b \nc\td \n"), "a b\nc d")
+        self.assertEqual(normalize_unit("a b"), normalize_unit("a  b  "))
+        # 行首缩进不同的单元不共享译文
+        self.assertEqual(normalize_unit("a\n  b  c"), "a\n  b c")
+        self.assertNotEqual(normalize_unit("a\n  b"), normalize_unit("a\nb"))
+        # 不填充块中的空白原样保留
+        block = ".nf\nname    size\nls      4\n.fi\nafter   text"
+        self.assertEqual(normalize_unit(block), ".nf\nname    size\nls      4\n.fi\nafter text")
+        self.assertNotEqual(normalize_unit(".EX\nls  -l\n.EE"), normalize_unit(".EX\nls -l\n.EE"))
+
+
+class SharedMarkerMaskTest(unittest.TestCase):
+
+    MARKERS = ["0123456789abcdef", "fedcba9876543210"]
+
+    def setUp(self):
+        # 与 _shared_chunks 相同：每个共享单元前加上占位行
+        self.masked = MaskedText(
+            SHARED_MARKER.format(self.MARKERS[0]) + "\n.SH BUGS\nReport bugs to \\fBme\\fR.\n"
+            + SHARED_MARKER.format(self.MARKERS[1]) + "\n.PP\nSecond shared text.")
+
+    def test_markers_are_not_sent(self):
+        self.assertTrue(self.masked.translatable)
+        self.assertNotIn("manzh-shared", self.masked.text)
+        for marker in self.MARKERS:
+            self.assertNotIn(marker, self.masked.text)
+
+    def test_translation_splits_back_per_unit(self):
+        translation = (self.masked.text.replace("Report bugs to", "错误报告给")
+                       .replace("Second shared text.", "第二个共享段落。"))
+        parts = SHARED_MARKER_PATTERN.split(self.masked.unmask(translation))
+        self.assertEqual(dict(zip(parts[1::2], (p.strip("\n") for p in parts[2::2]))), {
+            # 标题参数还原时加上引号
+            self.MARKERS[0]: '.SH "BUGS"\n错误报告给 \\fBme\\fR.',
+            self.MARKERS[1]: ".PP\n第二个共享段落。",
+        })
+
+    def test_reordered_markers_are_rejected(self):
+        text = self.masked.text
+        swapped = text.replace("⟦0⟧", "⟦x⟧").replace("⟦3⟧", "⟦0⟧").replace("⟦x⟧", "⟦3⟧")
+        with self.assertRaises(ValueError):
+            self.masked.unmask(swapped)
+
+    def test_marker_in_page_chunk_is_kept_locally(self):
+        # 手册页的块中共享单元只剩占位行，单独成块时无需翻译
+        marker = SHARED_MARKER.format(self.MARKERS[0])
+        self.assertFalse(MaskedText(marker).translatable)
+        masked = MaskedText(".PP\nLocal text.\n" + marker + "\n.PP\nMore text.")
+        self.assertNotIn("manzh-shared", masked.text)
+        self.assertEqual(masked.unmask(masked.text.replace("Local text.", "本地文本。")),
+                         ".PP\n本地文本。\n" + marker + "\n.PP\nMore text.")
+
+
+class BatchTranslatorCloseTest(DataDirTestCase):
+
+    def test_close_releases_stores(self):
+        output_dir = os.path.join(self.tmp.name, "zh_CN")
+        with BatchTranslator(SERVICE_CONFIG, output_dir=output_dir, max_workers=1) as translator:
+            self.assertIsNotNone(translator.memory)
+            self.assertIsNotNone(translator.manifest)
+
+        with self.assertRaises(sqlite3.ProgrammingError):
+            translator.memory.get("key")
+        with self.assertRaises(sqlite3.ProgrammingError):
+            translator.manifest.entries()
+
+    def test_man_index_updated_once(self):
+        output_dir = os.path.join(self.tmp.name, "zh_CN")
+        pages = [ManPage("ls", 1, lambda: roff_page("ls", "lists directory contents"))]
+        with mock.patch("man_install.update_man_index", return_value=True) as update:
+            with BatchTranslator(DEDUP_CONFIG, output_dir=output_dir,
+                                 max_workers=1) as translator:
+                translator.installer.update_index = True
+                self.assertEqual(translator.run(pages)["pages"], 1)
+                update.assert_not_called()
+        update.assert_called_once()
+        self.assertEqual(update.call_args[0][0], {output_dir})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+batching.py 的测试：批量请求的编码与解析、并发片段的合并和拆分重试
+"""
+import os
+import sys
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching import (BatchMismatchError, RequestBatcher, pack_segments,  # noqa: E402
+                      unpack_segments)
+
+SEGMENTS = [
+    "display this help and exit",
+    'output version information and exit; see "info ls"',
+    "first line\nsecond line [with brackets]",
+    "⟦0⟧ 已屏蔽的 \\fB格式\\fR 标记 ⟦1⟧",
+]
+
+
+class PackSegmentsTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        self.assertEqual(unpack_segments(pack_segments(SEGMENTS), len(SEGMENTS)), SEGMENTS)
+
+    def test_reply_with_code_fence_and_prose(self):
+        reply = f"以下是译文：\n```json\n{pack_segments(SEGMENTS)}\n```\n"
+        self.assertEqual(unpack_segments(reply, len(SEGMENTS)), SEGMENTS)
+
+    def test_segment_count_mismatch(self):
+        with self.assertRaises(BatchMismatchError):
+            unpack_segments(pack_segments(SEGMENTS[:-1]), len(SEGMENTS))
+
+    def test_invalid_replies(self):
+        for reply in ("没有数组", "[1, 2]", '["a", "b"', '["a", "  "]'):
+            with self.subTest(reply=reply), self.assertRaises(BatchMismatchError):
+                unpack_segments(reply, 2)
+
+
+class FakeStats:
+    def __init__(self):
+        self.usage = {}
+        self.batch_size = None
+
+
+class RequestBatcherTest(unittest.TestCase):
+
+    def submit_all(self, batcher, texts, send_batch, send_single):
+        stats = [FakeStats() for _ in texts]
+        barrier = threading.Barrier(len(texts))
+
+        def submit(i):
+            barrier.wait()
+            return batcher.submit("v1", texts[i], send_batch, send_single, stats[i])
+
+        with ThreadPoolExecutor(max_workers=len(texts)) as executor:
+            results = list(executor.map(submit, range(len(texts))))
+        return results, stats
+
+    def test_concurrent_segments_share_one_request(self):
+        batcher = RequestBatcher(budget=10000, max_wait=0.5)
+        batches = []
+        texts = [f"segment {i}" for i in range(6)]
+
+        def send_batch(segments, usage):
+            batches.append(list(segments))
+            usage["input_tokens"] = 60
+            usage["output_tokens"] = 120
+            return unpack_segments(pack_segments([f"译文 {s}" for s in segments]), len(segments))
+
+        def send_single(text, usage):
+            batches.append([text])
+            return f"译文 {text}"
+
+        results, stats = self.submit_all(batcher, texts, send_batch, send_single)
+        self.assertEqual(results, [f"译文 {text}" for text in texts])
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(sorted(batches[0]), sorted(texts))
+        self.assertTrue(all(s.batch_size == 6 for s in stats))
+        # 用量按输入大小分摊（片段长度相同）
+        self.assertEqual(sum(s.usage["input_tokens"] for s in stats), 60)
+        self.assertEqual(sum(s.usage["output_tokens"] for s in stats), 120)
+
+    def test_mismatch_splits_until_single_requests(self):
+        batcher = RequestBatcher(budget=10000, max_wait=0.5)
+        sizes = []
+        texts = [f"segment {i}" for i in range(4)]
+
+        def send_batch(segments, usage):
+            sizes.append(len(segments))
+            # 模型合并了两个片段
+            return unpack_segments(pack_segments(["合并的译文"] * (len(segments) - 1)),
+                                   len(segments))
+
+        def send_single(text, usage):
+            sizes.append(1)
+            return f"译文 {text}"
+
+        results, _ = self.submit_all(batcher, texts, send_batch, send_single)
+        self.assertEqual(results, [f"译文 {text}" for text in texts])
+        self.assertEqual(sorted(sizes, reverse=True), [4, 2, 2, 1, 1, 1, 1])
+
+    def test_budget_limits_batch(self):
+        batcher = RequestBatcher(budget=20, max_wait=0.5)
+        self.assertTrue(batcher.accepts("x" * 10))
+        self.assertFalse(batcher.accepts("x" * 11))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+"""
+checkpoint.py 的测试：检查点按分块、服务和提示词版本区分，分块不一致的检查点不会恢复，
+--resume 时只翻译检查点中缺失的块
+"""
+import io
+import os
+import re
+import sys
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import CheckpointJournal, document_id  # noqa: E402
+from support import SERVICE_CONFIG, DataDirTestCase  # noqa: E402
+from translate import (TranslationService, get_translation_service,  # noqa: E402
+                       register_service, translate_document)
+
+CONFIG = {"type": "chatgpt", "model": "test-model", "language": "中文"}
+CHUNKS = ["first chunk", "second chunk", "third chunk"]
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_journal(self, prompt_version):
+        journal = CheckpointJournal(self.tmp.name, CHUNKS, CONFIG, prompt_version)
+        journal.open()
+        journal.record(0, "第一块")
+        journal.record(2, "第三块")
+        journal.close()
+
+    def test_document_id_includes_prompt_version(self):
+        self.assertEqual(document_id(CHUNKS, CONFIG, "1-roff"),
+                         document_id(CHUNKS, CONFIG, "1-roff"))
+        self.assertNotEqual(document_id(CHUNKS, CONFIG, "1-roff"),
+                            document_id(CHUNKS, CONFIG, "1-roff-compact"))
+        self.assertNotEqual(document_id(CHUNKS, CONFIG, "1-roff"),
+                            document_id(CHUNKS, dict(CONFIG, model="other"), "1-roff"))
+
+    def test_resume_with_same_prompt(self):
+        self.write_journal("1-roff")
+        journal = CheckpointJournal(self.tmp.name, CHUNKS, CONFIG, "1-roff")
+        self.assertEqual(journal.load(), {0: "第一块", 2: "第三块"})
+
+    def test_other_prompt_does_not_resume(self):
+        self.write_journal("1-roff")
+        journal = CheckpointJournal(self.tmp.name, CHUNKS, CONFIG, "1-roff-compact")
+        self.assertEqual(journal.load(), {})
+
+    def test_changed_chunks_do_not_resume(self):
+        self.write_journal("1-roff")
+        changed = CHUNKS[:2] + ["third chunk, edited"]
+        self.assertNotEqual(document_id(changed, CONFIG, "1-roff"),
+                            document_id(CHUNKS, CONFIG, "1-roff"))
+        self.assertEqual(CheckpointJournal(self.tmp.name, changed, CONFIG, "1-roff").load(), {})
+
+    def test_mismatched_header_is_rejected(self):
+        self.write_journal("1-roff")
+        journal = CheckpointJournal(self.tmp.name, CHUNKS, CONFIG, "1-roff")
+        with open(journal.path, encoding="utf-8") as f:
+            lines = f.readlines()
+        header = json.loads(lines[0])
+        header["chunks"] = list(reversed(header["chunks"]))
+        with open(journal.path, "w", encoding="utf-8") as f:
+            f.writelines([json.dumps(header) + "\n"] + lines[1:])
+        self.assertEqual(journal.load(), {})
+
+        # 不一致的检查点在打开时重新开始
+        journal.open(resume=True)
+        journal.record(1, "第二块")
+        journal.close()
+        self.assertEqual(journal.load(), {1: "第二块"})
+
+    def test_incomplete_last_line_is_ignored(self):
+        self.write_journal("1-roff")
+        journal = CheckpointJournal(self.tmp.name, CHUNKS, CONFIG, "1-roff")
+        with open(journal.path, "a", encoding="utf-8") as f:
+            f.write('{"index": 1, "res')
+        self.assertEqual(journal.load(), {0: "第一块", 2: "第三块"})
+
+    def test_open_without_resume_starts_over(self):
+        self.write_journal("1-roff")
+        journal = CheckpointJournal(self.tmp.name, CHUNKS, CONFIG, "1-roff")
+        journal.open(resume=False)
+        journal.close()
+        self.assertEqual(journal.load(), {})
+
+
+class FlakyService(TranslationService):
+    """fail 为 True 时第 2 段失败的假翻译服务，记录每次请求的段落序号"""
+
+    fail = True
+
+    def __init__(self, config):
+        self.lock = threading.Lock()
+        self.requested = []
+
+    def translate(self, content, system_prompt, usage=None):
+        index = int(re.search(r"Paragraph (\d+)", content).group(1))
+        with self.lock:
+            self.requested.append(index)
+        if FlakyService.fail and index == 2:
+            raise RuntimeError("服务错误")
+        return f"译文：{content}"
+
+
+register_service("test-flaky", FlakyService)
+
+RESUME_CONFIG = dict(SERVICE_CONFIG, type="test-flaky", url="http://resume.invalid/v1",
+                     max_output_length=150, concurrency=2, max_concurrency=2,
+                     batch_requests=False)
+
+
+class ResumeTest(DataDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.paragraphs = [f"Paragraph {i} " + "describes the command in detail. " * 8
+                           for i in range(5)]
+        self.content = "\n\n".join(self.paragraphs)
+        self.service = None
+
+    def translate(self, content, resume):
+        self.service = get_translation_service(RESUME_CONFIG)
+        self.service.requested.clear()
+        stdout = io.StringIO()
+        with open(os.devnull, "w") as log, mock.patch("time.sleep"):
+            ok = translate_document(content, RESUME_CONFIG, resume=resume,
+                                    stdout=stdout, log=log)
+        return ok, stdout.getvalue()
+
+    def checkpoints(self):
+        directory = os.path.join(self.data_dir, "checkpoints")
+        return os.listdir(directory) if os.path.isdir(directory) else []
+
+    def test_resume_translates_only_missing_chunks(self):
+        FlakyService.fail = True
+        ok, _ = self.translate(self.content, resume=False)
+        self.assertFalse(ok)
+        self.assertEqual(len(self.checkpoints()), 1)
+
+        FlakyService.fail = False
+        ok, output = self.translate(self.content, resume=True)
+        self.assertTrue(ok)
+        self.assertEqual(self.service.requested, [2])
+        self.assertEqual(output,
+                         "\n\n".join(f"译文：{p.strip()}" for p in self.paragraphs) + "\n")
+        # 全部完成后删除检查点
+        self.assertEqual(self.checkpoints(), [])
+
+    def test_without_resume_translates_everything(self):
+        FlakyService.fail = True
+        self.translate(self.content, resume=False)
+        FlakyService.fail = False
+        ok, _ = self.translate(self.content, resume=False)
+        self.assertTrue(ok)
+        self.assertEqual(sorted(self.service.requested), list(range(5)))
+
+    def test_changed_document_does_not_resume(self):
+        FlakyService.fail = True
+        self.translate(self.content, resume=False)
+        FlakyService.fail = False
+        self.paragraphs[0] = "Paragraph 0 " + "explains the command in detail. " * 8
+        ok, _ = self.translate("\n\n".join(self.paragraphs), resume=True)
+        self.assertTrue(ok)
+        self.assertEqual(sorted(self.service.requested), list(range(5)))
+
+
+if __name__ == "__main__":
+    unittest.main()
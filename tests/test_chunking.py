@@ -0,0 +1,93 @@
+"""
+translate.py 的分块测试：按服务的上下文和输出长度计算 token 预算，
+超出预算的段落按行、句子、单词或字符拆分，拆分后的片段不超过预算且内容不丢失
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompts import system_prompts  # noqa: E402
+from translate import (MIN_CHUNK_TOKENS, OUTPUT_EXPANSION_RATIO,  # noqa: E402
+                       REQUEST_OVERHEAD_TOKENS, TranslationQueue, chunk_token_budget,
+                       estimate_tokens)
+
+SENTENCE = "The quick brown fox jumps over the lazy dog near the river bank."
+
+
+class ChunkTokenBudgetTest(unittest.TestCase):
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcd"), 2)
+        # CJK 字符每个按 1 个 token 计算
+        self.assertEqual(estimate_tokens("中文abc"), 3)
+
+    def test_limited_by_output_length(self):
+        config = {"max_output_length": 2000, "max_context_length": 100000}
+        self.assertEqual(chunk_token_budget(config), int(2000 / OUTPUT_EXPANSION_RATIO))
+
+    def test_limited_by_context_length(self):
+        config = {"max_output_length": 3000, "max_context_length": 4000}
+        prompt_tokens = max(estimate_tokens(p) for p in system_prompts(config)) \
+            + REQUEST_OVERHEAD_TOKENS
+        budget = chunk_token_budget(config)
+        self.assertEqual(budget, int((4000 - prompt_tokens) / (1 + OUTPUT_EXPANSION_RATIO)))
+        # 提示词 + 原文 + 按膨胀系数估算的译文不超过上下文长度
+        self.assertLessEqual(prompt_tokens + budget * (1 + OUTPUT_EXPANSION_RATIO), 4000)
+
+    def test_minimum_budget(self):
+        for config in ({"max_output_length": 100, "max_context_length": 100000},
+                       {"max_output_length": 4000, "max_context_length": 300}):
+            self.assertEqual(chunk_token_budget(config), MIN_CHUNK_TOKENS)
+
+
+class OversizedParagraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = TranslationQueue(chunk_size=40, show_progress=False,
+                                      size_func=estimate_tokens)
+
+    def assert_within_budget(self, pieces):
+        self.assertGreater(len(pieces), 1)
+        for piece in pieces:
+            self.assertLessEqual(estimate_tokens(piece), self.queue.chunk_size, piece)
+
+    def test_split_by_sentences(self):
+        para = " ".join([SENTENCE] * 10)
+        units = self.queue.split_units(f"short intro\n\n{para}\n\nshort outro")
+        self.assertEqual(units[0], "short intro")
+        self.assertEqual(units[-1], "short outro")
+        pieces = units[1:-1]
+        self.assert_within_budget(pieces)
+        self.assertEqual(" ".join(pieces).split(), para.split())
+
+    def test_split_by_lines(self):
+        para = "\n".join(f"{i}: {SENTENCE}" for i in range(8))
+        pieces = self.queue.split_units(para)
+        self.assert_within_budget(pieces)
+        self.assertEqual("\n".join(pieces), para)
+
+    def test_long_sentence_split_by_words(self):
+        para = " ".join(f"word{i}" for i in range(100))
+        pieces = self.queue.split_units(para)
+        self.assert_within_budget(pieces)
+        self.assertEqual(" ".join(pieces), para)
+
+    def test_unbroken_text_split_by_characters(self):
+        para = "x" * 500
+        pieces = self.queue.split_units(para)
+        self.assert_within_budget(pieces)
+        self.assertEqual("".join(pieces), para)
+
+    def test_packed_chunks_within_budget(self):
+        content = "\n\n".join([SENTENCE, " ".join([SENTENCE] * 10), SENTENCE, SENTENCE])
+        chunks = self.queue.prepare_content(content)
+        for chunk in chunks:
+            self.assertLessEqual(estimate_tokens(chunk), self.queue.chunk_size)
+        self.assertEqual(" ".join(chunks).split(), content.split())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+incremental.py 的测试：增量翻译记录只在服务字段和提示词版本一致时复用，
+增量翻译计划只复用完整且连续未改变的旧段
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompts  # noqa: E402
+from incremental import (SIDECAR_VERSION, load_sidecar, plan_segments,  # noqa: E402
+                         save_sidecar, sidecar_path)
+
+CONFIG = {"type": "chatgpt", "model": "test-model", "language": "中文"}
+SEGMENTS = [(["first", "second"], "第一段\n\n第二段"), (["third"], "第三段")]
+
+
+class SidecarTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmp.name, "man1", "ls.1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        save_sidecar(self.output, CONFIG, "roff", SEGMENTS)
+        self.assertEqual(sidecar_path(self.output + ".gz"),
+                         os.path.join(self.tmp.name, "man1", ".manzh", "ls.1.json"))
+        self.assertEqual(load_sidecar(self.output + ".gz", CONFIG, "roff"), SEGMENTS)
+
+    def test_service_change_invalidates(self):
+        save_sidecar(self.output, CONFIG, "roff", SEGMENTS)
+        for field, value in [("type", "gemini"), ("model", "other"), ("language", "日本語")]:
+            with self.subTest(field=field):
+                self.assertEqual(load_sidecar(self.output, dict(CONFIG, **{field: value}),
+                                              "roff"), [])
+
+    def test_prompt_style_change_invalidates(self):
+        save_sidecar(self.output, CONFIG, "roff", SEGMENTS)
+        self.assertEqual(load_sidecar(self.output, dict(CONFIG, prompt_style="full"), "roff"),
+                         SEGMENTS)
+        self.assertEqual(load_sidecar(self.output, dict(CONFIG, prompt_style="compact"), "roff"),
+                         [])
+        # roff 和纯文本使用不同的提示词
+        self.assertEqual(load_sidecar(self.output, CONFIG, "text"), [])
+
+    def test_prompt_version_bump_invalidates(self):
+        save_sidecar(self.output, CONFIG, "text", SEGMENTS)
+        with mock.patch.object(prompts, "PROMPT_VERSION", prompts.PROMPT_VERSION + 1):
+            self.assertEqual(load_sidecar(self.output, CONFIG, "text"), [])
+
+    def test_old_format_is_ignored(self):
+        path = sidecar_path(self.output)
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": SIDECAR_VERSION - 1, "service": {}, "segments": []}, f)
+        self.assertEqual(load_sidecar(self.output, CONFIG, "roff"), [])
+
+
+def group_pairs(units):
+    """每两个单元一组的分组函数"""
+    return [units[i:i + 2] for i in range(0, len(units), 2)]
+
+
+class PlanSegmentsTest(unittest.TestCase):
+
+    PREVIOUS = [(["a", "b"], "AB"), (["c"], "C"), (["d", "e"], "DE")]
+
+    def plan(self, units):
+        return plan_segments(units, self.PREVIOUS, group_pairs)
+
+    def test_without_previous_translates_everything(self):
+        self.assertEqual(plan_segments(["a", "b", "c"], [], group_pairs),
+                         [(["a", "b"], None), (["c"], None)])
+
+    def test_unchanged(self):
+        self.assertEqual(self.plan(["a", "b", "c", "d", "e"]), self.PREVIOUS)
+
+    def test_insert(self):
+        self.assertEqual(self.plan(["x", "a", "b", "c", "y", "z", "w", "d", "e"]),
+                         [(["x"], None), (["a", "b"], "AB"), (["c"], "C"),
+                          (["y", "z"], None), (["w"], None), (["d", "e"], "DE")])
+
+    def test_insert_inside_segment(self):
+        # 被打断的旧段整体重新翻译
+        self.assertEqual(self.plan(["a", "b", "c", "d", "x", "e"]),
+                         [(["a", "b"], "AB"), (["c"], "C"), (["d", "x"], None), (["e"], None)])
+
+    def test_delete(self):
+        self.assertEqual(self.plan(["a", "b", "d", "e"]),
+                         [(["a", "b"], "AB"), (["d", "e"], "DE")])
+        # 删除旧段中的单元后，该段其余单元重新翻译
+        self.assertEqual(self.plan(["a", "c", "d", "e"]),
+                         [(["a"], None), (["c"], "C"), (["d", "e"], "DE")])
+
+    def test_modify(self):
+        self.assertEqual(self.plan(["a", "b", "c2", "d", "e"]),
+                         [(["a", "b"], "AB"), (["c2"], None), (["d", "e"], "DE")])
+        self.assertEqual(self.plan(["a", "b", "c", "d2", "e"]),
+                         [(["a", "b"], "AB"), (["c"], "C"), (["d2", "e"], None)])
+
+    def test_moved_unit_is_translated_again(self):
+        # 按 difflib 的最长匹配对齐，移动到前面的段不再复用
+        self.assertEqual(self.plan(["c", "a", "b", "d", "e"]),
+                         [(["c"], None), (["a", "b"], "AB"), (["d", "e"], "DE")])
+
+
+if __name__ == "__main__":
+    unittest.main()
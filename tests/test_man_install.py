@@ -0,0 +1,159 @@
+"""
+man_install.py 的测试：压缩写入完整、原子替换，切换压缩格式时清理旧译文，
+以及不导入翻译服务读取记入译文清单的服务字段
+"""
+import os
+import sys
+import gzip
+import json
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from man_install import (ManInstaller, help_page, man_root, manifest_service,  # noqa: E402
+                         page_path, write_page)
+from manifest import TranslationManifest  # noqa: E402
+from support import SERVICE_CONFIG, DataDirTestCase  # noqa: E402
+from translate import load_config  # noqa: E402
+
+PAGE = '.TH LS 1\n.SH 名称\nls \\- 列出目录内容\n' + '.PP\n列出文件信息。\n' * 2000
+
+
+class WritePageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ls.1.gz")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_gzip_page_is_complete(self):
+        write_page(self.path, PAGE)
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            self.assertEqual(f.read(), PAGE)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o644)
+        self.assertEqual(os.listdir(self.tmp.name), ["ls.1.gz"])
+
+    def test_same_text_gives_same_file(self):
+        write_page(self.path, PAGE)
+        with open(self.path, "rb") as f:
+            first = f.read()
+        write_page(self.path, PAGE)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), first)
+
+    def test_failed_write_keeps_old_page(self):
+        write_page(self.path, "旧译文\n")
+        with mock.patch("gzip.GzipFile.write", side_effect=OSError("磁盘已满")):
+            with self.assertRaises(OSError):
+                write_page(self.path, PAGE)
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "旧译文\n")
+        self.assertEqual(os.listdir(self.tmp.name), ["ls.1.gz"])
+
+    def test_plain_page(self):
+        path = os.path.join(self.tmp.name, "ls.1")
+        write_page(path, PAGE)
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), PAGE)
+
+
+class ManInstallerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "zh_CN")
+        self.plain = os.path.join(self.root, "man1", "ls.1")
+        self.manifest = TranslationManifest(os.path.join(self.tmp.name, "manifest.db"))
+
+    def tearDown(self):
+        self.manifest.close()
+        self.tmp.cleanup()
+
+    def test_paths(self):
+        self.assertEqual(page_path(self.plain), self.plain + ".gz")
+        self.assertEqual(page_path(self.plain + ".gz", compress=False), self.plain)
+        self.assertEqual(man_root(self.plain), self.root)
+        self.assertIsNone(man_root(os.path.join(self.tmp.name, "ls.1")))
+
+    def test_install_replaces_other_format(self):
+        with ManInstaller(compress=False, update_index=False) as installer:
+            installer.install(self.plain, "旧译文\n")
+        self.manifest.record(self.plain, None, {}, 1)
+
+        with ManInstaller(update_index=False, manifest=self.manifest) as installer:
+            path = installer.install(self.plain, PAGE)
+            self.assertEqual(installer.roots, {self.root})
+
+        self.assertEqual(path, self.plain + ".gz")
+        self.assertFalse(os.path.exists(self.plain))
+        self.assertIsNone(self.manifest.get(self.plain))
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            self.assertEqual(f.read(), PAGE)
+
+    def test_preview_keeps_other_format(self):
+        with ManInstaller(compress=False, update_index=False) as installer:
+            installer.install(self.plain, "旧译文\n")
+        with ManInstaller(update_index=False) as installer:
+            installer.install(self.plain, PAGE, index=False)
+            self.assertEqual(installer.roots, set())
+        self.assertTrue(os.path.exists(self.plain))
+        self.assertTrue(os.path.exists(self.plain + ".gz"))
+
+    def test_discard(self):
+        with ManInstaller(update_index=False) as installer:
+            installer.install(self.plain, PAGE, index=False)
+            installer.discard(self.plain)
+            self.assertEqual(installer.roots, {self.root})
+        self.assertEqual(os.listdir(os.path.dirname(self.plain)), [])
+
+    def test_missing_mandb_is_reported(self):
+        installer = ManInstaller()
+        installer.install(self.plain, PAGE)
+        with mock.patch("shutil.which", return_value=None):
+            self.assertFalse(installer.close())
+        self.assertTrue(installer.close())  # 没有待更新的目录
+
+    def test_help_page(self):
+        page = help_page("demo", "用法：demo [选项]\n显示演示信息\n")
+        self.assertTrue(page.startswith(".TH demo 1 "))
+        self.assertIn("demo \\- 用法：demo [选项]\n", page)
+        self.assertIn("'demo --help'", page)
+
+
+class ManifestServiceTest(DataDirTestCase):
+
+    def write_config(self, default_service):
+        services = {
+            "a": dict(SERVICE_CONFIG, model="model-a"),
+            "b": dict(SERVICE_CONFIG, type="gemini", model="model-b"),
+            "pool": {"type": "pool", "members": {"a": 2, "b": 1}},
+        }
+        for service in services.values():
+            service.pop("language", None)
+        with open("config.json", "w", encoding="utf-8") as f:
+            json.dump({"default_service": default_service, "defaults": {"language": "日本語"},
+                       "services": services}, f)
+
+    def test_same_fields_as_load_config(self):
+        for name in ("a", "b", "pool"):
+            with self.subTest(service=name):
+                self.write_config(name)
+                config = load_config(service_name=name)
+                expected = {key: config[key] for key in ("type", "model", "language")}
+                if "service" in config:
+                    expected["service"] = config["service"]
+                self.assertEqual(manifest_service(), expected)
+
+    def test_unreadable_config(self):
+        self.write_config("missing")
+        self.assertIsNone(manifest_service())
+        self.assertIsNone(manifest_service("nonexistent.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
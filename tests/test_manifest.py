@@ -0,0 +1,67 @@
+"""
+manifest.py 的测试：列出译文时合并清单记录与目录中的译文
+"""
+import io
+import os
+import sys
+import argparse
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from manifest import TranslationManifest, cmd_list, scan_pages  # noqa: E402
+
+CONFIG = {"service": "openai", "model": "test-model", "language": "中文"}
+
+
+class ManifestListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.man_dir = os.path.join(self.tmp.name, "zh_CN")
+        for path in ("man1/ls.1.gz", "man1/cp.1", "man8/mount.8"):
+            self.write(path)
+        # 临时文件、备份和增量翻译的记录不是译文
+        self.write("man1/.ls.1.gz.123.tmp")
+        self.write("man1/.manzh/ls.1.json")
+        self.manifest = TranslationManifest(os.path.join(self.tmp.name, "manifest.db"))
+
+    def tearDown(self):
+        self.manifest.close()
+        self.tmp.cleanup()
+
+    def write(self, relative):
+        path = os.path.join(self.man_dir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("page\n")
+        return path
+
+    def list_output(self, manifest):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            cmd_list(manifest, argparse.Namespace(dir=self.man_dir))
+        return out.getvalue()
+
+    def test_scan_pages_skips_hidden_files(self):
+        pages = [os.path.relpath(p, self.man_dir) for p in scan_pages(self.man_dir)]
+        self.assertEqual(pages, ["man1/cp.1", "man1/ls.1.gz", "man8/mount.8"])
+
+    def test_list_includes_pages_missing_from_manifest(self):
+        self.manifest.record(os.path.join(self.man_dir, "man1", "ls.1.gz"), None, CONFIG, 3)
+        output = self.list_output(self.manifest)
+
+        self.assertIn("openai/test-model", output)
+        self.assertRegex(output, r"cp\s+（未记录在译文清单中）")
+        self.assertRegex(output, r"mount\s+（未记录在译文清单中）")
+        self.assertIn("总计：3 个已翻译的手册页（其中 2 个未记录在译文清单中）", output)
+
+    def test_list_without_manifest_scans_directory(self):
+        output = self.list_output(None)
+        self.assertIn("总计：3 个已翻译的手册页（其中 3 个未记录在译文清单中）", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+metrics.py 的测试：块指标、运行汇总以及 JSON Lines / Prometheus textfile 输出
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import ChunkStats, RunMetrics, percentile  # noqa: E402
+
+CONFIG = {"service": "test", "model": "fake-model"}
+
+
+def chunk(index, cache="miss", ok=True, latency=1.0, usage=None, requests=1, estimate=None):
+    stats = ChunkStats(index, "x" * 40, CONFIG, document="ls.1")
+    stats.cache = cache
+    stats.latency = latency
+    stats.request_time = latency
+    stats.requests = requests if cache == "miss" else 0
+    stats.usage = usage or {}
+    return stats.finish(ok, "译文" * 5, estimate)
+
+
+class PercentileTest(unittest.TestCase):
+
+    def test_interpolates(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 100), 5)
+
+
+class ChunkStatsTest(unittest.TestCase):
+
+    def test_usage_from_service(self):
+        stats = chunk(0, usage={"input_tokens": 12, "output_tokens": 7, "cached_input_tokens": 4})
+        record = stats.to_dict()
+        self.assertEqual(record["status"], "ok")
+        self.assertEqual((record["input_tokens"], record["output_tokens"]), (12, 7))
+        self.assertEqual(record["cached_input_tokens"], 4)
+        self.assertEqual(record["tokens_source"], "usage")
+        self.assertEqual(record["output_chars"], 10)
+
+    def test_estimate_when_service_reports_nothing(self):
+        stats = chunk(0, estimate=len)
+        self.assertEqual((stats.input_tokens, stats.output_tokens), (40, 10))
+        self.assertEqual(stats.tokens_source, "estimate")
+
+    def test_cache_hit_costs_no_tokens(self):
+        stats = chunk(0, cache="memory", usage={"input_tokens": 12, "output_tokens": 7},
+                      estimate=len)
+        self.assertEqual((stats.input_tokens, stats.output_tokens), (0, 0))
+        self.assertIsNone(stats.tokens_source)
+
+
+class RunMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.metrics = RunMetrics(CONFIG, path=os.path.join(self.tmp.name, "m", "metrics.jsonl"),
+                                  prometheus_path=os.path.join(self.tmp.name, "manzh.prom"))
+        usage = {"input_tokens": 10, "output_tokens": 20, "backend": "a"}
+        self.metrics.record(chunk(0, latency=1.0, usage=usage))
+        self.metrics.record(chunk(1, latency=3.0, usage=dict(usage, backend="b", hedged=True)))
+        self.metrics.record(chunk(2, cache="memory"))
+        self.metrics.record(chunk(3, cache="shared"))
+        self.metrics.record(chunk(4, ok=False, latency=9.0))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_summary(self):
+        s = self.metrics.summary()
+        self.assertEqual(s["chunks"], 5)
+        self.assertEqual(s["failed"], 1)
+        self.assertEqual((s["cache_miss"], s["cache_memory"], s["cache_shared"]), (3, 1, 1))
+        self.assertEqual(s["requests"], 3)
+        # 失败的块不计入延迟
+        self.assertEqual(s["latency_p50"], 2.0)
+        self.assertEqual(s["latency_max"], 3.0)
+        self.assertEqual((s["input_tokens"], s["output_tokens"]), (20, 40))
+        self.assertEqual(s["seconds_per_1k_output_tokens"], 100.0)
+        self.assertEqual(s["backends"], {"a": 1, "b": 1})
+        self.assertEqual(s["hedged_chunks"], 1)
+        self.assertIn("指标：5 块", self.metrics.format_summary(s))
+
+    def test_write_jsonl_and_prometheus(self):
+        summary = self.metrics.write()
+        self.metrics.write()
+
+        with open(self.metrics.path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 12)
+        self.assertEqual([r["type"] for r in records[:6]], ["chunk"] * 5 + ["run"])
+        self.assertTrue(all(r["run_id"] == summary["run_id"] for r in records))
+
+        with open(self.metrics.prometheus_path, encoding="utf-8") as f:
+            text = f.read()
+        labels = 'mode="translate",service="test",model="fake-model"'
+        self.assertIn(f'manzh_last_run_chunks{{{labels},cache="memory"}} 1\n', text)
+        self.assertIn(f'manzh_last_run_backend_chunks{{{labels},backend="b"}} 1\n', text)
+        self.assertIn("# TYPE manzh_last_run_requests gauge\n", text)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["m", "manzh.prom"])
+
+    def test_chunk_records_can_be_skipped(self):
+        self.metrics.record_chunks = False
+        self.metrics.write()
+        with open(self.metrics.path, encoding="utf-8") as f:
+            self.assertEqual([json.loads(line)["type"] for line in f], ["run"])
+
+    def test_label_escaping(self):
+        metrics = RunMetrics({"service": 'a"b', "model": "x\\y"},
+                             prometheus_path=os.path.join(self.tmp.name, "esc.prom"))
+        metrics.write()
+        with open(metrics.prometheus_path, encoding="utf-8") as f:
+            self.assertIn('service="a\\"b",model="x\\\\y"', f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+容量估算（--plan）的测试：只在本地估算，不创建、不修改任何文件；
+预计耗时按调度器从初始并发逐步增加到上限估算
+"""
+import io
+import os
+import sys
+import argparse
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translate import create_translation_memory, plan_translation  # noqa: E402
+from translation_memory import TranslationMemory  # noqa: E402
+from batch_translate import pages_from_directory, plan_batch  # noqa: E402
+from planner import plan_service, ramp_duration  # noqa: E402
+from support import SERVICE_CONFIG, DataDirTestCase  # noqa: E402
+
+PAGE = """.TH DEMO 1
+.SH NAME
+demo \\- print a demonstration message
+.SH DESCRIPTION
+.B demo
+prints a short message and exits.
+.SH OPTIONS
+.TP
+.B \\-h
+display this help and exit
+"""
+
+
+def snapshot(directory):
+    """目录中每个文件的 (路径, 大小, 修改时间)"""
+    files = set()
+    for root, _, names in os.walk(directory):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            files.add((os.path.join(root, name), stat.st_size, stat.st_mtime_ns))
+    return files
+
+
+class PlanWritesNothingTest(DataDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source_dir = os.path.join(self.tmp.name, "src", "man1")
+        os.makedirs(self.source_dir)
+        with open(os.path.join(self.source_dir, "demo.1"), "w", encoding="utf-8") as f:
+            f.write(PAGE)
+        self.output_dir = os.path.join(self.tmp.name, "zh_CN")
+        self.args = argparse.Namespace(service=None, output_dir=self.output_dir, workers=None,
+                                       no_incremental=False, no_dedup=False)
+
+    def plan_batch(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            plan_batch(pages_from_directory(self.source_dir), self.args)
+        return out.getvalue()
+
+    def test_plan_without_data_dir_creates_nothing(self):
+        before = snapshot(self.tmp.name)
+        self.assertIn("test", self.plan_batch())
+        with redirect_stdout(io.StringIO()):
+            self.assertTrue(plan_translation(PAGE, output=os.path.join(self.output_dir, "demo.1")))
+
+        self.assertFalse(os.path.exists(self.data_dir))
+        self.assertFalse(os.path.exists(self.output_dir))
+        self.assertEqual(snapshot(self.tmp.name), before)
+
+    def test_plan_reads_existing_memory_without_writing(self):
+        memory = create_translation_memory()
+        memory.put(TranslationMemory.make_key("unused", {}, "1"), "译文")
+        memory.close()
+        before = snapshot(self.tmp.name)
+
+        self.plan_batch()
+        self.assertEqual(snapshot(self.tmp.name), before)
+
+
+class ConcurrencyEstimateTest(DataDirTestCase):
+
+    def test_ramp_duration(self):
+        latencies = [10.0] * 100
+        self.assertEqual(ramp_duration([], 4, 16), 0.0)
+        self.assertAlmostEqual(ramp_duration(latencies, 16, 16), 1000 / 16)
+        self.assertAlmostEqual(ramp_duration(latencies, 4, 4), 1000 / 4)
+        # 从 4 开始逐步增加，耗时介于固定并发 4 和 16 之间
+        ramped = ramp_duration(latencies, 4, 16)
+        self.assertGreater(ramped, 1000 / 16 * 1.2)
+        self.assertLess(ramped, 1000 / 4)
+        # 请求越多，爬升阶段所占比例越小
+        self.assertLess(ramp_duration([10.0] * 2000, 4, 16) / 2000, ramped / 100)
+
+    def test_plan_starts_from_initial_concurrency(self):
+        chunks = [("text", f"Paragraph {i} " + "describes the command. " * 40) for i in range(50)]
+        config = dict(SERVICE_CONFIG, batch_requests=False)
+        plan = plan_service("test", config, chunks)
+        self.assertEqual((plan["concurrency"], plan["max_concurrency"]), (4, 16))
+        self.assertEqual(plan["bottleneck"], "concurrency")
+
+        fixed = plan_service("test", dict(config, concurrency=16), chunks)
+        self.assertGreater(plan["wall_time"], fixed["wall_time"] * 1.5)
+        # 线程数同时限制并发上限
+        limited = plan_service("test", config, chunks, max_workers=2)
+        self.assertEqual((limited["concurrency"], limited["max_concurrency"]), (2, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+"""
+rate_limit.py 的测试：令牌桶限速、AIMD 并发控制，以及调度器只对服务端错误降低并发
+
+令牌桶和暂停时间使用假时钟，不依赖实际耗时。
+"""
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limit  # noqa: E402
+from rate_limit import (AdaptiveConcurrencyLimiter, RateLimitError, ServiceScheduler,  # noqa: E402
+                        TokenBucket, parse_retry_after)
+
+
+class FakeClock:
+    """替换 rate_limit 模块中的 time：sleep 只推进时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+class FakeClockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(rate_limit, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TokenBucketTest(FakeClockTestCase):
+
+    def test_full_bucket_does_not_wait(self):
+        bucket = TokenBucket(60)
+        for _ in range(60):
+            bucket.acquire()
+        self.assertEqual(self.clock.slept, 0.0)
+
+    def test_waits_for_refill(self):
+        bucket = TokenBucket(60)  # 每秒 1 个令牌
+        bucket.acquire(60)
+        bucket.acquire(3)
+        self.assertAlmostEqual(self.clock.slept, 3.0)
+
+    def test_refill_is_capped(self):
+        bucket = TokenBucket(60)
+        bucket.acquire(60)
+        self.clock.now += 3600
+        bucket.acquire(60)
+        self.assertEqual(self.clock.slept, 0.0)
+        bucket.acquire(1)
+        self.assertAlmostEqual(self.clock.slept, 1.0)
+
+    def test_request_larger_than_capacity(self):
+        bucket = TokenBucket(60)
+        bucket.acquire(1000)
+        self.assertEqual(self.clock.slept, 0.0)
+        self.assertEqual(bucket.tokens, 0.0)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+
+class AdaptiveConcurrencyLimiterTest(FakeClockTestCase):
+
+    def test_additive_increase_up_to_max(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=4, max_limit=6)
+        for _ in range(4):
+            limiter.on_success(1.0)
+        # 每完成约 limit 个请求并发加 1
+        self.assertEqual(limiter.current_limit, 4)
+        limiter.on_success(1.0)
+        self.assertEqual(limiter.current_limit, 5)
+        for _ in range(100):
+            limiter.on_success(1.0)
+        self.assertEqual(limiter.limit, 6.0)
+
+    def test_multiplicative_decrease_down_to_min(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=16, min_limit=2, max_limit=16)
+        limiter.on_error()
+        self.assertEqual(limiter.limit, 12.0)
+        limiter.on_throttle()
+        self.assertEqual(limiter.limit, 6.0)
+        for _ in range(10):
+            limiter.on_error()
+        self.assertEqual(limiter.limit, 2.0)
+
+    def test_latency_rise_decreases_once(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=10, max_limit=10)
+        for _ in range(20):
+            limiter.on_success(1.0)
+        limiter.on_success(10.0)
+        self.assertAlmostEqual(limiter.limit, 9.0)
+        # 降低并发后以基线重新观察，下一次正常延迟不会再次降低
+        limiter.on_success(1.0)
+        self.assertGreater(limiter.limit, 9.0)
+
+    def test_throttle_pauses_for_retry_after(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=4)
+        limiter.on_throttle(retry_after=30)
+        self.assertEqual(limiter.pause_until, self.clock.now + 30)
+        limiter.on_throttle()  # 未指定时暂停 1 秒，不缩短已有的暂停
+        self.assertEqual(limiter.pause_until, self.clock.now + 30)
+        self.assertEqual(limiter.current_limit, 1)
+
+    def test_initial_is_clamped(self):
+        self.assertEqual(AdaptiveConcurrencyLimiter(initial=50, max_limit=8).current_limit, 8)
+        with self.assertRaises(ValueError):
+            AdaptiveConcurrencyLimiter(min_limit=4, max_limit=2)
+
+
+class ContentError(ValueError):
+    pass
+
+
+class ServiceSchedulerTest(FakeClockTestCase):
+
+    def scheduler(self, **config):
+        return ServiceScheduler(dict({"concurrency": 8}, **config),
+                                content_errors=(ContentError,))
+
+    def fail(self, scheduler, error):
+        def request():
+            raise error
+        with self.assertRaises(type(error)):
+            scheduler.call(request)
+        self.assertEqual(scheduler.limiter.in_flight, 0)
+
+    def test_rpm_and_tpm_caps(self):
+        scheduler = self.scheduler(rpm=6000, tpm=600)  # 每秒 10 个 token
+        self.assertEqual(scheduler.call(lambda: "ok", tokens=600), "ok")
+        self.assertEqual(self.clock.slept, 0.0)
+        scheduler.call(lambda: "ok", tokens=300)
+        self.assertAlmostEqual(self.clock.slept, 30.0)
+
+        scheduler = self.scheduler(rpm=60)
+        self.clock.slept = 0.0
+        for _ in range(62):
+            scheduler.call(lambda: "ok")
+        self.assertAlmostEqual(self.clock.slept, 2.0)
+
+    def test_content_errors_keep_concurrency(self):
+        scheduler = self.scheduler()
+        self.fail(scheduler, ContentError("译文被截断"))
+        self.assertEqual(scheduler.limiter.limit, 8.0)
+
+    def test_request_errors_decrease_concurrency(self):
+        scheduler = self.scheduler()
+        self.fail(scheduler, RuntimeError("HTTP 503"))
+        self.assertEqual(scheduler.limiter.limit, 6.0)
+
+    def test_rate_limit_throttles(self):
+        scheduler = self.scheduler()
+        self.fail(scheduler, RateLimitError("HTTP 429", retry_after=5))
+        self.assertEqual(scheduler.limiter.limit, 4.0)
+        self.assertEqual(scheduler.limiter.pause_until, self.clock.now + 5)
+
+
+class TranslateSchedulerTest(unittest.TestCase):
+
+    def test_truncation_and_batch_mismatch_are_content_errors(self):
+        from batching import BatchMismatchError
+        from translate import TruncatedError, get_service_scheduler
+
+        scheduler = get_service_scheduler({"url": "http://content-errors.invalid/v1",
+                                           "model": "m", "concurrency": 4})
+        for error in (TruncatedError("截断"), BatchMismatchError("段数不一致")):
+            with self.assertRaises(type(error)):
+                scheduler.call(lambda error=error: (_ for _ in ()).throw(error))
+        self.assertEqual(scheduler.limiter.limit, 4.0)
+
+
+class PauseTest(unittest.TestCase):
+
+    def test_acquire_waits_for_pause(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=4)
+        limiter.on_throttle(retry_after=0.1)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        limiter.release()
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(parse_retry_after("12"), 12.0)
+        self.assertEqual(parse_retry_after("-3"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+roff.py 的测试：屏蔽格式标记后原样还原，占位符被改动时拒绝译文
+"""
+import os
+import re
+import sys
+import gzip
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roff import MaskedText, is_roff, split_roff_units  # noqa: E402
+
+MAN_PAGE = r""".\" Generated by hand for the tests
+.TH LS 1 "March 2024" "GNU coreutils" "User Commands"
+.SH NAME
+ls \- list directory contents
+.SH SYNOPSIS
+.B ls
+[\fIOPTION\fR]... [\fIFILE\fR]...
+.SH DESCRIPTION
+List information about the FILEs (the current directory by default).
+Sort entries alphabetically if none of \fB\-cftuvSUX\fR nor \fB\-\-sort\fR is specified.
+.PP
+Mandatory arguments to long options are mandatory for short options too.
+.TP
+\fB\-a\fR, \fB\-\-all\fR
+do not ignore entries starting with .
+.TP
+\fB\-\-color\fR[=\fI\,WHEN\/\fR]
+color the output; WHEN can be 'always' (default if omitted), 'auto', or 'never'
+.SS "Exit status:"
+.TP
+0
+if OK,
+.SH EXAMPLES
+.nf
+ls -la /tmp
+ls --color=auto
+.fi
+.TS
+tab(|);
+l l.
+a|b
+.TE
+.SH "SEE ALSO"
+\fBdir\fP(1), \fBvdir\fP(1)
+"""
+
+MDOC_PAGE = r""".Dd March 1, 2024
+.Dt TOUCH 1
+.Os
+.Sh NAME
+.Nm touch
+.Nd change file access and modification times
+.Sh DESCRIPTION
+The
+.Nm
+utility sets the modification and access times of files.
+If any file does not exist, it is created with default permissions.
+.Bl -tag -width Ds
+.It Fl a
+Change the access time of the file.
+.El
+"""
+
+SYSTEM_MAN_DIR = "/usr/share/man/man1"
+_HEADING_PATTERN = re.compile(r'^(\.S[HS]) "(.*)"$')
+
+
+def normalize(roff):
+    """还原后标题参数统一加引号、行尾空白被去掉，比较前做同样的处理"""
+    lines = []
+    for line in roff.split('\n'):
+        line = line.rstrip()
+        match = _HEADING_PATTERN.match(line)
+        if match:
+            title = match.group(2).replace('""', '"')
+            line = f"{match.group(1)} {title}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+class MaskRoundTripTest(unittest.TestCase):
+
+    def assertRoundTrip(self, content):
+        self.assertTrue(is_roff(content))
+        for unit in split_roff_units(content):
+            masked = MaskedText(unit)
+            self.assertEqual(normalize(masked.unmask(masked.text)), normalize(unit))
+
+    def test_man_page(self):
+        self.assertRoundTrip(MAN_PAGE)
+
+    def test_mdoc_page(self):
+        self.assertRoundTrip(MDOC_PAGE)
+
+    def test_units_cover_whole_page(self):
+        self.assertEqual('\n'.join(split_roff_units(MAN_PAGE)), MAN_PAGE)
+
+    def test_system_pages(self):
+        if not os.path.isdir(SYSTEM_MAN_DIR):
+            self.skipTest(f"{SYSTEM_MAN_DIR} 不存在")
+        checked = 0
+        for filename in sorted(os.listdir(SYSTEM_MAN_DIR))[:50]:
+            path = os.path.join(SYSTEM_MAN_DIR, filename)
+            opener = gzip.open if filename.endswith(".gz") else open
+            try:
+                with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+                    content = f.read()
+            except OSError:
+                continue
+            if is_roff(content):
+                with self.subTest(page=filename):
+                    self.assertRoundTrip(content)
+                checked += 1
+        if not checked:
+            self.skipTest("没有可读取的 roff 手册页")
+
+
+class MaskedTextTest(unittest.TestCase):
+
+    def test_markup_is_not_sent(self):
+        masked = MaskedText("Sort entries if none of \\fB\\-cftuvSUX\\fR nor "
+                            "\\fB\\-\\-sort\\fR is given.")
+        self.assertNotIn("\\f", masked.text)
+        self.assertEqual(masked.text, "Sort entries if none of ⟦0⟧ nor ⟦1⟧ is given.")
+
+    def test_translation_may_reorder_inline_placeholders(self):
+        masked = MaskedText("Use \\fB\\-a\\fR with \\fB\\-l\\fR.")
+        self.assertEqual(masked.unmask("⟦1⟧ 与 ⟦0⟧ 一起使用。"),
+                         "\\fB\\-l\\fR 与 \\fB\\-a\\fR 一起使用。")
+
+    def test_missing_placeholder_is_rejected(self):
+        masked = MaskedText(".SH DESCRIPTION\nUse \\fB\\-a\\fR to show all.")
+        with self.assertRaises(ValueError):
+            masked.unmask(masked.text.replace("⟦1⟧", ""))
+
+    def test_structure_placeholders_keep_order(self):
+        masked = MaskedText(".PP\nFirst paragraph.\n.PP\nSecond paragraph.")
+        with self.assertRaises(ValueError):
+            masked.unmask("⟦1⟧\n第二段。\n⟦0⟧\n第一段。")
+
+    def test_leading_dot_is_escaped(self):
+        masked = MaskedText(".PP\nSome text.")
+        self.assertEqual(masked.unmask("⟦0⟧\n.开头的译文"), ".PP\n\\&.开头的译文")
+
+    def test_markup_only_chunk_is_not_translatable(self):
+        self.assertFalse(MaskedText(".TP\n\\fB\\-a\\fR, \\fB\\-\\-all\\fR").translatable)
+
+
+if __name__ == "__main__":
+    unittest.main()
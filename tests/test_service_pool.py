@@ -0,0 +1,98 @@
+"""
+service_pool.py 的测试：对冲请求、故障转移、有界的发送线程，以及暂停后端的提示记入 usage
+"""
+import io
+import os
+import sys
+import time
+import threading
+import unittest
+from contextlib import redirect_stderr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service_pool import BackendPool, PoolMember  # noqa: E402
+
+
+def make_pool(latencies, **kwargs):
+    """创建后端池，每个后端的 target 为其固定延迟（秒），已有足够的延迟样本"""
+    members = [PoolMember(name, 1, latency) for name, latency in latencies.items()]
+    for member in members:
+        member.latencies.extend([0.01] * 10)
+    return BackendPool(members, hedge_min=0.02, **kwargs)
+
+
+def sleep_send(member):
+    time.sleep(member.target)
+    return member.name
+
+
+class BackendPoolTest(unittest.TestCase):
+
+    def test_hedge_returns_faster_backend(self):
+        pool = make_pool({"slow": 1.0, "fast": 0.01})
+        pool.random.choices = lambda candidates, weights: [candidates[0]]
+        usage = {}
+        start = time.monotonic()
+        self.assertEqual(pool.call(sleep_send, usage), "fast")
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertTrue(usage["hedged"])
+        pool.close()
+
+    def test_failover_to_other_backend(self):
+        pool = make_pool({"broken": 0, "ok": 0}, hedge_percentile=0)
+
+        def send(member):
+            if member.name == "broken":
+                raise ConnectionError("down")
+            return member.name
+
+        for _ in range(10):
+            self.assertEqual(pool.call(send), "ok")
+        pool.close()
+
+    def test_cooldown_warning_goes_to_usage(self):
+        pool = make_pool({"broken": 0, "ok": 0}, hedge_percentile=0, cooldown=30)
+        pool.random.choices = lambda candidates, weights: [candidates[0]]
+
+        def send(member):
+            if member.name == "broken":
+                raise ConnectionError("down")
+            return member.name
+
+        warnings = []
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            for _ in range(6):
+                usage = {}
+                self.assertEqual(pool.call(send, usage), "ok")
+                warnings.extend(usage["warnings"])
+        self.assertEqual(warnings, ["服务 broken 最近错误率 100%，暂停使用 30 秒"])
+        self.assertEqual(stderr.getvalue(), "")
+        self.assertFalse(pool.members[0].healthy(time.monotonic()))
+        pool.close()
+
+    def test_requests_use_bounded_threads(self):
+        pool = make_pool({"a": 0.05, "b": 0.05}, hedge_percentile=0, max_workers=3)
+        active = []
+        lock = threading.Lock()
+
+        def send(member):
+            with lock:
+                active.append(threading.current_thread().name)
+            time.sleep(member.target)
+            return member.name
+
+        callers = [threading.Thread(target=pool.call, args=(send,)) for _ in range(12)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+
+        self.assertEqual(len(active), 12)
+        self.assertLessEqual(len(set(active)), 3)
+        pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+translate.py 服务类型注册表的测试：按类型创建服务、以 "模块:类名" 注册的实现按需导入
+"""
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import translate  # noqa: E402
+from support import SERVICE_CONFIG, DataDirTestCase  # noqa: E402
+from translate import (ChatGPTService, ConfigCache, TranslationService,  # noqa: E402
+                       create_translation_service, get_service_backend, register_service,
+                       validate_config)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BACKEND_MODULE = '''
+from translate import TranslationService
+
+
+class LocalService(TranslationService):
+    REQUIRES_URL = False
+
+    def __init__(self, config):
+        self.config = config
+
+    def translate(self, content, system_prompt, usage=None):
+        return content
+'''
+
+
+class ServiceRegistryTest(DataDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # 扩展服务的实现模块放在临时目录中
+        self.module = f"manzh_test_backend_{os.getpid()}"
+        with open(os.path.join(self.tmp.name, f"{self.module}.py"), "w", encoding="utf-8") as f:
+            f.write(BACKEND_MODULE)
+        sys.path.insert(0, self.tmp.name)
+        self.addCleanup(sys.path.remove, self.tmp.name)
+        self.addCleanup(sys.modules.pop, self.module, None)
+        self.addCleanup(self.unregister, "test-local", "test-broken")
+
+    def unregister(self, *service_types):
+        with translate._service_backends_lock:
+            for service_type in service_types:
+                translate._service_backends.pop(service_type, None)
+
+    def test_builtin_types(self):
+        self.assertIs(get_service_backend("chatgpt"), ChatGPTService)
+        self.assertIs(get_service_backend("ChatGPT"), ChatGPTService)
+        self.assertIs(get_service_backend(None), ChatGPTService)
+        self.assertIsInstance(create_translation_service(SERVICE_CONFIG), ChatGPTService)
+
+    def test_unknown_type(self):
+        with self.assertRaisesRegex(ValueError, "未知的服务类型：nope.*chatgpt"):
+            get_service_backend("nope")
+        ok, error = validate_config(dict(SERVICE_CONFIG, type="nope"))
+        self.assertFalse(ok)
+        self.assertIn("未知的服务类型", error)
+
+    def test_string_backend_imported_on_first_use(self):
+        register_service("test-local", f"{self.module}:LocalService")
+        self.assertNotIn(self.module, sys.modules)
+
+        backend = get_service_backend("test-local")
+        self.assertIn(self.module, sys.modules)
+        self.assertTrue(issubclass(backend, TranslationService))
+        self.assertIs(get_service_backend("test-local"), backend)
+
+        # 不使用 URL 的服务不需要 url 字段
+        config = {k: v for k, v in SERVICE_CONFIG.items() if k != "url"}
+        self.assertEqual(validate_config(dict(config, type="test-local")), (True, ""))
+        self.assertEqual(create_translation_service(dict(config, type="test-local"))
+                         .translate("text", ""), "text")
+
+    def test_broken_backend(self):
+        register_service("test-broken", f"{self.module}:MissingService")
+        with self.assertRaisesRegex(ValueError, "无法加载服务类型 test-broken"):
+            get_service_backend("test-broken")
+
+    def test_backends_from_config(self):
+        with open("config.json", "w", encoding="utf-8") as f:
+            json.dump({"default_service": "test", "services": {"test": SERVICE_CONFIG},
+                       "backends": {"test-local": f"{self.module}:LocalService"}}, f)
+        ConfigCache.invalidate_cache()
+        ConfigCache.get_setting("install")
+        self.assertNotIn(self.module, sys.modules)
+        self.assertEqual(get_service_backend("test-local").__name__, "LocalService")
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def test_gemini_sdk_not_imported(self):
+        result = subprocess.run(
+            [sys.executable, "-c",
+             "import sys, translate; print('google.generativeai' in sys.modules)"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
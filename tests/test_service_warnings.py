@@ -0,0 +1,93 @@
+"""
+服务警告的测试：Gemini 缓存内容创建失败、服务池暂停后端的提示记入请求的 usage，
+由 translate_worker 输出到该次翻译的日志，而不是直接写到进程的 stderr
+"""
+import io
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from contextlib import redirect_stderr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translate import (GeminiService, TranslationQueue, TranslationService,  # noqa: E402
+                       translate_worker)
+
+
+class FakeGenai:
+    """创建缓存内容总是失败的 Gemini SDK"""
+
+    class caching:
+        class CachedContent:
+            @staticmethod
+            def create(**kwargs):
+                raise ValueError("提示词过短")
+
+    class GenerativeModel:
+        def __init__(self, name, system_instruction=None):
+            self.system_instruction = system_instruction
+
+        def generate_content(self, prompt, generation_config=None, stream=False):
+            return SimpleNamespace(text="译文", candidates=None, finish_reason=None,
+                                   usage_metadata=None)
+
+
+def gemini_service(config):
+    service = GeminiService(dict(config, type="gemini", cached_content=True),
+                            model=SimpleNamespace())
+    service.model = None
+    service.genai = FakeGenai
+    return service
+
+
+class WarningService(TranslationService):
+    """每次请求都在 usage 中记录一条警告的假翻译服务"""
+
+    def translate(self, content, system_prompt, usage=None):
+        usage.setdefault('warnings', []).append("警告：测试警告")
+        return f"译文：{content}"
+
+
+CONFIG = {
+    "type": "gemini",
+    "model": "warning-test-model",
+    "api_key": "test",
+    "language": "中文",
+    "max_output_length": 2000,
+    "max_context_length": 8000,
+    "batch_requests": False,
+}
+
+
+class ServiceWarningTest(unittest.TestCase):
+
+    def test_cached_content_fallback_warns_through_usage(self):
+        service = gemini_service(CONFIG)
+        usage = {}
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            self.assertEqual(service.translate("Hello", "system", usage), "译文")
+        self.assertEqual(stderr.getvalue(), "")
+        self.assertEqual(len(usage["warnings"]), 1)
+        self.assertIn("无法创建 Gemini 缓存内容", usage["warnings"][0])
+        self.assertIn("提示词过短", usage["warnings"][0])
+
+        # 模型对象已创建，之后的请求不再重复警告
+        usage = {}
+        service.translate("Hello again", "system", usage)
+        self.assertNotIn("warnings", usage)
+
+    def test_worker_prints_warnings_to_log(self):
+        queue = TranslationQueue(show_progress=False)
+        log = io.StringIO()
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            self.assertTrue(translate_worker((0, "Some text."), CONFIG, queue, WarningService(),
+                                             log=log))
+        self.assertEqual(log.getvalue(), "警告：测试警告\n")
+        self.assertEqual(stderr.getvalue(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,265 @@
+"""
+translate.py 的并行翻译测试：使用假翻译服务（不发送网络请求）检查并发、按顺序流式输出和失败后中止输出
+"""
+import io
+import os
+import re
+import sys
+import math
+import time
+import threading
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support import SERVICE_CONFIG, DataDirTestCase  # noqa: E402
+from translate import (OrderedStreamWriter, SingleFlightCache, TranslationQueue,  # noqa: E402
+                       TranslationService, get_translation_service, register_service,
+                       translate_document, translate_worker)
+
+LATENCY = 0.2
+WORKERS = 8
+
+
+class SlowService(TranslationService):
+    """每次请求耗时 LATENCY 秒的假翻译服务，记录请求次数和最大并发数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    def translate(self, content, system_prompt, usage=None):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(LATENCY)
+            return f"译文：{content}"
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def service_config(name):
+    """每个测试使用独立的服务标识，避免共享进程级的调度器"""
+    return {
+        "type": "chatgpt",
+        "url": f"http://{name}.invalid/v1/chat/completions",
+        "model": "test-model",
+        "api_key": "test",
+        "language": "中文",
+        "max_output_length": 2000,
+        "max_context_length": 8000,
+        "concurrency": WORKERS,
+        "max_concurrency": WORKERS,
+        "batch_requests": False,
+    }
+
+
+def translate_all(chunks, config, service):
+    """并行翻译全部块，返回 (是否全部成功, 译文列表, 耗时)"""
+    queue = TranslationQueue(show_progress=False)
+    queue.total_chunks = len(chunks)
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        futures = [executor.submit(translate_worker, (i, chunk), config, queue, service)
+                   for i, chunk in enumerate(chunks)]
+        ok = all(future.result() for future in futures)
+    elapsed = time.monotonic() - start
+    return ok, [queue.results.get(i) for i in range(len(chunks))], elapsed
+
+
+class ParallelTranslationTest(unittest.TestCase):
+
+    def test_chunks_translate_concurrently(self):
+        service = SlowService()
+        chunks = [f"Paragraph {i} of the manual." for i in range(2 * WORKERS)]
+        ok, results, elapsed = translate_all(chunks, service_config("concurrent"), service)
+
+        self.assertTrue(ok)
+        self.assertEqual(results, [f"译文：{chunk}" for chunk in chunks])
+        self.assertEqual(service.calls, len(chunks))
+        # 并发数达到且不超过调度器的上限，耗时接近 ceil(n / 并发数) 轮请求
+        self.assertEqual(service.max_active, WORKERS)
+        rounds = math.ceil(len(chunks) / WORKERS)
+        self.assertGreaterEqual(elapsed, LATENCY * rounds * 0.95)
+        self.assertLess(elapsed, LATENCY * rounds * 1.5)
+
+    def test_identical_chunks_share_one_request(self):
+        service = SlowService()
+        chunks = ["The same paragraph."] * 6
+        ok, results, _ = translate_all(chunks, service_config("single-flight"), service)
+
+        self.assertTrue(ok)
+        self.assertEqual(service.calls, 1)
+        self.assertEqual(results, ["译文：The same paragraph."] * 6)
+
+
+class ReverseLatencyService(TranslationService):
+    """块越靠前延迟越长的假翻译服务，后面的块先完成"""
+
+    def __init__(self, config):
+        self.total = config["test_chunks"]
+
+    def translate(self, content, system_prompt, usage=None):
+        index = int(re.search(r"Paragraph (\d+)", content).group(1))
+        time.sleep(0.01 * (self.total - index))
+        return f"译文：{content}"
+
+
+register_service("test-reverse-latency", ReverseLatencyService)
+
+
+class OrderedOutputTest(DataDirTestCase):
+
+    def test_output_order_preserved_when_chunks_finish_out_of_order(self):
+        paragraphs = [f"Paragraph {i} " + "describes the command in detail. " * 8
+                      for i in range(24)]
+        config = dict(SERVICE_CONFIG, type="test-reverse-latency", url="http://order.invalid/v1",
+                      max_output_length=150, concurrency=WORKERS, max_concurrency=WORKERS,
+                      batch_requests=False, test_chunks=len(paragraphs))
+        stdout = io.StringIO()
+        with open(os.devnull, "w") as log:
+            self.assertTrue(translate_document("\n\n".join(paragraphs), config,
+                                               stdout=stdout, log=log))
+
+        self.assertEqual(stdout.getvalue(),
+                         "\n\n".join(f"译文：{p.strip()}" for p in paragraphs) + "\n")
+
+
+class FailingService(TranslationService):
+    """第 3 段总是失败的假翻译服务，记录翻译成功的段落"""
+
+    def __init__(self, config):
+        self.lock = threading.Lock()
+        self.translated = []
+
+    def translate(self, content, system_prompt, usage=None):
+        index = int(re.search(r"Paragraph (\d+)", content).group(1))
+        if index == 3:
+            raise RuntimeError("服务错误")
+        with self.lock:
+            self.translated.append(index)
+        return f"译文：{content}"
+
+
+register_service("test-failing", FailingService)
+
+
+class OrderedStreamWriterTest(unittest.TestCase):
+
+    def test_out_of_order_puts_written_in_order(self):
+        stream = io.StringIO()
+        writer = OrderedStreamWriter(stream, max_pending=4, separator="|")
+        writer.put(2, "c")
+        writer.put(1, "b")
+        self.assertEqual(stream.getvalue(), "")
+        self.assertEqual(sorted(writer.buffer), [1, 2])
+
+        writer.put(0, "a")
+        self.assertEqual(stream.getvalue(), "a|b|c")
+        self.assertEqual(writer.buffer, {})
+        self.assertEqual(writer.next_index, 3)
+
+        writer.put(3, "d")
+        writer.finish()
+        self.assertEqual(stream.getvalue(), "a|b|c|d\n")
+
+    def test_window_follows_written_position(self):
+        writer = OrderedStreamWriter(io.StringIO(), max_pending=2)
+        self.assertEqual(writer.window_end(), 2)
+        self.assertTrue(writer.wait_for_slot(1))
+
+        # 块 2 在块 0 写出后才进入窗口
+        entered = threading.Event()
+        waiter = threading.Thread(
+            target=lambda: writer.wait_for_slot(2) and entered.set())
+        waiter.start()
+        writer.put(1, "b")
+        self.assertFalse(entered.wait(0.1))
+        writer.put(0, "a")
+        self.assertTrue(entered.wait(5))
+        waiter.join()
+        self.assertEqual(writer.window_end(), 4)
+
+    def test_abort_stops_writing_and_wakes_waiters(self):
+        stream = io.StringIO()
+        writer = OrderedStreamWriter(stream, max_pending=1)
+        writer.put(1, "b")
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(writer.wait_for_slot(5)))
+        waiter.start()
+
+        writer.abort()
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(results, [False])
+        self.assertEqual(writer.buffer, {})
+
+        writer.put(0, "a")
+        self.assertEqual(stream.getvalue(), "")
+        self.assertFalse(writer.wait_for_slot(0))
+
+    def test_invalid_max_pending(self):
+        with self.assertRaises(ValueError):
+            OrderedStreamWriter(io.StringIO(), max_pending=0)
+
+
+class FailedChunkOutputTest(DataDirTestCase):
+
+    def test_failed_chunk_stops_output_but_others_complete(self):
+        paragraphs = [f"Paragraph {i} " + "describes the command in detail. " * 8
+                      for i in range(8)]
+        config = dict(SERVICE_CONFIG, type="test-failing", url="http://failing.invalid/v1",
+                      max_output_length=150, concurrency=2, max_concurrency=2,
+                      batch_requests=False)
+        stdout = io.StringIO()
+        with open(os.devnull, "w") as log, mock.patch("time.sleep"):
+            self.assertFalse(translate_document("\n\n".join(paragraphs), config,
+                                                stdout=stdout, log=log))
+
+        # 只按顺序写出失败块之前的部分译文（中止时仍在翻译的前面块不再写出），
+        # 其余块照常翻译并记入检查点
+        prefixes = ["\n\n".join(f"译文：{p.strip()}" for p in paragraphs[:k]) for k in range(4)]
+        self.assertIn(stdout.getvalue(), prefixes)
+        service = get_translation_service(config)
+        self.assertEqual(sorted(service.translated), [0, 1, 2, 4, 5, 6, 7])
+
+
+class SingleFlightCacheTest(unittest.TestCase):
+
+    def test_concurrent_callers_compute_once(self):
+        cache = SingleFlightCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(LATENCY)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = list(executor.map(lambda _: cache.get_or_compute("key", compute), range(5)))
+
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertIn("key", cache)
+
+    def test_failure_is_not_cached(self):
+        cache = SingleFlightCache()
+
+        def fail():
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_compute("key", fail)
+        self.assertNotIn("key", cache)
+        self.assertEqual(cache.get_or_compute("key", lambda: "retry"), "retry")
+
+
+if __name__ == "__main__":
+    unittest.main()
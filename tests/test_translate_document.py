@@ -0,0 +1,165 @@
+"""
+translate_document 的测试：按章节优先级翻译、长手册页末尾的优先章节不等待输出窗口，
+以及预览写出后翻译失败时恢复原有的译文
+"""
+import os
+import sys
+import gzip
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support import SERVICE_CONFIG, DataDirTestCase  # noqa: E402
+from translate import (TranslationQueue, TranslationService,  # noqa: E402
+                       get_translation_service, register_service, translate_document)
+
+FILLER = "lists information about the files in the current directory by default. " * 3
+
+
+def roff_page(sections):
+    """生成每段一块的 roff 手册页，段落以 <章节>-<序号> 开头便于识别"""
+    lines = ['.TH LS 1 "2024" "GNU" "User Commands"']
+    for name, count in sections:
+        lines.append(f".SH {name}")
+        for i in range(count):
+            lines += [".PP", f"{name.lower()}-{i} {FILLER}"]
+    return "\n".join(lines) + "\n"
+
+
+def tags(requests):
+    """请求中的段落标识（如 options-0），按请求顺序"""
+    return [word for text in requests for word in text.split()
+            if "-" in word and word.split("-")[0].isalpha() and word.split("-")[-1].isdigit()]
+
+
+class RecordingService(TranslationService):
+    """把原文转换为大写的假翻译服务；hook 可以在翻译前检查或阻塞请求"""
+
+    hook = None
+
+    def __init__(self, config):
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def translate(self, content, system_prompt, usage=None):
+        with self.lock:
+            self.requests.append(content)
+        if RecordingService.hook is not None:
+            RecordingService.hook(content)
+        return content.upper()
+
+
+register_service("test-recording", RecordingService)
+
+
+class SectionPriorityTest(unittest.TestCase):
+
+    def test_roff_sections(self):
+        queue = TranslationQueue(show_progress=False)
+        queue.content_format = 'roff'
+        chunks = ['.TH LS 1\n.SH NAME\nls \\- list',
+                  '.SH DESCRIPTION\nList files.',
+                  'More description.',
+                  '.SH ENVIRONMENT\nCOLUMNS',
+                  'tail of environment\n.SH OPTIONS\n.TP\n\\-a',
+                  '.SH "SEE ALSO"\nls(1)']
+        self.assertEqual(queue.section_priorities(chunks), [0, 1, 1, 2, 1, 3])
+
+    def test_text_sections(self):
+        queue = TranslationQueue(show_progress=False)
+        self.assertEqual(queue.section_priorities(
+            ["Usage: ls [OPTION]...", "EXAMPLES\n  ls -l", "OPTIONS\n  -a  all"]), [0, 3, 1])
+
+
+class TranslateDocumentTest(DataDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.config = dict(SERVICE_CONFIG, type="test-recording",
+                           url=f"http://{self.id()}.invalid/v1", max_output_length=150,
+                           concurrency=1, max_concurrency=1, batch_requests=False)
+        self.output = os.path.join(self.tmp.name, "zh_CN", "man1", "ls.1")
+        os.makedirs(os.path.dirname(self.output))
+        RecordingService.hook = None
+        self.addCleanup(setattr, RecordingService, "hook", None)
+        self.log = open(os.devnull, "w")
+        self.addCleanup(self.log.close)
+
+    def translate(self, page, **kwargs):
+        ok = translate_document(page, self.config, output=self.output, log=self.log, **kwargs)
+        return ok, get_translation_service(self.config)
+
+    def test_priority_sections_beyond_window_go_first(self):
+        # 单线程时输出窗口为 8 块，末尾的 OPTIONS 远在窗口之外
+        page = roff_page([("NAME", 1), ("ENVIRONMENT", 20), ("EXAMPLES", 5), ("OPTIONS", 4)])
+        ok, service = self.translate(page)
+
+        self.assertTrue(ok)
+        order = tags(service.requests)
+        self.assertEqual(len(order), 30)
+        # examples-4 与 OPTIONS 的章节标题在同一块中，按 OPTIONS 的优先级翻译
+        self.assertEqual(order[:6], ["name-0", "examples-4"] + [f"options-{i}" for i in range(4)])
+        # 其余章节按优先级和顺序翻译
+        self.assertEqual(order[6:26], [f"environment-{i}" for i in range(20)])
+        with open(self.output, encoding="utf-8") as f:
+            text = f.read()
+        self.assertIn("OPTIONS-3", text)
+        self.assertLess(text.index("ENVIRONMENT-19"), text.index("EXAMPLES-0"))
+
+    def test_failed_translation_restores_previous_page(self):
+        with open(self.output, "w", encoding="utf-8") as f:
+            f.write("旧译文\n")
+        previews = []
+
+        def fail_examples(content):
+            if "examples-" in content:
+                with open(self.output, encoding="utf-8") as f:
+                    previews.append(f.read())
+                raise RuntimeError("服务不可用")
+
+        RecordingService.hook = fail_examples
+        page = roff_page([("NAME", 1), ("DESCRIPTION", 2), ("EXAMPLES", 2)])
+        with mock.patch("time.sleep"):
+            ok, _ = self.translate(page, incremental=False)
+
+        self.assertFalse(ok)
+        # 翻译期间写出了预览：优先章节为译文，其余章节保留原文
+        self.assertTrue(previews)
+        self.assertIn("DESCRIPTION-1", previews[0])
+        self.assertIn("examples-0", previews[0])
+        with open(self.output, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "旧译文\n")
+        self.assertEqual(os.listdir(os.path.dirname(self.output)), ["ls.1"])
+
+    def test_failed_install_discards_preview(self):
+        previews = []
+
+        def fail_examples(content):
+            if "examples-" in content:
+                previews.append(os.path.exists(self.output + ".gz"))
+                raise RuntimeError("服务不可用")
+
+        RecordingService.hook = fail_examples
+        page = roff_page([("NAME", 1), ("DESCRIPTION", 2), ("EXAMPLES", 2)])
+        with mock.patch("time.sleep"):
+            ok, _ = self.translate(page, install=True)
+
+        self.assertFalse(ok)
+        self.assertEqual(previews[:1], [True])
+        self.assertEqual(os.listdir(os.path.dirname(self.output)), [])
+
+    def test_successful_install_replaces_preview(self):
+        page = roff_page([("NAME", 1), ("DESCRIPTION", 2), ("EXAMPLES", 2)])
+        ok, _ = self.translate(page, install=True)
+
+        self.assertTrue(ok)
+        with gzip.open(self.output + ".gz", "rt", encoding="utf-8") as f:
+            text = f.read()
+        self.assertIn("EXAMPLES-1", text)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.output))), [".manzh", "ls.1.gz"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+translation_memory.py 的测试：跨实例共享、按最近最少使用淘汰，以及只读打开时不写入
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import translation_memory  # noqa: E402
+from translation_memory import TranslationMemory  # noqa: E402
+
+CONFIG = {"type": "chatgpt", "model": "test-model", "language": "中文"}
+
+
+def key(content, prompt_version="1-roff", config=CONFIG):
+    return TranslationMemory.make_key(content, config, prompt_version)
+
+
+class FakeTime:
+    """替换 translation_memory 模块中的 time，time() 返回指定的时间"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+
+class TranslationMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "memory", "translation_memory.db")
+        self.clock = FakeTime()
+        patcher = mock.patch.object(translation_memory, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self, **kwargs):
+        memory = TranslationMemory(self.path, **kwargs)
+        self.addCleanup(memory.close)
+        return memory
+
+    def test_shared_between_instances(self):
+        self.open().put(key("Hello"), "你好")
+        memory = self.open()
+        self.assertEqual(memory.get(key("Hello")), "你好")
+        self.assertIsNone(memory.get(key("Other")))
+        self.assertEqual((memory.hits, memory.misses), (1, 1))
+
+    def test_key_fields(self):
+        memory = self.open()
+        memory.put(key("Hello"), "你好")
+        self.assertTrue(memory.contains(key("Hello")))
+        for other in (key("Hello", "1-roff-compact"), key("Hello", config=dict(CONFIG, model="m")),
+                      key("Hello", config=dict(CONFIG, language="日本語"))):
+            self.assertFalse(memory.contains(other))
+        self.assertTrue(memory.contains(key("Hello", config=dict(CONFIG, type="ChatGPT"))))
+
+    def test_least_recently_used_is_evicted(self):
+        # 上限 1000 字节，每条译文 300 字节，每次写入都检查总大小
+        memory = self.open(max_size_mb=1000 / (1024 * 1024))
+        memory.EVICT_CHECK_INTERVAL = 1
+        for t, name in enumerate("ABC", start=1):
+            self.clock.now = t
+            memory.put(key(name), name * 300)
+        self.clock.now = 4
+        self.assertEqual(memory.get(key("A")), "A" * 300)  # A 变为最近使用
+        self.clock.now = 5
+        memory.put(key("D"), "D" * 300)
+
+        # 淘汰最久未使用的 B 后总大小降到上限的 90%
+        self.assertEqual([memory.contains(key(name)) for name in "ABCD"],
+                         [True, False, True, True])
+
+    def test_readonly_ignores_writes(self):
+        memory = self.open()
+        self.clock.now = 1
+        memory.put(key("Hello"), "你好")
+        memory.close()
+        files = sorted(os.listdir(os.path.dirname(self.path)))
+
+        readonly = self.open(readonly=True)
+        self.clock.now = 2
+        self.assertEqual(readonly.get(key("Hello")), "你好")
+        readonly.put(key("New"), "新译文")
+        self.assertFalse(readonly.contains(key("New")))
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))), files)
+
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute("SELECT last_used FROM memory").fetchall(), [(1.0,)])
+
+    def test_readonly_requires_existing_database(self):
+        with self.assertRaises(sqlite3.Error):
+            TranslationMemory(self.path, readonly=True)
+        self.assertFalse(os.path.exists(os.path.dirname(self.path)))
+
+
+if __name__ == "__main__":
+    unittest.main()
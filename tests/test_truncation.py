@@ -0,0 +1,194 @@
+"""
+译文截断的测试：响应在 finish_reason 为 length 时报告截断（流式响应立即停止读取），
+translate_worker 把被截断的块拆分为更小的块重新翻译；默认发送普通（非流式）请求
+"""
+import os
+import sys
+import json
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import RunMetrics  # noqa: E402
+from translate import (ChatGPTService, TranslationQueue, TranslationService,  # noqa: E402
+                       TruncatedError, translate_worker)
+
+CONFIG = {
+    "type": "chatgpt",
+    "url": "http://truncation.invalid/v1/chat/completions",
+    "model": "test-model",
+    "api_key": "test",
+    "language": "中文",
+    "max_output_length": 2000,
+    "max_context_length": 8000,
+    "batch_requests": False,
+}
+
+
+class LimitedService(TranslationService):
+    """原文超过 limit 个字符时报告截断的假翻译服务"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def translate(self, content, system_prompt, usage=None):
+        with self.lock:
+            self.requests.append(content)
+        if len(content) > self.limit:
+            raise TruncatedError("译文达到 max_tokens 被截断")
+        return "\n\n".join(f"译文：{p}" for p in content.split("\n\n"))
+
+
+class ResplitTest(unittest.TestCase):
+
+    def translate(self, content, service):
+        queue = TranslationQueue(show_progress=False)
+        queue.total_chunks = 1
+        queue.metrics = RunMetrics(CONFIG)
+        ok = translate_worker((0, content), CONFIG, queue, service)
+        return ok, queue.results.get(0), queue.metrics.summary()
+
+    def test_truncated_chunk_is_resplit(self):
+        paragraphs = [f"Paragraph {i} describes option --opt{i} in some detail." for i in range(8)]
+        content = "\n\n".join(paragraphs)
+        service = LimitedService(limit=len(content) // 3)
+
+        ok, result, summary = self.translate(content, service)
+
+        self.assertTrue(ok)
+        self.assertEqual(result, "\n\n".join(f"译文：{p}" for p in paragraphs))
+        self.assertEqual(service.requests[0], content)
+        # 拆分后每个请求都不超过上限，且不再重复发送完整大小的请求
+        self.assertEqual(service.requests.count(content), 1)
+        self.assertGreaterEqual(summary["resplits"], 2)
+        self.assertEqual(summary["retries"], 0)
+        self.assertEqual(summary["failed"], 0)
+
+    def test_small_chunk_is_not_split(self):
+        service = LimitedService(limit=1000)
+        ok, result, summary = self.translate("One paragraph.\n\nAnother one.", service)
+        self.assertTrue(ok)
+        self.assertEqual(result, "译文：One paragraph.\n\n译文：Another one.")
+        self.assertEqual(len(service.requests), 1)
+        self.assertEqual(summary["resplits"], 0)
+
+
+def sse(*events):
+    return [f"data: {json.dumps(event)}" for event in events] + ["data: [DONE]"]
+
+
+def delta(text=None, finish_reason=None):
+    choice = {"index": 0, "delta": {"content": text} if text else {}}
+    if finish_reason:
+        choice["finish_reason"] = finish_reason
+    return {"choices": [choice]}
+
+
+class FakeResponse:
+    """只提供 ChatGPTService 用到的属性的响应：lines 为 SSE 事件行，result 为 JSON 响应体"""
+
+    status_code = 200
+
+    def __init__(self, lines=None, result=None):
+        self.lines = lines
+        self.result = result
+        self.read = 0
+        content_type = "text/event-stream" if lines is not None else "application/json"
+        self.headers = {"Content-Type": content_type}
+
+    def json(self):
+        return self.result
+
+    def iter_lines(self, decode_unicode=False):
+        for line in self.lines:
+            self.read += 1
+            yield line
+
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+
+    def __init__(self, response):
+        self.response = response
+        self.payloads = []
+
+    def post(self, url, headers=None, json=None, timeout=None, stream=False):
+        self.payloads.append(json)
+        return self.response
+
+
+def completion(text, finish_reason="stop"):
+    return {"choices": [{"index": 0, "message": {"content": text},
+                         "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": 9, "completion_tokens": 4}}
+
+
+class RequestTest(unittest.TestCase):
+
+    def service(self, result, **config):
+        service = ChatGPTService(dict(CONFIG, **config))
+        service.session = FakeSession(FakeResponse(result=result))
+        return service
+
+    def test_default_request_is_not_streamed(self):
+        service = self.service(completion("你好"))
+        usage = {}
+        self.assertEqual(service.translate("Hello", "system", usage), "你好")
+        payload = service.session.payloads[0]
+        self.assertNotIn("stream", payload)
+        self.assertNotIn("stream_options", payload)
+        self.assertEqual((usage["input_tokens"], usage["output_tokens"]), (9, 4))
+
+    def test_length_finish_raises_truncated(self):
+        service = self.service(completion("部分译文", finish_reason="length"))
+        with self.assertRaises(TruncatedError):
+            service.translate("Long text", "system", {})
+
+
+class StreamTest(unittest.TestCase):
+
+    def service(self, lines, **config):
+        service = ChatGPTService(dict(CONFIG, stream=True, **config))
+        service.session = FakeSession(FakeResponse(lines))
+        return service
+
+    def test_stream_collects_text_and_usage(self):
+        service = self.service(sse(delta("你好"), delta("，世界"), delta(finish_reason="stop"),
+                                   {"choices": [], "usage": {"prompt_tokens": 9,
+                                                             "completion_tokens": 4}}))
+        usage = {}
+        self.assertEqual(service.translate("Hello, world", "system", usage), "你好，世界")
+        self.assertEqual((usage["input_tokens"], usage["output_tokens"]), (9, 4))
+        self.assertGreaterEqual(usage["first_token_latency"], 0)
+        self.assertTrue(service.session.payloads[0]["stream"])
+        self.assertEqual(service.session.payloads[0]["stream_options"], {"include_usage": True})
+        # 正常结束时读完整个响应，连接可以放回连接池
+        self.assertEqual(service.session.response.read, len(service.session.response.lines))
+
+    def test_length_finish_raises_truncated(self):
+        lines = sse(delta("部分译文"), delta(finish_reason="length"), delta("不应读取"))
+        service = self.service(lines)
+        with self.assertRaises(TruncatedError):
+            service.translate("Long text", "system", {})
+        self.assertEqual(service.session.response.read, 2)
+
+    def test_stream_without_usage_option(self):
+        service = self.service(sse(delta("译文"), delta(finish_reason="stop")), stream_usage=False)
+        self.assertEqual(service.translate("Text", "system", {}), "译文")
+        self.assertTrue(service.session.payloads[0]["stream"])
+        self.assertNotIn("stream_options", service.session.payloads[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
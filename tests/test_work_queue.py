@@ -0,0 +1,118 @@
+"""
+work_queue.py 的测试：租约的领取、过期重领、续约和失败处理，以及写出完成的手册页
+"""
+import os
+import sys
+import gzip
+import time
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from work_queue import DONE, FAILED, LEASED, PENDING, WorkQueue, collect  # noqa: E402
+from incremental import load_sidecar  # noqa: E402
+from support import SERVICE_CONFIG, DataDirTestCase  # noqa: E402
+
+CONFIG = dict(SERVICE_CONFIG, service="test")
+
+
+def add_page(queue, output_path, chunks, translations=None):
+    """加入一个手册页，每块一个翻译单元"""
+    translations = translations or [None] * len(chunks)
+    plan = [([chunk], chunk, translation) for chunk, translation in zip(chunks, translations)]
+    return queue.add_job(CONFIG, output_path, None, "text", "\n\n", plan)
+
+
+class WorkQueueLeaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = WorkQueue(os.path.join(self.tmp.name, "queue.db"))
+        add_page(self.queue, os.path.join(self.tmp.name, "man1", "ls.1"), ["a", "b", "c"])
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp.cleanup()
+
+    def chunk_status(self):
+        return sorted(self.queue.status()["chunks"].items())
+
+    def test_claims_are_exclusive(self):
+        first = self.queue.claim("worker-1", 2, lease=60)
+        second = self.queue.claim("worker-2", 2, lease=60)
+        self.assertEqual([content for _, content, _ in first], ["a", "b"])
+        self.assertEqual([content for _, content, _ in second], ["c"])
+        self.assertEqual(self.queue.claim("worker-3", 2, lease=60), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        claimed = self.queue.claim("crashed", 1, lease=0.05)
+        time.sleep(0.1)
+        reclaimed = self.queue.claim("worker-2", 1, lease=60)
+        self.assertEqual(reclaimed, claimed)
+
+        chunk_id = claimed[0][0]
+        # 失联的 worker 不能再续约或把块放回队列
+        self.assertEqual(self.queue.renew("crashed", [chunk_id], 60), 0)
+        self.queue.fail(chunk_id, "crashed", "timeout")
+        self.assertEqual(self.queue.status()["workers"], {"worker-2": 1})
+
+    def test_renewed_lease_is_not_claimed(self):
+        chunk_id = self.queue.claim("worker-1", 1, lease=0.2)[0][0]
+        self.assertEqual(self.queue.renew("worker-1", [chunk_id], 60), 1)
+        time.sleep(0.3)
+        self.assertNotIn(chunk_id, [c for c, _, _ in self.queue.claim("worker-2", 3, lease=60)])
+
+    def test_repeated_expiry_marks_chunk_failed(self):
+        for _ in range(2):
+            self.queue.claim("crashed", 1, lease=0.01, max_attempts=2)
+            time.sleep(0.05)
+        remaining = self.queue.claim("worker-2", 3, lease=60, max_attempts=2)
+        self.assertEqual([content for _, content, _ in remaining], ["b", "c"])
+        self.assertEqual(self.queue.status()["chunks"][FAILED], 1)
+
+    def test_release_does_not_count_as_attempt(self):
+        for _ in range(5):
+            self.queue.claim("worker-1", 3, lease=60, max_attempts=1)
+            self.assertEqual(self.queue.release("worker-1"), 3)
+        self.assertEqual(self.queue.status()["chunks"][PENDING], 3)
+
+    def test_late_completion_keeps_first_result(self):
+        chunk_id = self.queue.claim("slow", 1, lease=0.01)[0][0]
+        time.sleep(0.05)
+        self.queue.claim("fast", 1, lease=60)
+        self.queue.complete(chunk_id, "先完成的译文", CONFIG)
+        self.queue.complete(chunk_id, "后完成的译文", CONFIG)
+        self.assertEqual(self.queue.status()["chunks"][DONE], 1)
+        self.assertEqual(self.queue.status()["chunks"][LEASED], 0)
+        self.assertEqual(self.queue.job_chunks(1)[0][1], "先完成的译文")
+
+    def test_same_page_is_added_once(self):
+        self.assertFalse(add_page(self.queue, os.path.join(self.tmp.name, "man1", "ls.1"), ["a"]))
+
+
+class CollectTest(DataDirTestCase):
+
+    def test_collect_installs_finished_pages(self):
+        output_dir = os.path.join(self.tmp.name, "zh_CN")
+        queue = WorkQueue(os.path.join(self.tmp.name, "queue.db"))
+        try:
+            output = os.path.join(output_dir, "man1", "ls.1")
+            add_page(queue, output, ["first", "second"], translations=["第一段", None])
+            add_page(queue, os.path.join(output_dir, "man1", "cp.1"), ["pending"])
+            for chunk_id, content, _ in queue.claim("worker-1", 1, lease=60):
+                queue.complete(chunk_id, f"译文 {content}", CONFIG)
+
+            self.assertEqual(collect(queue), 1)
+            with gzip.open(output + ".gz", "rt", encoding="utf-8") as f:
+                self.assertEqual(f.read(), "第一段\n\n译文 second\n")
+            self.assertEqual(load_sidecar(output + ".gz", CONFIG, "text"),
+                             [(["first"], "第一段"), (["second"], "译文 second")])
+            # 写出的手册页从队列中删除，未完成的手册页保留
+            self.assertEqual(queue.status()["jobs"], 1)
+        finally:
+            queue.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
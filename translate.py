@@ -3,14 +3,56 @@ import json
 import time
 import requests
 import threading
-from queue import Queue
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import PriorityQueue, Empty
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 from requests.exceptions import Timeout, RequestException
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import os
-import google.generativeai as genai
+import re
+import math
+import shutil
+import argparse
+import datetime
+import importlib
 from abc import ABC, abstractmethod
+from translation_memory import TranslationMemory, content_digest
+from rate_limit import RateLimitError, ServiceScheduler, parse_retry_after
+from checkpoint import CheckpointJournal
+from incremental import load_sidecar, save_sidecar, plan_segments
+from metrics import ChunkStats, RunMetrics
+from roff import MaskedText, is_roff, split_roff_units
+from batching import (BATCH_PROMPT_NOTE, BatchMismatchError, RequestBatcher, pack_segments,
+                      unpack_segments)
+from service_pool import BackendPool, PoolMember
+from manifest import MANIFEST_NAME, TranslationManifest
+from man_install import ManInstaller
+from prompts import build_system_prompt, build_user_prompt, prompt_style, system_prompts
+
+# 译文相对原文的 token 膨胀系数（英文译为中文时 token 数会增加）
+OUTPUT_EXPANSION_RATIO = 1.5
+# 每个请求中消息结构、指令等额外占用的 token 数
+REQUEST_OVERHEAD_TOKENS = 64
+# 分块的最小 token 预算
+MIN_CHUNK_TOKENS = 128
+# 章节的翻译优先级（数字越小越先翻译），未列出的章节为 SECTION_PRIORITY_DEFAULT
+SECTION_PRIORITIES = {
+    'NAME': 0, 'SYNOPSIS': 0,
+    'DESCRIPTION': 1, 'OPTIONS': 1,
+    'EXAMPLES': 3, 'EXAMPLE': 3, 'BUGS': 3, 'REPORTING BUGS': 3, 'SEE ALSO': 3,
+    'AUTHOR': 3, 'AUTHORS': 3, 'COPYRIGHT': 3, 'HISTORY': 3, 'COLOPHON': 3,
+}
+SECTION_PRIORITY_DEFAULT = 2
+# 优先级不大于该值的章节全部翻译后写出预览，其余章节保留原文直至翻译完成
+PREVIEW_PRIORITY = 1
+# 限流（429）重试的最大次数，不计入普通的失败重试次数
+MAX_RATE_LIMIT_RETRIES = 10
+
+_CJK_PATTERN = re.compile(r'[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+_SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?;。！？；])\s+')
+# 章节标题：roff 的 .SH / .Sh 宏，格式化文本中顶格的大写行
+_ROFF_HEADING_PATTERN = re.compile(r'^\.S[Hh][ \t]+"?([^"\n]*?)"?[ \t]*$', re.M)
+_TEXT_HEADING_PATTERN = re.compile(r'^([A-Z][A-Z0-9 /&-]*[A-Z])[ \t]*$', re.M)
 
 def validate_config(config):
     """
@@ -32,8 +74,13 @@ def validate_config(config):
         'type': str  # 新增服务类型字段
     }
     
-    # Gemini 服务不需要 URL 字段
-    if config.get('type', '').lower() == 'gemini':
+    # 服务类型必须已注册；不使用 URL 的服务（如 Gemini）不需要 URL 字段
+    try:
+        backend = get_service_backend(config.get('type', 'chatgpt'))
+    except ValueError as e:
+        return False, str(e)
+    requires_url = getattr(backend, 'REQUIRES_URL', True)
+    if not requires_url:
         del required_fields['url']
     
     for field, field_type in required_fields.items():
@@ -42,8 +89,8 @@ def validate_config(config):
         if not isinstance(config[field], field_type):
             return False, f"配置项 {field} 类型错误，应为 {field_type.__name__}"
     
-    # 验证 URL 格式（仅对非 Gemini 服务）
-    if config.get('type', '').lower() != 'gemini' and not config['url'].startswith(('http://', 'https://')):
+    # 验证 URL 格式（仅对使用 URL 的服务）
+    if requires_url and not config['url'].startswith(('http://', 'https://')):
         return False, "URL 格式无效"
     
     # 验证数值范围
@@ -51,6 +98,46 @@ def validate_config(config):
         return False, "max_output_length 必须大于 0"
     if config['max_context_length'] <= 0:
         return False, "max_context_length 必须大于 0"
+    
+    # 可选的限速与并发配置
+    for field in ('rpm', 'tpm', 'concurrency', 'max_concurrency'):
+        if field in config and (not isinstance(config[field], int) or config[field] <= 0):
+            return False, f"配置项 {field} 必须是大于 0 的整数"
+    
+    # 可选的批量请求配置
+    if 'batch_requests' in config and not isinstance(config['batch_requests'], bool):
+        return False, "配置项 batch_requests 必须是布尔值"
+    if 'batch_wait_ms' in config and (not isinstance(config['batch_wait_ms'], int)
+                                      or config['batch_wait_ms'] < 0):
+        return False, "配置项 batch_wait_ms 必须是不小于 0 的整数"
+    for field in ('stream', 'stream_usage'):
+        if field in config and not isinstance(config[field], bool):
+            return False, f"配置项 {field} 必须是布尔值"
+    
+    # 可选的提示词模板和 Gemini 缓存内容配置
+    try:
+        prompt_style(config)
+    except ValueError as e:
+        return False, str(e)
+    if 'cached_content' in config and not isinstance(config['cached_content'], bool):
+        return False, "配置项 cached_content 必须是布尔值"
+    if 'cache_ttl' in config and (not isinstance(config['cache_ttl'], int)
+                                  or config['cache_ttl'] <= 0):
+        return False, "配置项 cache_ttl 必须是大于 0 的整数"
+    
+    # 可选的服务池配置
+    if 'hedge_percentile' in config and (not isinstance(config['hedge_percentile'], (int, float))
+                                         or not 0 <= config['hedge_percentile'] < 100):
+        return False, "配置项 hedge_percentile 必须在 0 到 100 之间（0 表示不发送对冲请求）"
+    if 'hedge_min_ms' in config and (not isinstance(config['hedge_min_ms'], int)
+                                     or config['hedge_min_ms'] < 0):
+        return False, "配置项 hedge_min_ms 必须是不小于 0 的整数"
+    if 'max_error_rate' in config and (not isinstance(config['max_error_rate'], (int, float))
+                                       or not 0 < config['max_error_rate'] <= 1):
+        return False, "配置项 max_error_rate 必须在 0 到 1 之间"
+    if 'cooldown' in config and (not isinstance(config['cooldown'], (int, float))
+                                 or config['cooldown'] <= 0):
+        return False, "配置项 cooldown 必须大于 0"
         
     return True, ""
 
@@ -80,58 +167,99 @@ class ConfigCache:
         Returns:
             dict: 配置信息
         """
-        current_time = time.time()
-        
         with cls._lock:
-            # 检查是否需要重新加载配置
-            if (cls._config is None or 
-                force_reload or 
-                current_time - cls._last_load_time > cls._cache_duration):
-                try:
-                    if not os.path.exists(config_path):
-                        raise FileNotFoundError(f"配置文件不存在：{config_path}")
-                        
-                    with open(config_path, "r", encoding='utf-8') as config_file:
-                        cls._config = json.load(config_file)
-                    
-                    if not isinstance(cls._config, dict):
-                        raise ValueError("配置文件格式错误：根对象必须是字典")
-                        
-                    if 'services' not in cls._config:
-                        raise ValueError("配置文件缺少 'services' 部分")
-                        
-                    cls._last_load_time = current_time
-                    print("配置已重新加载", file=sys.stderr)
-                except FileNotFoundError as e:
-                    print(f"错误：{str(e)}", file=sys.stderr)
-                    sys.exit(1)
-                except json.JSONDecodeError as e:
-                    print(f"配置文件 JSON 格式错误：{str(e)}", file=sys.stderr)
-                    sys.exit(1)
-                except Exception as e:
-                    print(f"加载配置文件时出错：{str(e)}", file=sys.stderr)
-                    sys.exit(1)
+            cls._ensure_loaded(config_path, force_reload)
             
             if not service_name:
                 service_name = cls._config.get('default_service')
                 if not service_name:
                     raise ValueError("未设置默认服务且未指定服务名称")
             
-            service_config = cls._config.get('services', {}).get(service_name)
-            if not service_config:
-                raise ValueError(f"服务 '{service_name}' 不存在")
-                
+            return cls._merge_service(service_name)
+
+    @classmethod
+    def _merge_service(cls, service_name, pool_member=False):
+        """在持有锁的情况下合并默认值与服务配置并验证；服务池会展开各成员服务的配置"""
+        service_config = cls._config.get('services', {}).get(service_name)
+        if not service_config:
+            raise ValueError(f"服务 '{service_name}' 不存在")
+        
+        if service_config.get('type') == 'pool':
+            if pool_member:
+                raise ValueError(f"服务池的成员 '{service_name}' 不能是服务池")
+            members = service_config.get('members')
+            if not isinstance(members, dict) or not members:
+                raise ValueError(f"服务池 '{service_name}' 缺少 members（服务名称: 权重）")
+            member_configs = {name: cls._merge_service(name, pool_member=True)
+                              for name in members}
+            merged_config = build_pool_config(service_name, service_config, member_configs)
+        else:
             # 使用默认值或服务特定值
             defaults = cls._config.get('defaults', {})
             merged_config = defaults.copy()
             merged_config.update(service_config)
+        
+        # 验证合并后的配置
+        is_valid, error_msg = validate_config(merged_config)
+        if not is_valid:
+            raise ValueError(f"配置验证失败：{error_msg}")
             
-            # 验证合并后的配置
-            is_valid, error_msg = validate_config(merged_config)
-            if not is_valid:
-                raise ValueError(f"配置验证失败：{error_msg}")
+        return merged_config
+
+    @classmethod
+    def get_setting(cls, key, default=None, config_path="config.json"):
+        """
+        获取配置文件顶层的全局设置（如 translation_memory）
+        
+        Args:
+            key: 顶层配置键
+            default: 配置不存在时的默认值
+            config_path: 配置文件路径
+            
+        Returns:
+            配置值或默认值
+        """
+        with cls._lock:
+            cls._ensure_loaded(config_path)
+            return cls._config.get(key, default)
+
+    @classmethod
+    def _ensure_loaded(cls, config_path, force_reload=False):
+        """在持有锁的情况下按需（重新）加载配置文件"""
+        current_time = time.time()
+        
+        # 检查是否需要重新加载配置
+        if (cls._config is None or 
+            force_reload or 
+            current_time - cls._last_load_time > cls._cache_duration):
+            try:
+                if not os.path.exists(config_path):
+                    raise FileNotFoundError(f"配置文件不存在：{config_path}")
+                    
+                with open(config_path, "r", encoding='utf-8') as config_file:
+                    cls._config = json.load(config_file)
+                
+                if not isinstance(cls._config, dict):
+                    raise ValueError("配置文件格式错误：根对象必须是字典")
+                    
+                if 'services' not in cls._config:
+                    raise ValueError("配置文件缺少 'services' 部分")
                 
-            return merged_config
+                # 配置文件中声明的扩展服务类型（"模块:类名"），首次使用时才导入
+                for service_type, target in (cls._config.get('backends') or {}).items():
+                    register_service(service_type, target)
+                    
+                cls._last_load_time = current_time
+                print("配置已重新加载", file=sys.stderr)
+            except FileNotFoundError as e:
+                print(f"错误：{str(e)}", file=sys.stderr)
+                sys.exit(1)
+            except json.JSONDecodeError as e:
+                print(f"配置文件 JSON 格式错误：{str(e)}", file=sys.stderr)
+                sys.exit(1)
+            except Exception as e:
+                print(f"加载配置文件时出错：{str(e)}", file=sys.stderr)
+                sys.exit(1)
 
     @classmethod
     def invalidate_cache(cls):
@@ -140,6 +268,210 @@ class ConfigCache:
             cls._config = None
             cls._last_load_time = 0
 
+def get_data_dir(create=True):
+    """
+    获取 ManZH 数据目录（翻译记忆等持久化数据）
+    
+    优先级：环境变量 MANZH_DATA_DIR > 配置项 data_dir > 程序目录下的 data
+    
+    Args:
+        create: 目录不存在时是否创建（只读取数据时传 False）
+    
+    Returns:
+        str: 数据目录路径
+    """
+    data_dir = os.environ.get('MANZH_DATA_DIR')
+    if not data_dir:
+        data_dir = ConfigCache.get_setting('data_dir')
+    if not data_dir:
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    if create:
+        os.makedirs(data_dir, exist_ok=True)
+    return data_dir
+
+def create_translation_memory(readonly=False):
+    """
+    根据配置文件中的 translation_memory 设置创建持久化翻译记忆
+    
+    Args:
+        readonly: 以只读方式打开已有的翻译记忆（容量估算），不创建数据目录和数据库
+    
+    Returns:
+        TranslationMemory: 翻译记忆实例，禁用、打开失败或只读时不存在时返回 None
+    """
+    settings = ConfigCache.get_setting('translation_memory', {}) or {}
+    if not settings.get('enabled', True):
+        return None
+    
+    db_path = settings.get('path') or os.path.join(get_data_dir(create=not readonly),
+                                                   'translation_memory.db')
+    if readonly and not os.path.exists(db_path):
+        return None
+    try:
+        return TranslationMemory(db_path, max_size_mb=settings.get('max_size_mb', 256),
+                                 readonly=readonly)
+    except Exception as e:
+        print(f"警告：无法打开翻译记忆 {db_path}：{str(e)}", file=sys.stderr)
+        return None
+
+def create_translation_manifest(log=None):
+    """
+    打开数据目录下的译文清单
+    
+    Args:
+        log: 错误信息的输出流（默认 sys.stderr）
+        
+    Returns:
+        TranslationManifest: 译文清单，打开失败时返回 None
+    """
+    db_path = os.path.join(get_data_dir(), MANIFEST_NAME)
+    try:
+        return TranslationManifest(db_path)
+    except Exception as e:
+        print(f"警告：无法打开译文清单 {db_path}：{str(e)}", file=log or sys.stderr)
+        return None
+
+def create_man_installer(manifest=None, log=None):
+    """
+    根据配置文件中的 install 设置创建手册页安装器
+    
+    Args:
+        manifest: 可选的译文清单，删除旧格式的译文时同时删除其记录
+        log: 错误信息的输出流
+        
+    Returns:
+        ManInstaller: 安装器，结束时需调用 close 更新 man 索引
+    """
+    settings = ConfigCache.get_setting('install', {}) or {}
+    return ManInstaller(compress=settings.get('compress', True),
+                        update_index=settings.get('update_index', True),
+                        manifest=manifest, log=log)
+
+def record_manifest(manifest, output, source, config, chunks, log=None):
+    """在译文清单中记录保存的译文，记录失败不影响翻译结果"""
+    if manifest is None:
+        return
+    try:
+        manifest.record(output, source, config, chunks)
+    except Exception as e:
+        print(f"警告：无法记录到译文清单：{str(e)}", file=log or sys.stderr)
+
+def create_run_metrics(config, mode="translate", path=None):
+    """
+    根据配置文件中的 metrics 设置创建本次运行的指标记录
+    
+    Args:
+        config: 服务配置
+        mode: 运行模式标签
+        path: 命令行指定的 JSON Lines 文件路径，优先于配置
+        
+    Returns:
+        RunMetrics: 指标记录实例，未启用时返回 None
+    """
+    settings = ConfigCache.get_setting('metrics', {}) or {}
+    if not path and not settings.get('enabled', False):
+        return None
+    
+    path = path or settings.get('path') or os.path.join(get_data_dir(), 'metrics.jsonl')
+    return RunMetrics(config, mode=mode, path=path,
+                      prometheus_path=settings.get('prometheus_textfile') or None,
+                      record_chunks=settings.get('chunks', True))
+
+def write_run_metrics(metrics, log=None):
+    """写出运行指标并在标准错误输出（或 log）汇总，写出失败不影响翻译结果"""
+    if metrics is None:
+        return
+    log = log or sys.stderr
+    try:
+        summary = metrics.write()
+        print(metrics.format_summary(summary), file=log)
+    except Exception as e:
+        print(f"警告：写入运行指标失败：{str(e)}", file=log)
+
+def estimate_tokens(text):
+    """
+    估算文本的 token 数
+    
+    CJK 字符约 1 个 token，其余字符约 3 个字符 1 个 token（命令行文档中符号较多，
+    按偏保守的比例估算）。
+    
+    Args:
+        text: 文本内容
+        
+    Returns:
+        int: 估算的 token 数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 3)
+
+def chunk_token_budget(config):
+    """
+    根据服务的 max_context_length / max_output_length 计算每块的输入 token 预算
+    
+    需同时满足：
+    1. 译文（按膨胀系数估算）不超过 max_output_length
+    2. 系统提示词 + 原文 + 译文不超过 max_context_length
+    
+    Args:
+        config: 服务配置
+        
+    Returns:
+        int: 每块的输入 token 预算
+    """
+    prompt_tokens = max(estimate_tokens(prompt) for prompt in system_prompts(config)) \
+        + REQUEST_OVERHEAD_TOKENS
+    by_output = config['max_output_length'] / OUTPUT_EXPANSION_RATIO
+    by_context = (config['max_context_length'] - prompt_tokens) / (1 + OUTPUT_EXPANSION_RATIO)
+    return max(int(min(by_output, by_context)), MIN_CHUNK_TOKENS)
+
+def build_pool_config(name, settings, member_configs):
+    """
+    根据服务池的设置和各成员服务的配置生成服务池的配置
+    
+    每块可能由任一成员翻译，块大小按成员中最小的上下文和输出长度计算；
+    初始并发和最大并发默认为各成员之和，只用于确定翻译线程数，请求由各成员自己的调度器
+    限速和控制并发。
+    
+    Args:
+        name: 服务池名称
+        settings: 服务池的配置项，members 为 {服务名称: 权重}
+        member_configs: {服务名称: 合并后的成员服务配置}
+        
+    Returns:
+        dict: 服务池配置，members 为 [{"name", "weight", "config"}]
+        
+    Raises:
+        ValueError: 权重无效或成员的目标语言不一致时
+    """
+    weights = settings.get('members') or {}
+    for member, weight in weights.items():
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError(f"服务池 '{name}' 中 {member} 的权重必须大于 0")
+    configs = [member_configs[member] for member in weights]
+    languages = {config['language'] for config in configs}
+    if len(languages) != 1:
+        raise ValueError(f"服务池 '{name}' 的成员目标语言不一致：{', '.join(sorted(languages))}")
+    
+    pool_config = {
+        'concurrency': sum(config.get('concurrency', 4) for config in configs),
+        'max_concurrency': sum(config.get('max_concurrency', 16) for config in configs),
+    }
+    pool_config.update(settings)
+    pool_config.update({
+        'type': 'pool',
+        'service': name,
+        'api_key': '',
+        'model': '+'.join(weights),
+        'language': languages.pop(),
+        'max_context_length': min(config['max_context_length'] for config in configs),
+        'max_output_length': min(config['max_output_length'] for config in configs),
+        'members': [{'name': member, 'weight': weight, 'config': member_configs[member]}
+                    for member, weight in weights.items()],
+    })
+    return pool_config
+
 # 修改原有的 load_config 函数
 def load_config(config_path="config.json", service_name=None):
     """
@@ -156,7 +488,7 @@ def load_config(config_path="config.json", service_name=None):
 
 # 配置重试策略
 def create_retry_session(retries=3, backoff_factor=0.3, 
-                        status_forcelist=(500, 502, 504)):
+                        status_forcelist=(500, 502, 503, 504), pool_size=10):
     session = requests.Session()
     retry = Retry(
         total=retries,
@@ -165,30 +497,184 @@ def create_retry_session(retries=3, backoff_factor=0.3,
         backoff_factor=backoff_factor,
         status_forcelist=status_forcelist,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    # 连接池大小与并发线程数一致，保持长连接在请求之间复用
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size,
+                          pool_maxsize=pool_size)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
 
+class SingleFlightCache:
+    """
+    单飞（single-flight）翻译缓存
+
+    相同内容在翻译过程中只会发起一次请求，其余线程共享同一个待定结果；
+    不同内容的请求互不阻塞。锁只保护字典的读写，不包含翻译调用本身。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+        self._pending = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._results)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._results
+
+    def get_or_compute(self, key, compute):
+        """
+        获取缓存结果，不存在时调用 compute 计算（同一 key 只计算一次）
+
+        Args:
+            key: 缓存键
+            compute: 无参计算函数
+
+        Returns:
+            计算结果
+
+        Raises:
+            Exception: compute 抛出的异常会传递给所有等待该 key 的线程
+        """
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+            pending = self._pending.get(key)
+            is_owner = pending is None
+            if is_owner:
+                pending = Future()
+                self._pending[key] = pending
+
+        if not is_owner:
+            return pending.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(e)
+            raise
+
+        with self._lock:
+            self._results[key] = result
+            del self._pending[key]
+        pending.set_result(result)
+        return result
+
+# 各服务共享的调度器和服务实例
+_service_schedulers = {}
+_service_schedulers_lock = threading.Lock()
+_service_instances = {}
+# 服务池在创建时获取成员服务的实例，需要可重入
+_service_instances_lock = threading.RLock()
+_request_batchers = {}
+_request_batchers_lock = threading.Lock()
+# 服务类型 -> 翻译服务类或 "模块:类名"，内置类型在服务类定义后注册
+_service_backends = {}
+_service_backends_lock = threading.Lock()
+
+def service_key(config):
+    """
+    生成服务实例的标识（相同标识的配置共享调度器等进程级资源）
+    
+    Args:
+        config: 服务配置
+        
+    Returns:
+        tuple: 服务标识
+    """
+    return (
+        config.get('type', 'chatgpt').lower(),
+        config.get('url', ''),
+        config.get('model', ''),
+        config.get('api_key', ''),
+    )
+
+def get_service_scheduler(config):
+    """
+    获取服务的共享调度器（RPM/TPM 限速 + 自适应并发），同一进程内每个服务只创建一次
+    
+    Args:
+        config: 服务配置
+        
+    Returns:
+        ServiceScheduler: 调度器实例
+    """
+    key = service_key(config)
+    with _service_schedulers_lock:
+        scheduler = _service_schedulers.get(key)
+        if scheduler is None:
+            # 截断和批量结果不一致是内容问题，不说明服务过载，不降低并发
+            scheduler = ServiceScheduler(config,
+                                         content_errors=(TruncatedError, BatchMismatchError))
+            _service_schedulers[key] = scheduler
+        return scheduler
+
+def get_request_batcher(config):
+    """
+    获取服务的共享批量请求合并器，同一进程内每个服务只创建一次
+    
+    配置项 batch_requests 为 false 时不合并请求；batch_wait_ms 为发送前等待
+    其他小块加入的最长时间（默认 20 毫秒）。
+    
+    Args:
+        config: 服务配置
+        
+    Returns:
+        RequestBatcher: 合并器实例，未启用时返回 None
+    """
+    if not config.get('batch_requests', True):
+        return None
+    key = service_key(config)
+    with _request_batchers_lock:
+        batcher = _request_batchers.get(key)
+        if batcher is None:
+            # 批量请求的提示词多出一段说明，预算相应减少
+            budget = max(chunk_token_budget(config) - estimate_tokens(BATCH_PROMPT_NOTE),
+                         MIN_CHUNK_TOKENS)
+            # 批量请求的译文被截断时同样拆分批次重试
+            batcher = RequestBatcher(budget, size_func=estimate_tokens,
+                                     max_wait=config.get('batch_wait_ms', 20) / 1000,
+                                     split_errors=(BatchMismatchError, TruncatedError))
+            _request_batchers[key] = batcher
+        return batcher
+
 # 添加翻译队列类
 class TranslationQueue:
-    def __init__(self, chunk_size=2000, max_retries=3):
+    def __init__(self, chunk_size=2000, max_retries=3, memory=None, cache=None,
+                 show_progress=True, size_func=len, result_handler=None, log=None):
         if chunk_size <= 0:
             raise ValueError("chunk_size 必须大于 0")
         if max_retries <= 0:
             raise ValueError("max_retries 必须大于 0")
             
-        self.queue = Queue()
+        self.queue = PriorityQueue()  # (章节优先级, 块索引, 内容)
+        self.queue_lock = threading.Lock()  # 按条件取块时保证其他线程看到完整的队列
         self.results = {}
-        self.cache = {}
+        self.cache = cache if cache is not None else SingleFlightCache()  # 可在多个文档间共享
+        self.memory = memory  # 可选的持久化翻译记忆（TranslationMemory）
+        self.metrics = None  # 可选的运行指标（RunMetrics），记录每个块的耗时和用量
+        self.document = None  # 文档名称，用于指标记录
         self.lock = threading.Lock()
         self.chunk_size = chunk_size
+        self.size_func = size_func  # 块大小度量：len 按字符，estimate_tokens 按 token
+        self.separator = '\n\n'  # 合并译文时块之间的分隔符（与分块时的段落边界一致）
+        self.content_format = 'text'  # 内容格式，split_units 检测到 roff 源文件时为 'roff'
+        # 可选的结果处理函数（如 OrderedStreamWriter.put），设置后结果交给它处理而不在内存中保留
+        self.result_handler = result_handler
+        # 进度与错误信息的输出流（如守护进程发给客户端的 stderr），默认 sys.stderr
+        self.log = log
         self.max_retries = max_retries
         self.total_chunks = 0
         self.completed_chunks = 0
         self.failed_chunks = []
         self.progress_lock = threading.Lock()
         self.is_processing = False
+        self.show_progress = show_progress
         self._error_count = 0
         self.MAX_ERROR_COUNT = 5  # 最大连续错误次数
 
@@ -202,6 +688,26 @@ class TranslationQueue:
         Returns:
             list: 内容块列表
             
+        Raises:
+            ValueError: 当内容为空或无效时
+        """
+        chunks = self.pack_units(self.split_units(content))
+        if not chunks:
+            raise ValueError("无法生成有效的内容块")
+            
+        self.total_chunks = len(chunks)
+        return chunks
+
+    def split_units(self, content):
+        """
+        将内容拆分为翻译单元（段落），超出块大小的段落会被进一步拆分
+        
+        Args:
+            content: 要翻译的完整内容
+            
+        Returns:
+            list: 翻译单元列表
+            
         Raises:
             ValueError: 当内容为空或无效时
         """
@@ -211,39 +717,196 @@ class TranslationQueue:
         content = content.strip()
         if not content:
             raise ValueError("输入内容为空")
-            
-        # 按段落分割，避免在句子中间断开
-        paragraphs = content.split('\n\n')
-        chunks = []
-        current_chunk = ""
         
+        # roff 源文件在结构宏（.SH/.TP/.PP 等）之前拆分，逐行连接
+        if is_roff(content):
+            self.content_format = 'roff'
+            self.separator = '\n'
+            paragraphs = split_roff_units(content)
+        else:
+            # 按段落分割，避免在句子中间断开
+            paragraphs = content.split('\n\n')
+            
+        units = []
         for para in paragraphs:
             if not para.strip():
                 continue
-                
-            if len(current_chunk) + len(para) + 2 <= self.chunk_size:
-                current_chunk += (para + '\n\n')
+            if self.measure(para) <= self.chunk_size:
+                units.append(para)
             else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = para + '\n\n'
+                units.extend(self._split_oversized(para))
+        return units
+
+    def measure(self, text):
+        """
+        计算文本实际发送给翻译服务的大小（roff 内容按屏蔽格式标记后的正文计算）
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        Args:
+            text: 文本内容
             
-        if not chunks:
-            raise ValueError("无法生成有效的内容块")
+        Returns:
+            int: 按 size_func 度量的大小
+        """
+        if self.content_format == 'roff':
+            text = MaskedText(text).text
+        return self.size_func(text)
+
+    def pack_units(self, units):
+        """
+        将翻译单元按块大小合并为内容块
+        
+        Args:
+            units: 翻译单元列表
             
-        self.total_chunks = len(chunks)
-        return chunks
+        Returns:
+            list: 内容块列表
+        """
+        return [self.join_units(group) for group in self.group_units(units)]
 
-    def add_chunk(self, index, content):
+    def join_units(self, units):
+        """
+        将一组翻译单元合并为一个内容块
+        
+        Args:
+            units: 翻译单元列表
+            
+        Returns:
+            str: 内容块
+        """
+        return self.separator.join(units).strip()
+
+    def group_units(self, units, limit=None):
+        """
+        将翻译单元按块大小分组，每组对应一个内容块
+        
+        Args:
+            units: 翻译单元列表
+            limit: 每组的大小上限，默认为 chunk_size
+            
+        Returns:
+            list: 翻译单元分组列表
+        """
+        limit = limit or self.chunk_size
+        groups = []
+        current_group = []
+        current_size = 0
+        
+        for unit in units:
+            unit_size = self.measure(unit + self.separator)
+            if current_size + unit_size <= limit:
+                current_group.append(unit)
+                current_size += unit_size
+            else:
+                if current_group:
+                    groups.append(current_group)
+                current_group = [unit]
+                current_size = unit_size
+        
+        if current_group:
+            groups.append(current_group)
+        return groups
+
+    def _split_oversized(self, para, limit=None):
+        """
+        拆分超出块大小的段落：依次按行、句子、单词切分，最后按字符截断
+        
+        Args:
+            para: 段落内容
+            limit: 片段的大小上限，默认为 chunk_size
+            
+        Returns:
+            list: 不超过块大小的片段列表
+        """
+        limit = limit or self.chunk_size
+        for pattern, joiner in ((r'\n', '\n'), (_SENTENCE_END_PATTERN, ' '), (r'\s+', ' ')):
+            parts = [p for p in re.split(pattern, para) if p.strip()]
+            if len(parts) > 1:
+                break
+        else:
+            # 无法按边界切分，按字符截断
+            step = max(limit, 1)
+            while self.measure(para[:step]) > limit and step > 1:
+                step //= 2
+            return [para[i:i + step] for i in range(0, len(para), step)]
+
+        pieces = []
+        current = ""
+        for part in parts:
+            if self.measure(part) > limit:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.extend(self._split_oversized(part, limit))
+            elif not current:
+                current = part
+            elif self.measure(current + joiner + part) <= limit:
+                current += joiner + part
+            else:
+                pieces.append(current)
+                current = part
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def split_chunk(self, content):
+        """
+        将内容块拆分为大小约为原来一半的若干块（译文被截断时缩小后重新翻译）
+        
+        Args:
+            content: 内容块
+            
+        Returns:
+            list: 内容块列表，无法继续拆分时只包含原内容块
+        """
+        limit = max(self.measure(content) // 2, 1)
+        if self.content_format == 'roff':
+            paragraphs = split_roff_units(content)
+        else:
+            paragraphs = [p for p in content.split('\n\n') if p.strip()]
+        units = []
+        for para in paragraphs:
+            if self.measure(para) <= limit:
+                units.append(para)
+            else:
+                units.extend(self._split_oversized(para, limit))
+        return [self.join_units(group) for group in self.group_units(units, limit)]
+
+    def section_priorities(self, chunks):
+        """
+        按所属章节计算各块的翻译优先级（数字越小越先翻译）
+        
+        块内第一个章节标题之前的内容属于前一块的章节；包含多个章节的块取其中最高的优先级。
+        第一个章节之前的内容（如 .TH 或页眉）最先翻译，没有章节的内容（如 help 输出）按块顺序翻译。
+        
+        Args:
+            chunks: 按顺序排列的内容块
+            
+        Returns:
+            list: 各块的优先级
+        """
+        pattern = _ROFF_HEADING_PATTERN if self.content_format == 'roff' else _TEXT_HEADING_PATTERN
+        priorities = []
+        section = None
+        for chunk in chunks:
+            matches = list(pattern.finditer(chunk))
+            sections = [match.group(1).strip().upper() for match in matches]
+            if not matches or chunk[:matches[0].start()].strip():
+                sections.insert(0, section)
+            priorities.append(min(0 if name is None
+                                  else SECTION_PRIORITIES.get(name, SECTION_PRIORITY_DEFAULT)
+                                  for name in sections))
+            if matches:
+                section = sections[-1]
+        return priorities
+
+    def add_chunk(self, index, content, priority=SECTION_PRIORITY_DEFAULT):
         """
         添加翻译块到队列
         
         Args:
             index: 块索引
             content: 块内容
+            priority: 章节优先级，数字越小越先翻译
             
         Raises:
             ValueError: 当索引或内容无效时
@@ -253,19 +916,45 @@ class TranslationQueue:
         if not content or not isinstance(content, str):
             raise ValueError("无效的块内容")
             
-        self.queue.put((index, content.strip()))
+        self.queue.put((priority, index, content.strip()))
 
-    def get_chunk(self):
+    def get_chunk(self, limit=None, exempt_priority=None):
         """
-        获取待翻译的块
+        取出优先级最高的待翻译块，优先级相同时按块顺序
+        
+        Args:
+            limit: 可选，只取索引小于 limit 的块（如流式输出的窗口），其余块留在队列中
+            exempt_priority: 可选，优先级数字不大于该值的块不受 limit 限制
         
         Returns:
-            tuple: (索引, 内容)
-            
-        Raises:
-            Queue.Empty: 当队列为空时
+            tuple: (索引, 内容)，队列为空或没有符合条件的块时返回 None
         """
-        return self.queue.get(timeout=1)  # 1秒超时
+        skipped = []
+        with self.queue_lock:
+            try:
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except Empty:
+                        return None
+                    if (limit is None or item[1] < limit
+                            or (exempt_priority is not None and item[0] <= exempt_priority)):
+                        return item[1], item[2]
+                    skipped.append(item)
+            finally:
+                for item in skipped:
+                    self.queue.put(item)
+
+    def lowest_index(self):
+        """
+        获取队列中最小的块索引
+        
+        Returns:
+            int: 块索引，队列为空时返回 None
+        """
+        with self.queue_lock:
+            indexes = [item[1] for item in list(self.queue.queue)]
+        return min(indexes) if indexes else None
 
     def add_result(self, index, result):
         """
@@ -283,11 +972,15 @@ class TranslationQueue:
         if not result or not isinstance(result, str):
             raise ValueError("无效的翻译结果")
             
-        with self.lock:
-            self.results[index] = result.strip()
-            with self.progress_lock:
-                self.completed_chunks += 1
-                self._update_progress()
+        if self.result_handler is not None:
+            self.result_handler(index, result.strip())
+        else:
+            with self.lock:
+                self.results[index] = result.strip()
+            
+        with self.progress_lock:
+            self.completed_chunks += 1
+            self._update_progress()
 
     def add_failed_chunk(self, index):
         """
@@ -305,6 +998,16 @@ class TranslationQueue:
                 if self._error_count >= self.MAX_ERROR_COUNT:
                     raise RuntimeError(f"连续失败次数过多（{self._error_count}次），停止处理")
 
+    def should_stop(self):
+        """
+        是否因失败过多而应停止提交新的块
+        
+        Returns:
+            bool: 失败次数达到上限时返回 True
+        """
+        with self.lock:
+            return self._error_count >= self.MAX_ERROR_COUNT
+
     def get_ordered_results(self):
         """
         获取按顺序排列的翻译结果
@@ -320,13 +1023,25 @@ class TranslationQueue:
             
         return [self.results[i] for i in sorted(self.results.keys())]
 
+    def get_translated_document(self):
+        """
+        获取合并后的完整译文
+        
+        Returns:
+            str: 按块顺序合并的译文
+        """
+        return self.separator.join(self.get_ordered_results())
+
     def _update_progress(self):
         """更新翻译进度"""
+        if not self.show_progress:
+            return
+        log = self.log or sys.stderr
         progress = (self.completed_chunks / self.total_chunks) * 100
         print(f"\r翻译进度：{progress:.1f}% ({self.completed_chunks}/{self.total_chunks})", 
-              end="", file=sys.stderr)
+              end="", file=log)
         if self.completed_chunks == self.total_chunks:
-            print(file=sys.stderr)  # 换行
+            print(file=log)  # 换行
 
     def get_or_cache(self, content, translate_func):
         """
@@ -348,118 +1063,520 @@ class TranslationQueue:
         if not callable(translate_func):
             raise ValueError("无效的翻译函数")
             
-        # 生成内容的哈希值作为缓存键
-        cache_key = hash(content)
-        
-        with self.lock:
-            if cache_key in self.cache:
-                return self.cache[cache_key]
-            
+        # 使用稳定的内容摘要作为缓存键
+        cache_key = content_digest(content)
+
+        def translate():
             result = translate_func(content)
             if not result:
                 raise RuntimeError("翻译失败")
-                
-            self.cache[cache_key] = result.strip()
-            return result
+            return result.strip()
+
+        # 相同内容共享同一次请求，不同内容并行翻译
+        return self.cache.get_or_compute(cache_key, translate)
+
+class OrderedStreamWriter:
+    """
+    按块顺序流式输出译文
+    
+    块 i 在块 0..i 全部完成后立即写出并刷新；乱序完成的块暂存在有界的重排缓冲区中，
+    取块的线程只取 window_end 之前的块，通过 wait_for_slot 等待窗口前进，
+    最多领先已输出位置 max_pending 个块。
+    """
+    
+    def __init__(self, stream, max_pending=16, separator='\n\n'):
+        """
+        Args:
+            stream: 输出流（如 sys.stdout 或已打开的文件）
+            max_pending: 重排缓冲区的最大块数
+            separator: 块之间的分隔符
+            
+        Raises:
+            ValueError: 当 max_pending 无效时
+        """
+        if max_pending <= 0:
+            raise ValueError("max_pending 必须大于 0")
+            
+        self.stream = stream
+        self.max_pending = max_pending
+        self.separator = separator
+        self.next_index = 0
+        self.buffer = {}
+        self.aborted = False
+        self.condition = threading.Condition()
+
+    def window_end(self):
+        """
+        获取输出窗口的结束位置（不含），索引小于该位置的块可以开始翻译
+        
+        Returns:
+            int: 窗口结束位置
+        """
+        with self.condition:
+            return self.next_index + self.max_pending
+
+    def wait_for_slot(self, index):
+        """
+        等待块 index 进入输出窗口
+        
+        Args:
+            index: 块索引
+            
+        Returns:
+            bool: 可以提交时返回 True，写出已中止时返回 False
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.aborted or index < self.next_index + self.max_pending
+            )
+            return not self.aborted
+
+    def put(self, index, text):
+        """
+        放入块 index 的译文，并写出所有已连续完成的块
+        
+        Args:
+            index: 块索引
+            text: 译文
+        """
+        with self.condition:
+            if self.aborted:
+                return
+            self.buffer[index] = text
+            while self.next_index in self.buffer:
+                if self.next_index > 0:
+                    self.stream.write(self.separator)
+                self.stream.write(self.buffer.pop(self.next_index))
+                self.next_index += 1
+            self.stream.flush()
+            self.condition.notify_all()
+
+    def abort(self):
+        """中止写出（如某块翻译失败），唤醒所有等待的提交方"""
+        with self.condition:
+            self.aborted = True
+            self.buffer.clear()
+            self.condition.notify_all()
+
+    def finish(self):
+        """写出结尾换行"""
+        with self.condition:
+            self.stream.write('\n')
+            self.stream.flush()
+
+class TruncatedError(RuntimeError):
+    """译文达到输出长度上限（finish_reason 为 length / MAX_TOKENS）被截断"""
 
 class TranslationService(ABC):
     """翻译服务抽象基类"""
     
     @abstractmethod
-    def translate(self, content, system_prompt):
+    def translate(self, content, system_prompt, usage=None):
         """
         执行翻译
         
         Args:
             content: 要翻译的内容
             system_prompt: 系统提示词
+            usage: 可选的字典，服务返回 token 用量时写入 input_tokens / output_tokens，
+                   以及命中服务端前缀缓存的输入 token 数 cached_input_tokens；
+                   需要告知用户的警告追加到 warnings 列表，由 translate_worker 输出到日志
             
         Returns:
             str: 翻译结果
         """
         pass
+    
+    def translate_batch(self, segments, system_prompt, usage=None):
+        """
+        在一次请求中翻译多个相互独立的片段
+        
+        片段以 JSON 字符串数组发送，要求服务返回同样长度的数组。
+        
+        Args:
+            segments: 文本片段列表
+            system_prompt: 系统提示词
+            usage: 可选的字典，服务返回 token 用量时写入 input_tokens / output_tokens
+            
+        Returns:
+            list: 与 segments 一一对应的译文
+            
+        Raises:
+            BatchMismatchError: 返回结果无法解析或段数不一致时
+        """
+        result = self.translate(pack_segments(segments), system_prompt + BATCH_PROMPT_NOTE, usage)
+        return unpack_segments(result, len(segments))
 
 class ChatGPTService(TranslationService):
     """ChatGPT 翻译服务"""
     
     def __init__(self, config):
         self.config = config
-        self.session = create_retry_session()
+        self.session = create_retry_session(pool_size=config.get('max_concurrency', 16))
+        # 默认发送普通请求；"stream": true 时使用 SSE 流式响应，可测量首 token 延迟。
+        # 流式请求默认附带 stream_options 以获取 token 用量，不支持的服务可设置 "stream_usage": false
+        self.stream = config.get('stream', False)
+        self.stream_usage = config.get('stream_usage', True)
         
-    def translate(self, content, system_prompt):
+    def translate(self, content, system_prompt, usage=None):
         headers = {
             "Authorization": f"Bearer {self.config['api_key']}",
             "Content-Type": "application/json"
         }
         
+        # 系统提示词和翻译指令在前且逐字节相同，服务端可缓存请求前缀；每块不同的原文在最后
         payload = {
             "model": self.config["model"],
             "messages": [
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"请将以下内容翻译成{self.config['language']}：\n\n{content}"}
+                {"role": "user", "content": build_user_prompt(content, self.config['language'])}
             ],
             "temperature": 0.3,
             "max_tokens": self.config["max_output_length"]
         }
+        if self.stream:
+            payload["stream"] = True
+            if self.stream_usage:
+                payload["stream_options"] = {"include_usage": True}
         
         try:
+            start = time.monotonic()
             response = self.session.post(
                 self.config["url"], 
                 headers=headers, 
                 json=payload,
-                timeout=(10, 120)
+                timeout=(10, 120),
+                stream=self.stream
             )
-            response.raise_for_status()
-            
-            result = response.json()
-            if not isinstance(result, dict):
-                raise RuntimeError("API 返回格式错误")
-                
-            if 'error' in result:
-                raise RuntimeError(f"API 错误：{result['error']}")
+            with response:
+                if response.status_code == 429:
+                    raise RateLimitError(
+                        "API 请求被限流（HTTP 429）",
+                        retry_after=parse_retry_after(response.headers.get("Retry-After"))
+                    )
+                response.raise_for_status()
                 
-            if 'choices' not in result or not result['choices']:
-                raise RuntimeError("API 返回结果格式错误：缺少 choices 字段")
-                
-            translated_text = result['choices'][0]['message']['content']
+                if self.stream and response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                    translated_text, finish_reason, result_usage = \
+                        self._read_stream(response, start, usage)
+                else:
+                    translated_text, finish_reason, result_usage = self._read_json(response)
+            
+            if finish_reason == 'length':
+                raise TruncatedError(f"译文达到 max_tokens（{self.config['max_output_length']}）被截断")
             if not translated_text or not isinstance(translated_text, str):
                 raise RuntimeError("API 返回的翻译结果无效")
+            
+            if usage is not None and isinstance(result_usage, dict):
+                usage['input_tokens'] = result_usage.get('prompt_tokens')
+                usage['output_tokens'] = result_usage.get('completion_tokens')
+                usage['cached_input_tokens'] = self._cached_tokens(result_usage)
                 
             return translated_text.strip()
             
+        except (RateLimitError, TruncatedError):
+            raise
         except Exception as e:
             raise RuntimeError(f"翻译请求失败：{str(e)}")
+    
+    @staticmethod
+    def _cached_tokens(result_usage):
+        """
+        获取命中前缀缓存的输入 token 数：OpenAI 为 prompt_tokens_details.cached_tokens，
+        DeepSeek 为 prompt_cache_hit_tokens，服务未返回时为 None
+        """
+        details = result_usage.get('prompt_tokens_details')
+        if isinstance(details, dict) and details.get('cached_tokens') is not None:
+            return details['cached_tokens']
+        return result_usage.get('prompt_cache_hit_tokens')
+    
+    @staticmethod
+    def _read_json(response):
+        """解析非流式响应，返回 (译文, finish_reason, usage)"""
+        result = response.json()
+        if not isinstance(result, dict):
+            raise RuntimeError("API 返回格式错误")
+            
+        if 'error' in result:
+            raise RuntimeError(f"API 错误：{result['error']}")
+            
+        if 'choices' not in result or not result['choices']:
+            raise RuntimeError("API 返回结果格式错误：缺少 choices 字段")
+        
+        choice = result['choices'][0]
+        return choice['message']['content'], choice.get('finish_reason'), result.get('usage')
+    
+    @staticmethod
+    def _read_stream(response, start, usage):
+        """
+        逐个读取 SSE 事件，返回 (译文, finish_reason, usage)
+        
+        收到第一段译文时在 usage 中记录首 token 延迟（first_token_latency，秒）；
+        finish_reason 为 length 时立即停止读取（放弃该连接）。正常结束时读完整个响应体，
+        连接才能放回连接池复用。
+        """
+        parts = []
+        finish_reason = None
+        result_usage = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                continue
+            event = json.loads(data)
+            if 'error' in event:
+                raise RuntimeError(f"API 错误：{event['error']}")
+            if event.get('usage'):
+                result_usage = event['usage']
+            for choice in event.get('choices') or []:
+                text = (choice.get('delta') or {}).get('content')
+                if text:
+                    if not parts and usage is not None:
+                        usage['first_token_latency'] = time.monotonic() - start
+                    parts.append(text)
+                if choice.get('finish_reason'):
+                    finish_reason = choice['finish_reason']
+            if finish_reason == 'length':
+                break
+        return ''.join(parts), finish_reason, result_usage
 
 class GeminiService(TranslationService):
-    """Google Gemini 翻译服务"""
+    """
+    Google Gemini 翻译服务
     
-    def __init__(self, config):
+    系统提示词通过 system_instruction 发送（每个系统提示词创建一个模型对象），请求内容只有
+    翻译指令和原文。配置 "cached_content": true 时为每个系统提示词创建缓存内容
+    （CachedContent，有效期 cache_ttl 秒），请求引用缓存而不再发送系统提示词；
+    创建失败（如提示词短于模型支持缓存的最小长度）时改用 system_instruction。
+    """
+    
+    # 使用 SDK 调用，配置中不需要 url
+    REQUIRES_URL = False
+    # 缓存内容的默认有效期（秒），到期前重新创建
+    DEFAULT_CACHE_TTL = 3600
+    
+    def __init__(self, config, model=None):
+        """
+        Args:
+            config: 服务配置
+            model: 可选的模型对象（需提供 generate_content），所有系统提示词共用，
+                   未提供时按配置为每个系统提示词创建
+        """
         self.config = config
-        genai.configure(api_key=config['api_key'])
-        self.model = genai.GenerativeModel(config['model'])
+        self.genai = None
+        if model is None:
+            # Gemini SDK 导入耗时较长，只在使用 Gemini 服务时导入
+            import google.generativeai as genai
+            genai.configure(api_key=config['api_key'])
+            self.genai = genai
+        self.model = model
+        self.models = {}  # 系统提示词 -> (模型对象, 过期时间)
+        self.lock = threading.Lock()
+        # "stream": true 时使用流式响应，可测量首 token 延迟
+        self.stream = config.get('stream', False)
+    
+    def _get_model(self, system_prompt, usage=None):
+        """获取使用指定系统提示词的模型对象，同一系统提示词只创建一次"""
+        if self.model is not None:
+            return self.model
+        with self.lock:
+            model, expires = self.models.get(system_prompt, (None, None))
+            if model is None or (expires is not None and time.monotonic() >= expires):
+                model, expires = self._create_model(system_prompt, usage)
+                self.models[system_prompt] = (model, expires)
+            return model
+    
+    def _create_model(self, system_prompt, usage=None):
+        """
+        创建模型对象
+        
+        Args:
+            system_prompt: 系统提示词
+            usage: 可选的用量字典，无法创建缓存内容时把警告追加到 warnings，
+                   由 translate_worker 输出到该次翻译的日志
+        
+        Returns:
+            tuple: (模型对象, 过期时间)，不使用缓存内容时过期时间为 None
+        """
+        genai = self.genai
+        if self.config.get('cached_content'):
+            ttl = self.config.get('cache_ttl', self.DEFAULT_CACHE_TTL)
+            name = self.config['model']
+            try:
+                cache = genai.caching.CachedContent.create(
+                    model=name if name.startswith('models/') else f"models/{name}",
+                    system_instruction=system_prompt,
+                    ttl=datetime.timedelta(seconds=ttl))
+                # 提前到期，避免请求引用已过期的缓存
+                return (genai.GenerativeModel.from_cached_content(cached_content=cache),
+                        time.monotonic() + ttl * 0.9)
+            except Exception as e:
+                if usage is not None:
+                    usage.setdefault('warnings', []).append(
+                        f"警告：无法创建 Gemini 缓存内容，改用 system_instruction：{str(e)}")
+        return genai.GenerativeModel(self.config['model'], system_instruction=system_prompt), None
         
-    def translate(self, content, system_prompt):
+    def translate(self, content, system_prompt, usage=None):
         try:
-            prompt = f"{system_prompt}\n\n请将以下内容翻译成{self.config['language']}：\n\n{content}"
+            model = self._get_model(system_prompt, usage)
+            prompt = build_user_prompt(content, self.config['language'])
             
-            response = self.model.generate_content(
+            start = time.monotonic()
+            response = model.generate_content(
                 prompt,
                 generation_config={
                     'temperature': 0.3,
                     'top_p': 1,
                     'top_k': 32,
                     'max_output_tokens': self.config['max_output_length']
-                }
+                },
+                stream=self.stream
             )
             
-            if not response.text:
+            parts = []
+            finish_reason = None
+            metadata = None
+            for chunk in (response if self.stream else [response]):
+                text = _gemini_text(chunk)
+                if text:
+                    if not parts and usage is not None and self.stream:
+                        usage['first_token_latency'] = time.monotonic() - start
+                    parts.append(text)
+                finish_reason = _gemini_finish_reason(chunk) or finish_reason
+                metadata = getattr(chunk, 'usage_metadata', None) or metadata
+                if finish_reason == 'MAX_TOKENS':
+                    raise TruncatedError(
+                        f"译文达到 max_output_tokens（{self.config['max_output_length']}）被截断")
+            
+            translated_text = ''.join(parts)
+            if not translated_text:
                 raise RuntimeError("未获取到翻译结果")
+            
+            if usage is not None and metadata is not None:
+                usage['input_tokens'] = getattr(metadata, 'prompt_token_count', None)
+                usage['output_tokens'] = getattr(metadata, 'candidates_token_count', None)
+                usage['cached_input_tokens'] = getattr(metadata, 'cached_content_token_count',
+                                                       None)
                 
-            return response.text.strip()
+            return translated_text.strip()
             
+        except TruncatedError:
+            raise
         except Exception as e:
+            # google.api_core 的限流异常（HTTP 429）
+            if type(e).__name__ in ('ResourceExhausted', 'TooManyRequests'):
+                raise RateLimitError(f"Gemini 请求被限流：{str(e)}")
             raise RuntimeError(f"Gemini 翻译失败：{str(e)}")
 
+def _gemini_text(response):
+    """获取 Gemini 响应（或流式响应的一段）的文本，没有文本时返回空字符串"""
+    try:
+        return response.text or ''
+    except ValueError:
+        # 候选结果没有文本部分（如因长度或安全原因结束）
+        return ''
+
+def _gemini_finish_reason(response):
+    """获取 Gemini 响应的结束原因名称（如 STOP、MAX_TOKENS），未结束时返回 None"""
+    candidates = getattr(response, 'candidates', None)
+    reason = candidates[0].finish_reason if candidates else getattr(response, 'finish_reason', None)
+    reason = getattr(reason, 'name', reason)
+    if reason in (None, 0, 'FINISH_REASON_UNSPECIFIED'):
+        return None
+    # SDK 的枚举值 2 为 MAX_TOKENS
+    return 'MAX_TOKENS' if reason == 2 else str(reason)
+
+class PooledTranslationService(TranslationService):
+    """
+    多服务池：按权重把请求分配给配置中的多个服务
+    
+    请求超过所选服务最近延迟的百分位仍未返回时向另一个服务发送对冲请求，
+    失败时转移到其他服务，错误率过高的服务暂停使用一段时间。
+    """
+    
+    # 成员服务各自使用自己的 url
+    REQUIRES_URL = False
+    
+    def __init__(self, config):
+        self.config = config
+        # 成员服务与单独使用时共享同一个服务实例和调度器（连接池、限速和并发上限）
+        members = [PoolMember(member['name'], member['weight'],
+                              (get_translation_service(member['config']),
+                               get_service_scheduler(member['config'])))
+                   for member in config['members']]
+        # 截断与所选服务无关（块过大），直接交给调用方拆分；每个翻译线程最多同时有
+        # 一个请求和一个对冲请求在进行
+        self.pool = BackendPool(members,
+                                hedge_percentile=config.get('hedge_percentile', 95),
+                                hedge_min=config.get('hedge_min_ms', 200) / 1000,
+                                max_error_rate=config.get('max_error_rate', 0.5),
+                                cooldown=config.get('cooldown', 30),
+                                fatal_errors=(TruncatedError,),
+                                max_workers=2 * config.get('max_concurrency', 16))
+    
+    def translate(self, content, system_prompt, usage=None):
+        tokens = estimate_tokens(content) * (1 + OUTPUT_EXPANSION_RATIO)
+        
+        usage = usage if usage is not None else {}
+        # 各成员服务的警告与服务池的警告记入同一个列表
+        warnings = usage.setdefault('warnings', [])
+        
+        def send(member):
+            service, scheduler = member.target
+            member_usage = {'warnings': warnings}
+            result = scheduler.call(
+                lambda: service.translate(content, system_prompt, member_usage), tokens)
+            return result, member_usage
+        
+        result, member_usage = self.pool.call(send, usage)
+        usage.update(member_usage)
+        return result
+
+def register_service(service_type, backend):
+    """
+    注册翻译服务类型
+    
+    除内置的 chatgpt / gemini 外，也可以在配置文件的 backends 中声明：
+        "backends": {"my-llm": "my_backend:MyLLMService"}
+    
+    Args:
+        service_type: 服务配置中 type 字段的值（不区分大小写）
+        backend: TranslationService 子类（以服务配置为参数创建实例），
+                 或 "模块:类名" 字符串（首次使用该类型时才导入模块）
+    """
+    with _service_backends_lock:
+        _service_backends[service_type.lower()] = backend
+
+def get_service_backend(service_type):
+    """
+    获取服务类型对应的翻译服务类，按需导入以字符串注册的模块
+    
+    Args:
+        service_type: 服务类型
+        
+    Returns:
+        type: 翻译服务类
+        
+    Raises:
+        ValueError: 服务类型未注册或无法导入时
+    """
+    key = (service_type or 'chatgpt').lower()
+    with _service_backends_lock:
+        backend = _service_backends.get(key)
+        if backend is None:
+            raise ValueError(f"未知的服务类型：{service_type}"
+                             f"（可用类型：{', '.join(sorted(_service_backends))}）")
+        if isinstance(backend, str):
+            module_name, _, class_name = backend.partition(':')
+            try:
+                backend = getattr(importlib.import_module(module_name), class_name)
+            except (ImportError, AttributeError, ValueError) as e:
+                raise ValueError(f"无法加载服务类型 {service_type} 的实现 {_service_backends[key]}："
+                                 f"{str(e)}")
+            _service_backends[key] = backend
+        return backend
+
 def create_translation_service(config):
     """
     创建翻译服务实例
@@ -469,15 +1586,40 @@ def create_translation_service(config):
         
     Returns:
         TranslationService: 翻译服务实例
+        
+    Raises:
+        ValueError: 服务类型未注册或无法导入时
+    """
+    backend = get_service_backend(config.get('type', 'chatgpt'))
+    return backend(config)
+
+register_service('chatgpt', ChatGPTService)
+register_service('gemini', GeminiService)
+register_service('pool', PooledTranslationService)
+
+def get_translation_service(config):
     """
-    service_type = config.get('type', 'chatgpt').lower()
+    获取共享的翻译服务实例，同一进程内每个服务只创建一次
+    
+    实例在线程间共享：ChatGPTService 复用同一个 Session 及其连接池，
+    GeminiService 只执行一次 genai.configure，每个系统提示词只创建一次模型（和缓存内容）。
     
-    if service_type == 'gemini':
-        return GeminiService(config)
-    else:
-        return ChatGPTService(config)
+    Args:
+        config: 服务配置
+        
+    Returns:
+        TranslationService: 翻译服务实例
+    """
+    key = service_key(config)
+    with _service_instances_lock:
+        service = _service_instances.get(key)
+        if service is None:
+            service = create_translation_service(config)
+            _service_instances[key] = service
+        return service
 
-def translate_worker(chunk_data, config, translation_queue):
+def translate_worker(chunk_data, config, translation_queue, translation_service=None,
+                     submitted_at=None, log=None):
     """
     翻译工作函数
     
@@ -485,6 +1627,9 @@ def translate_worker(chunk_data, config, translation_queue):
         chunk_data: (索引, 内容)元组
         config: 配置信息
         translation_queue: 翻译队列实例
+        translation_service: 可选的翻译服务实例，未提供时使用进程内共享的实例
+        submitted_at: 提交到线程池的时间（time.monotonic()），用于统计排队时间
+        log: 重试与错误信息的输出流，默认使用翻译队列的 log（未设置时为 sys.stderr）
         
     Returns:
         bool: 是否翻译成功
@@ -502,105 +1647,537 @@ def translate_worker(chunk_data, config, translation_queue):
     if not content or not isinstance(content, str):
         raise ValueError("无效的块内容")
         
+    log = log or translation_queue.log or sys.stderr
     retry_count = 0
     last_error = None
+    stats = ChunkStats(index, content, config, submitted_at, translation_queue.document)
     
-    # 检测内容类型（man手册还是help输出）
-    is_man_page = bool(".SH" in content or ".TH" in content)
+    def report_warnings():
+        # 服务在 usage 的 warnings 中记录的提示（如缓存内容创建失败、服务池暂停后端）
+        for message in stats.usage.pop('warnings', None) or []:
+            print(message, file=log)
     
-    system_prompt = """你是一位专业的技术文档翻译专家，特别擅长将英文命令行文档翻译成中文。请遵循以下规则：
+    def record_stats(ok, output=None):
+        report_warnings()
+        if translation_queue.metrics is not None:
+            stats.retries = retry_count
+            translation_queue.metrics.record(stats.finish(ok, output, estimate_tokens))
+    
+    # roff 内容只发送屏蔽格式标记后的正文，格式标记在本地还原
+    content_format = translation_queue.content_format
+    system_prompt, prompt_version = build_system_prompt(content_format, config)
+    masked = MaskedText(content) if content_format == 'roff' else None
+    if masked is not None and not masked.translatable:
+        # 只有格式标记、选项名称或示例代码，无需翻译
+        stats.cache = "local"
+        record_stats(True, content)
+        translation_queue.add_result(index, content)
+        return True
+
+    # 优先查询持久化翻译记忆，命中时无需调用翻译服务
+    memory = translation_queue.memory
+    memory_key = None
+    if memory is not None:
+        memory_key = TranslationMemory.make_key(content, config, prompt_version)
+        try:
+            remembered = memory.get(memory_key)
+        except Exception as e:
+            print(f"警告：查询翻译记忆失败：{str(e)}", file=log)
+            remembered = None
+        if remembered:
+            stats.cache = "memory"
+            record_stats(True, remembered)
+            translation_queue.add_result(index, remembered)
+            return True
+
+    # 获取共享的翻译服务实例
+    if translation_service is None:
+        translation_service = get_translation_service(config)
+    # 服务池的请求由所选成员的调度器限速和控制并发，不再经过服务池自身的调度器：
+    # 否则每个请求被限速两次，服务池的 AIMD 也会把对冲和故障转移的耗时当作服务的延迟
+    scheduler = get_service_scheduler(config) if config.get('type') != 'pool' else None
+    batcher = get_request_batcher(config)
+    computed = False  # 本线程是否执行了翻译（否则为与相同内容的块共享结果）
+
+    def scheduled_request(send, text):
+        # 经调度器限速和并发控制后发送请求，预计 token 数包含译文
+        tokens = estimate_tokens(text) * (1 + OUTPUT_EXPANSION_RATIO)
+        scheduled_at = time.monotonic()
+        
+        def request():
+            start = time.monotonic()
+            stats.schedule_wait += start - scheduled_at
+            stats.requests += 1
+            try:
+                return send()
+            finally:
+                stats.latency = time.monotonic() - start
+                stats.request_time += stats.latency
+        
+        if scheduler is None:
+            return request()
+        return scheduler.call(request, tokens)
+
+    def send_single(text, usage):
+        return scheduled_request(
+            lambda: translation_service.translate(text, system_prompt, usage), text)
 
-1. 保持专业术语的准确性，必要时保留英文原文，采用"中文（英文）"的格式
-2. 对于 man 手册：
-   - 严格保持所有 nroff/troff 格式标记
-   - 保持命令语法和参数格式不变
-3. 对于 help 输出：
-   - 保持选项格式（如 --help, -h）不变
-   - 保持示例命令和路径不变
-4. 命令行选项说明采用："选项名称 - 中文说明"的格式
-5. 确保翻译准确、专业、通俗易懂
-6. 保持所有空格、缩进和换行格式"""
+    def send_batch(texts, usage):
+        return scheduled_request(
+            lambda: translation_service.translate_batch(texts, system_prompt, usage),
+            "".join(texts))
 
-    # 添加内容类型提示
-    if not is_man_page:
-        system_prompt += "\n注意：这是命令的 help 输出，不是 man 手册，请保持命令行格式和示例的原样显示。"
+    def translate_text(text, text_masked):
+        if text_masked is not None:
+            if not text_masked.translatable:
+                return text
+            text = text_masked.text
+        if batcher is not None and batcher.accepts(text):
+            # 小块与其他线程的小块合并为一次请求，由最先加入批次的线程发送
+            result = batcher.submit(prompt_version, text,
+                                    send_batch, send_single, stats)
+        else:
+            result = send_single(text, stats.usage)
+        # 占位符不一致时抛出 ValueError，按普通失败重试
+        return text_masked.unmask(result) if text_masked is not None else result
+
+    def translate_resplit(text, text_masked):
+        try:
+            return translate_text(text, text_masked)
+        except TruncatedError as e:
+            # 译文被截断：拆分为更小的块依次翻译，不再重复发送完整大小的请求
+            pieces = translation_queue.split_chunk(text)
+            if len(pieces) < 2:
+                raise
+            print(f"块 {index + 1} {str(e)}，拆分为 {len(pieces)} 块重新翻译", file=log)
+            stats.resplits += 1
+            return translation_queue.separator.join(
+                translate_resplit(piece, MaskedText(piece) if text_masked is not None else None)
+                for piece in pieces)
 
-    # 创建翻译服务实例
-    translation_service = create_translation_service(config)
+    def scheduled_translate(text):
+        nonlocal computed
+        computed = True
+        return translate_resplit(text, masked)
 
     # 使用缓存机制翻译
+    rate_limit_count = 0
     while retry_count < translation_queue.max_retries:
         try:
-            translated_content = translation_queue.get_or_cache(
-                content,
-                lambda x: translation_service.translate(x, system_prompt)
-            )
+            translated_content = translation_queue.get_or_cache(content, scheduled_translate)
             if translated_content:
+                if memory_key is not None:
+                    try:
+                        memory.put(memory_key, translated_content)
+                    except Exception as e:
+                        print(f"警告：写入翻译记忆失败：{str(e)}", file=log)
+                if not computed:
+                    # 与进程内相同内容的块共享了同一次请求的结果
+                    stats.cache = "shared"
+                record_stats(True, translated_content)
                 translation_queue.add_result(index, translated_content)
                 return True
+        except RateLimitError as e:
+            # 调度器已降低并发并按 Retry-After 暂停，限流不计入失败重试次数
+            last_error = str(e)
+            rate_limit_count += 1
+            stats.rate_limited = rate_limit_count
+            if rate_limit_count > MAX_RATE_LIMIT_RETRIES:
+                retry_count = translation_queue.max_retries
+            continue
         except Exception as e:
             last_error = str(e)
+            report_warnings()
             print(f"块 {index + 1} 第 {retry_count + 1} 次尝试失败：{last_error}", 
-                  file=sys.stderr)
+                  file=log)
             retry_count += 1
             if retry_count < translation_queue.max_retries:
-                print(f"正在重试...", file=sys.stderr)
+                print(f"正在重试...", file=log)
                 time.sleep(min(retry_count * 2, 10))
             continue
     
-    print(f"块 {index + 1} 翻译失败，最后一次错误：{last_error}", file=sys.stderr)
+    print(f"块 {index + 1} 翻译失败，最后一次错误：{last_error}", file=log)
+    record_stats(False)
     translation_queue.add_failed_chunk(index)
     return False
 
-if __name__ == "__main__":
-    config = load_config()
+def translate_next_chunk(translation_queue, config, translation_service=None,
+                         submitted_at=None, writer=None, exempt_priority=None):
+    """
+    从翻译队列中取出优先级最高的块并翻译
+    
+    指定 writer 时只取输出窗口内的块，窗口内的块都已在翻译时等待窗口前进，
+    重排缓冲区最多保存 writer.max_pending 个块；优先级数字不大于 exempt_priority 的块
+    不受窗口限制（重排缓冲区另外最多保存这些块）。
+    
+    Args:
+        translation_queue: 翻译队列实例
+        config: 配置信息
+        translation_service: 可选的翻译服务实例
+        submitted_at: 提交到线程池的时间（time.monotonic()）
+        writer: 可选的 OrderedStreamWriter，限制取块的窗口
+        exempt_priority: 可选，不受窗口限制的最大优先级数字
+        
+    Returns:
+        bool: 是否翻译成功，因失败过多停止时返回 False
+    """
+    while True:
+        if translation_queue.should_stop():
+            return False
+        limit = writer.window_end() if writer is not None else None
+        chunk = translation_queue.get_chunk(limit, exempt_priority)
+        if chunk is not None:
+            break
+        lowest = translation_queue.lowest_index()
+        if lowest is None:
+            return True
+        # 窗口内的块（至少包括下一个要写出的块）都在翻译中，等待它们写出；
+        # 写出中止后不再缓冲译文，其余块不受窗口限制，照常完成并记入检查点
+        if not writer.wait_for_slot(lowest):
+            writer = None
+    return translate_worker(chunk, config, translation_queue, translation_service,
+                            submitted_at=submitted_at)
+
+def write_file_atomic(path, text):
+    """
+    先写入同目录下的临时文件再替换目标文件，读取方不会看到写了一半的内容
+    
+    Args:
+        path: 目标文件路径
+        text: 文件内容
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def backup_file(path):
+    """
+    在同目录下为已有文件创建隐藏的备份（优先使用硬链接，不复制内容），
+    原文件随后被原子替换时备份仍指向原有的内容
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        str: 备份路径，文件不存在时返回 None
+    """
+    if not os.path.exists(path):
+        return None
+    directory, filename = os.path.split(os.path.abspath(path))
+    backup_path = os.path.join(directory, f".{filename}.{os.getpid()}.orig")
+    if os.path.exists(backup_path):
+        os.remove(backup_path)
+    try:
+        os.link(path, backup_path)
+    except OSError:
+        shutil.copy2(path, backup_path)
+    return backup_path
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="从标准输入读取内容并翻译")
+    parser.add_argument("-o", "--output",
+                        help="将译文按块顺序流式写入文件（默认写到标准输出）")
+    parser.add_argument("--resume", action="store_true",
+                        help="从检查点恢复，只翻译上次未完成的块")
+    parser.add_argument("--no-incremental", action="store_true",
+                        help="忽略已有译文的记录，完整重新翻译（仅对 --output 有效）")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="将每个块的耗时、重试和 token 用量追加到 JSON Lines 文件")
+    parser.add_argument("--source", metavar="FILE",
+                        help="原文文件路径（如 man -w 的结果），记入译文清单用于检查译文是否过期"
+                             "（仅对 --output 有效）")
+    parser.add_argument("--install", action="store_true",
+                        help="把 --output 作为手册页安装：按配置压缩为 .gz、设置权限并更新 man 索引")
+    parser.add_argument("--plan", action="store_true",
+                        help="不发送请求，估算每个已配置服务的块数、token 用量、缓存命中率和耗时")
+    return parser.parse_args(argv)
+
+def translate_document(content, config, output=None, resume=False, incremental=True,
+                       metrics_path=None, memory=None, source=None, install=False,
+                       stdout=None, log=None):
+    """
+    翻译完整文档：分块后按章节优先级并行翻译，按块顺序输出译文
+    
+    在有界的输出窗口内，NAME、SYNOPSIS、DESCRIPTION、OPTIONS 等章节的块最先翻译。写入文件时译文先写到临时文件，
+    完成后原子替换目标文件；这些优先章节的块不受输出窗口限制（长手册页末尾的 OPTIONS 也最先翻译），
+    全部完成而其余章节仍在翻译时，先把其余章节保留原文的预览写到目标文件，man 可以立即查看。每个完成的块记入检查点；写入文件时同时保存原文段落
+    与译文，供下次增量翻译，并把译文记入译文清单。
+    
+    Args:
+        content: 原文
+        config: 服务配置
+        output: 译文文件路径，为 None 时写到 stdout
+        resume: 是否从检查点恢复已完成的块
+        incremental: 是否与已有译文的记录对比，只翻译修改过的段落（仅对 output 有效）
+        metrics_path: 运行指标的 JSON Lines 文件路径
+        memory: 可选的持久化翻译记忆
+        source: 原文文件路径，记入译文清单（仅对 output 有效）
+        install: 是否把 output 作为手册页安装（按配置压缩为 .gz，完成后更新 man 索引）
+        stdout: 未指定 output 时译文的输出流（默认 sys.stdout）
+        log: 进度与错误信息的输出流（默认 sys.stderr）
+        
+    Returns:
+        bool: 是否全部翻译成功，失败时不保留不完整的译文文件，写出过预览时恢复原有的译文
+    """
+    stdout = stdout or sys.stdout
+    log = log or sys.stderr
+    output_file = None
+    partial_path = None
+    preview_written = False
+    preview_backup = None
+    journal = None
+    metrics = None
+    manifest = None
+    installer = None
+    completed = False
 
     try:
-        man_content = sys.stdin.read()
-        if not man_content.strip():
-            print("未接收到内容！", file=sys.stderr)
-            sys.exit(1)
+        if not content.strip():
+            print("未接收到内容！", file=log)
+            return False
 
-        # 创建翻译队列
-        translation_queue = TranslationQueue(chunk_size=2000, max_retries=3)
+        # 安装手册页时按配置决定实际写入的文件（如 ls.1.gz）
+        if output:
+            manifest = create_translation_manifest(log)
+        if output and install:
+            installer = create_man_installer(manifest=manifest, log=log)
+            output = installer.path(output)
+        
+        # 创建翻译队列（附带持久化翻译记忆），块大小由服务的上下文和输出长度决定
+        translation_queue = TranslationQueue(chunk_size=chunk_token_budget(config),
+                                             max_retries=3,
+                                             memory=memory,
+                                             size_func=estimate_tokens,
+                                             log=log)
+        metrics = create_run_metrics(config, path=metrics_path)
+        translation_queue.metrics = metrics
+        translation_queue.document = output
+        
+        # 准备内容分块：已有译文时与记录的原文逐段对比，只翻译新增或修改的段落
+        units = translation_queue.split_units(content)
+        previous = []
+        if output and incremental:
+            previous = load_sidecar(output, config, translation_queue.content_format)
+        plan = plan_segments(units, previous, translation_queue.group_units)
+        content_chunks = [translation_queue.join_units(segment_units) for segment_units, _ in plan]
+        translation_queue.total_chunks = len(content_chunks)
+        prefilled = {i: translation for i, (_, translation) in enumerate(plan)
+                     if translation is not None}
+        if previous:
+            print(f"增量翻译：复用 {len(prefilled)}/{len(content_chunks)} 个未改变的块", 
+                  file=log)
+        
+        # 设置线程池：线程数为服务的最大并发数，实际并发由调度器按延迟和限流自适应调整
+        scheduler = get_service_scheduler(config)
+        max_workers = min(scheduler.max_concurrency, len(content_chunks))
+        print(f"使用 {max_workers} 个线程进行翻译"
+              f"（初始并发 {scheduler.limiter.current_limit}）...", file=log)
         
-        # 准备内容分块
-        content_chunks = translation_queue.prepare_content(man_content)
+        # 译文先写到临时文件，全部完成后再替换目标文件
+        if output:
+            partial_path = f"{output}.{os.getpid()}.part"
+            output_file = open(partial_path, "w", encoding="utf-8")
+        # 重排缓冲区限制为线程数的数倍，乱序完成的块不会无限堆积
+        writer = OrderedStreamWriter(output_file or stdout,
+                                     max_pending=max(max_workers * 4, 8),
+                                     separator=translation_queue.separator)
         
-        # 设置线程池
-        max_workers = min(4, len(content_chunks))  # 最多4个线程
-        print(f"使用 {max_workers} 个线程进行翻译...", file=sys.stderr)
+        # 检查点：每个完成的块立即记录，失败后可使用 --resume 只翻译缺失的块
+        journal = CheckpointJournal(
+            os.path.join(get_data_dir(), 'checkpoints'), content_chunks, config,
+            build_system_prompt(translation_queue.content_format, config)[1])
+        resumed = journal.load() if resume else {}
+        journal.open(resume=resume)
+        if resumed:
+            print(f"从检查点恢复 {len(resumed)}/{len(content_chunks)} 个已完成的块", 
+                  file=log)
+        prefilled.update(resumed)
+        translation_queue.completed_chunks = len(prefilled)
+        
+        # 按章节优先级入队：用户最常查看的章节先翻译，其余章节随后补全
+        priorities = translation_queue.section_priorities(content_chunks)
+        todo = [i for i in range(len(content_chunks)) if i not in prefilled]
+        for i in todo:
+            translation_queue.add_chunk(i, content_chunks[i], priorities[i])
+        
+        # 写入文件时保留各块译文，完成后与原文一起记录到译文旁，供下次增量翻译
+        translations = {} if output else None
+        
+        # 优先章节全部完成、其余章节尚未完成时写出预览
+        preview_pending = set()
+        if output and any(priorities[i] > PREVIEW_PRIORITY for i in todo):
+            preview_pending = {i for i in todo if priorities[i] <= PREVIEW_PRIORITY}
+        preview_lock = threading.Lock()
+        
+        def write_preview():
+            nonlocal preview_written, preview_backup
+            remaining = [i for i in todo if i not in translations]
+            if not remaining:
+                return
+            document = translation_queue.separator.join(
+                translations.get(i, content_chunks[i]) for i in range(len(content_chunks)))
+            try:
+                # 保留原有的译文，翻译失败时恢复（译文旁的记录和清单仍与其对应）
+                preview_backup = backup_file(output)
+                if installer is not None:
+                    installer.install(output, document + '\n', index=False)
+                else:
+                    write_file_atomic(output, document + '\n')
+            except OSError as e:
+                print(f"\n警告：写出预览失败：{str(e)}", file=log)
+                return
+            preview_written = True
+            print(f"\n已写出预览：优先章节已翻译，其余 {len(remaining)} 块完成后更新", file=log)
+        
+        def handle_result(index, result):
+            journal.record(index, result)
+            if translations is not None:
+                translations[index] = result
+            writer.put(index, result)
+            with preview_lock:
+                if index in preview_pending:
+                    preview_pending.discard(index)
+                    if not preview_pending:
+                        write_preview()
+        translation_queue.result_handler = handle_result
+        
+        def on_done(future):
+            # 任一块失败后无法按顺序输出完整译文，中止写出（其余块仍会完成并记入检查点）
+            if future.exception() is not None or not future.result():
+                writer.abort()
+        
+        for i, translation in sorted(prefilled.items()):
+            if translations is not None:
+                translations[i] = translation
+            writer.put(i, translation)
         
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有翻译任务
+            # 每个任务从队列中取出输出窗口内优先级最高的块
             futures = []
-            for i, chunk in enumerate(content_chunks):
-                translation_queue.add_chunk(i, chunk)
+            for _ in todo:
                 future = executor.submit(
-                    translate_worker, 
-                    (i, chunk), 
-                    config, 
-                    translation_queue
+                    translate_next_chunk,
+                    translation_queue,
+                    config,
+                    submitted_at=time.monotonic(),
+                    writer=writer,
+                    # 写入文件时预览所需的优先章节不等待输出窗口，译文本身也全部保存在 translations 中
+                    exempt_priority=PREVIEW_PRIORITY if output else None
                 )
+                future.add_done_callback(on_done)
                 futures.append(future)
             
-            # 等待所有任务完成
+            # 等待所有任务完成，单个块的错误不影响其余块完成并记入检查点
             for future in as_completed(futures):
-                future.result()
-            
-            # 检查失败的块
-            if translation_queue.failed_chunks:
-                print(f"\n警告：以下块翻译失败：{translation_queue.failed_chunks}", 
-                      file=sys.stderr)
-                sys.exit(1)
-            
-            # 按顺序合并结果
-            translated_content = "".join(translation_queue.get_ordered_results())
-            print(translated_content)
+                try:
+                    future.result()
+                except RuntimeError as e:
+                    print(f"\n{str(e)}", file=log)
+        
+        # 检查失败的块
+        if translation_queue.failed_chunks or writer.next_index != len(content_chunks):
+            print(f"\n警告：以下块翻译失败：{translation_queue.failed_chunks}", 
+                  file=log)
+            print("已完成的块已保存到检查点，可使用 --resume 重新翻译缺失的块", file=log)
+            return False
         
+        writer.finish()
+        if output_file is not None:
+            output_file.close()
+            if installer is not None:
+                with open(partial_path, "r", encoding="utf-8") as f:
+                    installer.install(output, f.read())
+                os.remove(partial_path)
+            else:
+                os.replace(partial_path, output)
+        if translations is not None:
+            save_sidecar(output, config, translation_queue.content_format,
+                         [(segment_units, translations[i])
+                          for i, (segment_units, _) in enumerate(plan)])
+            record_manifest(manifest, output, source, config, len(content_chunks), log)
+        journal.discard()
+        completed = True
+        return True
+        
+    except Exception as e:
+        print(f"处理过程出错：{str(e)}", file=log)
+        return False
+    finally:
+        write_run_metrics(metrics, log)
+        if journal is not None:
+            journal.close()
+        if output_file is not None:
+            output_file.close()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            # 翻译未完成时撤销预览：恢复原有的译文，原来没有译文时删除预览
+            if preview_written and not completed:
+                if preview_backup is not None:
+                    os.replace(preview_backup, output)
+                elif installer is not None:
+                    installer.discard(output)
+                else:
+                    os.remove(output)
+            if preview_backup is not None and os.path.exists(preview_backup):
+                os.remove(preview_backup)
+        if installer is not None:
+            installer.close()
+        if manifest is not None:
+            manifest.close()
+
+def plan_translation(content, output=None, incremental=True):
+    """
+    估算每个已配置服务翻译文档的用量和耗时并输出到标准输出
+    
+    Returns:
+        bool: 是否估算成功
+    """
+    # planner 依赖本模块，在需要时才导入
+    from planner import configured_services, format_plan, plan_document
+    
+    # 只读打开翻译记忆，估算时不写入任何文件
+    memory = create_translation_memory(readonly=True)
+    try:
+        for name, config in configured_services():
+            print(format_plan(plan_document(name, config, content, output=output,
+                                            incremental=incremental, memory=memory)))
+    except ValueError as e:
+        print(f"估算失败：{str(e)}", file=sys.stderr)
+        return False
+    finally:
+        if memory is not None:
+            memory.close()
+    return True
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.plan:
+        ok = plan_translation(sys.stdin.read(), output=args.output,
+                              incremental=not args.no_incremental)
+        sys.exit(0 if ok else 1)
+    config = load_config()
+
+    memory = create_translation_memory()
+    try:
+        ok = translate_document(sys.stdin.read(), config,
+                                output=args.output,
+                                resume=args.resume,
+                                incremental=not args.no_incremental,
+                                metrics_path=args.metrics,
+                                memory=memory,
+                                source=args.source,
+                                install=args.install)
     except KeyboardInterrupt:
         print("\n翻译被用户中断", file=sys.stderr)
         sys.exit(1)
-    except Exception as e:
-        print(f"处理过程出错：{str(e)}", file=sys.stderr)
-        sys.exit(1)
+    finally:
+        if memory is not None:
+            memory.close()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,340 @@
+"""
+ManZH 翻译守护进程
+
+在本地 Unix 套接字上常驻，保持翻译服务实例（HTTP 连接池、Gemini 模型）、
+调度器、进程内缓存和翻译记忆处于就绪状态。manzh_client.py 把每次翻译请求
+转发到这里，多个客户端同时翻译时共享同一个调度器的限速和并发上限。
+
+用法：
+    python3 translate_daemon.py start    # 在后台启动
+    python3 translate_daemon.py stop     # 停止
+    python3 translate_daemon.py status   # 查看状态
+    python3 translate_daemon.py run      # 在前台运行
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+import subprocess
+import socketserver
+
+from manzh_client import (
+    PROTOCOL_VERSION,
+    call,
+    data_dir,
+    default_socket_path,
+    read_messages,
+    send_message,
+)
+
+# 启动后等待守护进程就绪的最长时间（秒）
+START_TIMEOUT = 30
+# 管理命令（status / stop）的超时（秒）
+CONTROL_TIMEOUT = 5
+
+
+class ClientChannel:
+    """
+    向客户端发送消息的通道
+
+    客户端断开后不再发送，翻译继续完成（写入文件的翻译仍会保存，已完成的块记入检查点）。
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send(self, message):
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                send_message(self.stream, message)
+            except (OSError, ValueError):
+                self.closed = True
+
+    def writer(self, name):
+        """
+        获取可传给 print / OrderedStreamWriter 的输出流
+
+        Args:
+            name: "stdout" 或 "stderr"
+        """
+        return _ChannelStream(self, name)
+
+
+class _ChannelStream:
+    def __init__(self, channel, name):
+        self.channel = channel
+        self.name = name
+
+    def write(self, data):
+        if data:
+            self.channel.send({"stream": self.name, "data": data})
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class TranslationDaemon:
+    """翻译守护进程：在启动时预热翻译服务，为每个连接执行一次翻译请求"""
+
+    def __init__(self, socket_path):
+        """
+        Args:
+            socket_path: Unix 套接字路径
+        """
+        import translate
+
+        self.translate = translate
+        self.socket_path = socket_path
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.served = 0
+        self.failed = 0
+
+        # 预热：加载配置，创建共享的翻译服务（连接池 / 模型）、调度器和翻译记忆
+        self.config = translate.load_config()
+        translate.get_translation_service(self.config)
+        translate.get_service_scheduler(self.config)
+        self.memory = translate.create_translation_memory()
+        self.server = None
+
+    def status(self):
+        """
+        Returns:
+            dict: 守护进程状态
+        """
+        config = self.config
+        scheduler = self.translate.get_service_scheduler(config)
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "uptime": round(time.time() - self.started, 1),
+                "service": config.get('service') or config.get('type', 'chatgpt'),
+                "model": config.get('model', ''),
+                "active": self.active,
+                "served": self.served,
+                "failed": self.failed,
+                "concurrency": scheduler.limiter.current_limit,
+                "max_concurrency": scheduler.max_concurrency,
+            }
+
+    def handle(self, stream):
+        """
+        处理一个连接
+
+        Args:
+            stream: 连接的文本读写流
+        """
+        channel = ClientChannel(stream)
+        try:
+            message = next(read_messages(stream), None)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            channel.send({"error": "无效的请求", "exit": 1})
+            return
+        if message.get("version") != PROTOCOL_VERSION:
+            channel.send({"error": f"协议版本不一致（守护进程为 {PROTOCOL_VERSION}），"
+                                   "请重启守护进程", "exit": 1})
+            return
+
+        action = message.get("action")
+        # 请求中的任何错误都只结束本次请求：ConfigCache 在配置文件缺失或损坏时调用 sys.exit，
+        # 不能让 SystemExit 结束处理线程而使客户端收不到退出码
+        try:
+            if action == "ping":
+                channel.send(dict(self.status(), exit=0))
+            elif action == "shutdown":
+                channel.send({"exit": 0})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            elif action == "translate":
+                channel.send({"exit": self._translate(message, channel)})
+            else:
+                channel.send({"error": f"未知的请求：{action}", "exit": 1})
+        except SystemExit as e:
+            channel.send({"error": "无效的参数或配置，详见守护进程日志",
+                          "exit": e.code if isinstance(e.code, int) and e.code else 1})
+        except Exception as e:
+            print(f"处理请求时出错：{str(e)}", file=sys.stderr)
+            channel.send({"error": f"处理请求时出错：{str(e)}", "exit": 1})
+
+    def _translate(self, message, channel):
+        """执行翻译请求，返回退出码"""
+        log = channel.writer("stderr")
+        try:
+            args = self.translate.parse_args(message.get("argv", []))
+            # 配置修改后无需重启守护进程：ConfigCache 过期后重新加载
+            config = self.translate.load_config()
+        except SystemExit:
+            print("无效的参数或配置，详见守护进程日志", file=log)
+            return 2
+
+        cwd = message.get("cwd") or os.getcwd()
+        output = os.path.join(cwd, args.output) if args.output else None
+        metrics_path = os.path.join(cwd, args.metrics) if args.metrics else None
+        source = os.path.join(cwd, args.source) if args.source else None
+
+        with self.lock:
+            self.active += 1
+        ok = False
+        try:
+            ok = self.translate.translate_document(
+                message.get("content", ""), config,
+                output=output,
+                resume=args.resume,
+                incremental=not args.no_incremental,
+                metrics_path=metrics_path,
+                memory=self.memory,
+                source=source,
+                install=args.install,
+                stdout=channel.writer("stdout"),
+                log=log,
+            )
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.served += 1
+                if not ok:
+                    self.failed += 1
+        return 0 if ok else 1
+
+    def serve(self):
+        """在前台监听套接字直至收到 shutdown 请求或 SIGTERM"""
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with self.connection.makefile("rw", encoding="utf-8") as stream:
+                    daemon.handle(stream)
+
+        # 套接字只允许当前用户访问
+        old_umask = os.umask(0o077)
+        try:
+            # 退出时 server_close 会等待正在处理的连接（进行中的翻译）完成
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        finally:
+            os.umask(old_umask)
+
+        def stop(signum, frame):
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        signal.signal(signal.SIGTERM, stop)
+
+        print(f"翻译守护进程已就绪（PID {os.getpid()}）：{self.socket_path}", file=sys.stderr)
+        try:
+            self.server.serve_forever()
+        finally:
+            # 先删除套接字文件，新的客户端改为在本进程外翻译
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self.server.server_close()
+            if self.memory is not None:
+                self.memory.close()
+
+
+def ping(socket_path):
+    """
+    查询守护进程状态
+
+    Returns:
+        dict: 状态，守护进程未运行时返回 None
+    """
+    try:
+        responses = call({"action": "ping"}, socket_path, timeout=CONTROL_TIMEOUT)
+    except (OSError, ValueError):
+        return None
+    return responses[0] if responses else None
+
+
+def run(socket_path):
+    """在前台运行守护进程"""
+    if ping(socket_path):
+        print("翻译守护进程已在运行", file=sys.stderr)
+        return 1
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+    if os.path.exists(socket_path):
+        # 上次未正常退出留下的套接字文件
+        os.remove(socket_path)
+    TranslationDaemon(socket_path).serve()
+    return 0
+
+
+def start(socket_path):
+    """在后台启动守护进程并等待其就绪"""
+    info = ping(socket_path)
+    if info:
+        print(f"翻译守护进程已在运行（PID {info['pid']}）")
+        return 0
+
+    log_path = os.path.join(data_dir(), "daemon.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "a", encoding="utf-8") as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--socket", socket_path, "run"],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True,
+        )
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        info = ping(socket_path)
+        if info:
+            print(f"翻译守护进程已启动（PID {info['pid']}，服务 {info['service']}）")
+            return 0
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    print(f"翻译守护进程启动失败，详见日志：{log_path}", file=sys.stderr)
+    return 1
+
+
+def stop(socket_path):
+    """请求守护进程退出"""
+    try:
+        responses = call({"action": "shutdown"}, socket_path, timeout=CONTROL_TIMEOUT)
+    except (OSError, ValueError):
+        responses = None
+    if responses is None:
+        print("翻译守护进程未运行")
+        return 0
+
+    # 等待守护进程停止接受新请求（进行中的翻译完成后进程退出）
+    while os.path.exists(socket_path):
+        time.sleep(0.1)
+    print("翻译守护进程已停止")
+    return 0
+
+
+def status(socket_path):
+    """显示守护进程状态"""
+    info = ping(socket_path)
+    if not info:
+        print("翻译守护进程未运行")
+        return 1
+    print(f"翻译守护进程运行中（PID {info['pid']}，已运行 {info['uptime']:.0f} 秒）")
+    print(f"  服务：{info['service']}（{info['model']}）")
+    print(f"  当前并发：{info['concurrency']}/{info['max_concurrency']}")
+    print(f"  正在翻译：{info['active']}，已完成：{info['served']}（失败 {info['failed']}）")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ManZH 翻译守护进程")
+    parser.add_argument("action", choices=("start", "stop", "status", "run"),
+                        help="start 后台启动，stop 停止，status 查看状态，run 前台运行")
+    parser.add_argument("--socket", default=None,
+                        help="Unix 套接字路径（默认为数据目录下的 manzh.sock）")
+    args = parser.parse_args()
+
+    socket_path = args.socket or default_socket_path()
+    actions = {"start": start, "stop": stop, "status": status, "run": run}
+    sys.exit(actions[args.action](socket_path))
+
+
+if __name__ == "__main__":
+    main()
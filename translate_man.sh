@@ -45,17 +45,36 @@ mkdir -p "$TRANSLATED_DIR"
 LOG_FILE="./translate_error.log"
 > "$LOG_FILE" # 清空日志文件
 
-# 检查是否已有翻译
+# 检查是否已有与当前原文一致的翻译（按译文清单比较原文，原文已更新时视为没有翻译）
 function check_translated() {
     local command=$1
     local section=$2
-    local man_path="$TRANSLATED_DIR/man${section}/${command}.${section}"
-    if [[ -f "$man_path" ]]; then
-        return 0
-    fi
+    local man_path
+    for man_path in "$TRANSLATED_DIR/man${section}/${command}.${section}"{.gz,}; do
+        if [[ -f "$man_path" ]] && python3 manifest.py check "$man_path"; then
+            return 0
+        fi
+    done
     return 1
 }
 
+# 获取手册页的 roff 源文件内容（格式标记保留在本地，只翻译正文）
+function get_man_source() {
+    local command=$1
+    local source_file
+    
+    source_file=$(man -w "$command" 2>/dev/null | head -n 1)
+    if [[ -z "$source_file" || ! -r "$source_file" ]]; then
+        return 1
+    fi
+    
+    # .so 重定向到其他手册页时交给 man 渲染
+    if gzip -dcf "$source_file" | head -n 5 | grep -q '^\.so '; then
+        return 1
+    fi
+    gzip -dcf "$source_file"
+}
+
 # 检查并格式化内容
 function preprocess_content() {
     local content="$1"
@@ -69,8 +88,8 @@ function translate_content() {
     local content="$1"
     local translated_content
     
-    # 使用管道调用 Python 翻译程序，并捕获返回值
-    translated_content=$(echo "$content" | python3 translate.py)
+    # 使用管道调用 Python 翻译程序（翻译守护进程运行时由其翻译），并捕获返回值
+    translated_content=$(echo "$content" | python3 manzh_client.py --resume)
     local exit_code=$?
     
     # 检查翻译是否成功
@@ -83,29 +102,35 @@ function translate_content() {
     return 0
 }
 
-# 保存翻译后的手册
-function save_translated() {
-    local content="$1"
-    local command="$2"
-    local section="${3:-1}"  # 默认保存到 man1
+# 翻译并保存手册：NAME/SYNOPSIS/DESCRIPTION/OPTIONS 等章节最先翻译，完成后先写出其余章节为原文的预览，
+# man 可以立即查看；全部完成后原子替换为完整译文（按配置压缩为 .gz）并更新 man 索引
+function translate_and_save() {
+    local command="$1"
+    local section="${2:-1}"  # 默认保存到 man1
+    local source_file="$3"   # 原文文件，记入译文清单用于检查译文是否过期
     local man_path="/usr/local/share/man/zh_CN/man${section}"
-    
-    # 检查内容是否为空
-    if [[ -z "$content" ]]; then
-        echo "错误：翻译内容为空，不保存结果" >&2
-        return 1
-    fi
+    local man_file="$man_path/${command}.${section}"
+    local source_args=()
     
     # 创建目录
     mkdir -p "$man_path"
+    if [[ -n "$source_file" ]]; then
+        source_args=(--source "$source_file")
+    fi
     
-    # 保存翻译结果
-    echo "$content" > "$man_path/${command}.${section}"
-    
-    # 设置正确的权限
-    chmod 644 "$man_path/${command}.${section}"
+    # 从标准输入读取原文，翻译失败时 translate.py 会删除不完整的文件
+    # 使用 --resume：上次失败时已完成的块直接从检查点恢复
+    # 使用 --install：译文由 man_install.py 压缩、设置权限后原子写入，并更新 man 索引
+    # manzh_client.py 在翻译守护进程运行时交给其翻译，否则直接执行 translate.py
+    if ! python3 manzh_client.py --resume --install --output "$man_file" "${source_args[@]}"; then
+        echo "翻译失败，不保存结果" >&2
+        return 1
+    fi
     
-    echo "翻译后的手册已保存到：$man_path/${command}.${section}"
+    if [[ -f "$man_file.gz" ]]; then
+        man_file="$man_file.gz"
+    fi
+    echo "翻译后的手册已保存到：$man_file"
     return 0
 }
 
@@ -184,11 +209,11 @@ function check_command() {
     return 0
 }
 
-# 保存翻译后的帮助文档
+# 保存翻译后的帮助文档：由 man_install.py 转换为 man 格式，压缩后原子写入 man1 并更新 man 索引
 function save_help_translated() {
     local content="$1"
     local command="$2"
-    local man_path="/usr/local/share/man/zh_CN/man1"  # 帮助文档默认放在 man1 目录
+    local source_args=()
     
     # 检查内容是否为空
     if [[ -z "$content" ]]; then
@@ -196,25 +221,13 @@ function save_help_translated() {
         return 1
     fi
     
-    # 创建目录
-    mkdir -p "$man_path"
-    
-    # 将 help 输出转换为 man 格式
-    cat > "$man_path/${command}.1" << EOF
-.TH ${command} 1 "$(date +"%B %Y")" "Help Output" "User Commands"
-.SH 名称
-${command} \- $(echo "$content" | head -n 1)
-.SH 描述
-${content}
-.SH 注意
-本手册页由 ManZH 根据 '${command} --help' 输出自动生成。
-EOF
-    
-    # 设置正确的权限
-    chmod 644 "$man_path/${command}.1"
+    # 以命令的可执行文件作为原文记入译文清单，命令升级后显示为过期
+    local binary=$(command -v "$command")
+    if [[ -f "$binary" ]]; then
+        source_args=(--source "$binary")
+    fi
     
-    echo "翻译后的帮助文档已保存到：$man_path/${command}.1"
-    return 0
+    echo "$content" | python3 man_install.py help "$command" --dir "$TRANSLATED_DIR" "${source_args[@]}"
 }
 
 # 修改主处理函数
@@ -223,6 +236,7 @@ function process_command() {
     local output=""
     local help_output=""
     local translated_content=""
+    local source_file=""
     
     # 1. 检查命令是否存在
     if ! command -v "$cmd" &> /dev/null; then
@@ -230,14 +244,16 @@ function process_command() {
         return 1
     fi
     
-    # 2. 尝试获取 man 手册
-    output=$(man "$cmd" 2>/dev/null)
-    if [[ $? -eq 0 && -n "$output" ]]; then
+    # 2. 尝试获取 man 手册：优先使用 roff 源文件，否则使用格式化后的文本
+    source_file=$(man -w "$cmd" 2>/dev/null | head -n 1)
+    output=$(get_man_source "$cmd")
+    if [[ $? -ne 0 || -z "$output" ]]; then
+        output=$(man "$cmd" 2>/dev/null | col -b)
+    fi
+    if [[ -n "$output" ]]; then
         echo "正在翻译 man 手册..."
-        translated_content=$(echo "$output" | col -b | translate_content)
-        if [[ $? -eq 0 && -n "$translated_content" ]]; then
-            save_translated "$translated_content" "$cmd" "1"
-            return $?
+        if echo "$output" | translate_and_save "$cmd" "1" "$source_file"; then
+            return 0
         else
             echo "翻译失败，请检查日志并重试"
             return 1
@@ -0,0 +1,207 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import quote
+
+
+def content_digest(content):
+    """
+    计算内容的稳定摘要（跨进程、跨运行保持一致）
+
+    Args:
+        content: 文本内容
+
+    Returns:
+        str: SHA-256 十六进制摘要
+    """
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """
+    持久化翻译记忆（SQLite）
+
+    以 内容摘要 + 服务类型 + 模型 + 目标语言 + 提示词版本 作为键保存翻译结果，
+    在多次运行、多个命令之间共享。总大小超过上限时按最近最少使用淘汰。
+    """
+
+    # 每写入多少条记录检查一次总大小
+    EVICT_CHECK_INTERVAL = 50
+
+    def __init__(self, db_path, max_size_mb=256, readonly=False):
+        """
+        Args:
+            db_path: SQLite 数据库文件路径
+            max_size_mb: 翻译记忆的最大容量（MB）
+            readonly: 以只读方式打开已有的数据库（如容量估算），不创建文件，
+                      查询时不更新最近使用时间，写入被忽略
+
+        Raises:
+            ValueError: 当容量设置无效时
+            sqlite3.Error: 只读打开时数据库不存在或无法读取
+        """
+        if max_size_mb <= 0:
+            raise ValueError("max_size_mb 必须大于 0")
+
+        self.db_path = db_path
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.readonly = readonly
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+        if readonly:
+            # 没有未合并的 WAL 时全部内容都在数据库文件中，以 immutable 打开，
+            # 不会在目录中创建 -wal / -shm 文件
+            uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+            if not os.path.exists(db_path + "-wal"):
+                uri += "&immutable=1"
+            self._conn = sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=False)
+            self._conn.execute("SELECT 1 FROM memory LIMIT 1")
+            return
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self.lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS memory (
+                    digest TEXT NOT NULL,
+                    service_type TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (digest, service_type, model, language, prompt_version)
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_memory_last_used ON memory (last_used)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(content, config, prompt_version):
+        """
+        生成翻译记忆键
+
+        Args:
+            content: 原文内容
+            config: 服务配置（使用 type、model、language）
+            prompt_version: 系统提示词版本
+
+        Returns:
+            tuple: 翻译记忆键
+        """
+        return (
+            content_digest(content),
+            config.get('type', 'chatgpt').lower(),
+            config.get('model', ''),
+            config.get('language', ''),
+            str(prompt_version),
+        )
+
+    def get(self, key):
+        """
+        查询翻译记忆
+
+        Args:
+            key: make_key 生成的键
+
+        Returns:
+            str: 翻译结果，未命中时返回 None
+        """
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT translation FROM memory WHERE digest=? AND service_type=? "
+                "AND model=? AND language=? AND prompt_version=?",
+                key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.readonly:
+                return row[0]
+            self._conn.execute(
+                "UPDATE memory SET last_used=? WHERE digest=? AND service_type=? "
+                "AND model=? AND language=? AND prompt_version=?",
+                (time.time(),) + key
+            )
+            self._conn.commit()
+            return row[0]
+
+    def contains(self, key):
+        """
+        查询翻译记忆中是否有该键（不计入命中统计，也不更新最近使用时间）
+
+        Args:
+            key: make_key 生成的键
+
+        Returns:
+            bool: 是否存在
+        """
+        with self.lock:
+            return self._conn.execute(
+                "SELECT 1 FROM memory WHERE digest=? AND service_type=? "
+                "AND model=? AND language=? AND prompt_version=?",
+                key
+            ).fetchone() is not None
+
+    def put(self, key, translation):
+        """
+        写入翻译记忆（只读打开时忽略）
+
+        Args:
+            key: make_key 生成的键
+            translation: 翻译结果
+        """
+        if not translation or self.readonly:
+            return
+        now = time.time()
+        size = len(translation.encode('utf-8'))
+        with self.lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO memory (digest, service_type, model, language, "
+                "prompt_version, translation, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (translation, size, now, now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            # 第一次写入时及此后每 EVICT_CHECK_INTERVAL 次写入检查一次
+            if (self._writes - 1) % self.EVICT_CHECK_INTERVAL == 0:
+                self._evict()
+
+    def _evict(self):
+        """在持有锁的情况下按最近最少使用淘汰，直到总大小降到上限的 90%"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM memory").fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        target = int(self.max_size * 0.9)
+        rows = self._conn.execute(
+            "SELECT rowid, size FROM memory ORDER BY last_used ASC"
+        ).fetchall()
+        expired = []
+        for rowid, size in rows:
+            if total <= target:
+                break
+            expired.append((rowid,))
+            total -= size
+        self._conn.executemany("DELETE FROM memory WHERE rowid=?", expired)
+        self._conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self._conn.close()
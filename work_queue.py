@@ -0,0 +1,682 @@
+"""
+ManZH 持久化工作队列
+
+把大批手册页拆分为内容块写入共享的 SQLite 数据库，多个 worker 进程（同一台机器或挂载了
+同一共享目录的多台机器，可使用不同的 API 密钥或服务）领取内容块翻译。领取的块带有租约，
+worker 在翻译期间定期续约；worker 崩溃或失联后租约过期，块自动回到队列由其他 worker 领取。
+手册页的全部块完成后由 collect 写出译文。
+
+用法：
+    python3 work_queue.py enqueue --section 1            # 把第 1 章节的手册页加入队列
+    python3 work_queue.py work --service key2 -j 16      # 启动一个 worker（可在多台机器上运行）
+    python3 work_queue.py status                         # 查看队列进度
+    python3 work_queue.py collect                        # 写出已完成的手册页
+    python3 work_queue.py retry                          # 把失败的块放回队列
+
+多台机器共享队列时，数据库所在的文件系统必须支持 POSIX 文件锁（如启用了锁的 NFSv4），
+各机器的时钟应保持同步（租约按墙钟时间计算）。
+"""
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from translate import (
+    load_config,
+    chunk_token_budget,
+    estimate_tokens,
+    create_translation_memory,
+    create_translation_manifest,
+    create_man_installer,
+    record_manifest,
+    create_run_metrics,
+    write_run_metrics,
+    get_data_dir,
+    get_translation_service,
+    get_service_scheduler,
+    translate_worker,
+    SingleFlightCache,
+    TranslationQueue,
+)
+from prompts import DEFAULT_PROMPT_STYLE
+from incremental import load_sidecar, save_sidecar, plan_segments
+from batch_translate import (
+    TRANSLATED_DIR,
+    page_output_path,
+    pages_from_commands,
+    pages_from_directory,
+    pages_from_section,
+)
+
+QUEUE_NAME = "work_queue.db"
+# 默认租约时长（秒）：worker 每隔租约的三分之一续约一次
+DEFAULT_LEASE = 120
+# 每个块最多被领取的次数（包括 worker 崩溃导致租约过期），超过后标记为失败
+DEFAULT_MAX_ATTEMPTS = 3
+# 没有可领取的块时再次查询的间隔（秒）
+POLL_INTERVAL = 2.0
+
+# 块状态
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkQueue:
+    """
+    基于 SQLite 的内容块工作队列
+
+    领取操作在 BEGIN IMMEDIATE 事务中完成，多个进程不会领取到同一个块。数据库使用默认的
+    回滚日志而不是 WAL（WAL 依赖共享内存，不能跨机器访问）。
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        # isolation_level=None：手动控制事务，领取时使用 BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self.lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    output_path TEXT NOT NULL UNIQUE,
+                    source_path TEXT,
+                    content_format TEXT NOT NULL,
+                    separator TEXT NOT NULL,
+                    chunks INTEGER NOT NULL,
+                    created REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    job_id INTEGER NOT NULL REFERENCES jobs (id),
+                    idx INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    units TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    owner TEXT,
+                    lease_expires REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    service TEXT,
+                    model TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_chunks_status ON chunks (status, lease_expires);
+                CREATE INDEX IF NOT EXISTS idx_chunks_job ON chunks (job_id, status);
+            """)
+
+    def _transaction(self, func):
+        """在持有锁的情况下以 BEGIN IMMEDIATE 事务执行 func(conn)"""
+        with self.lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def meta(self):
+        """
+        Returns:
+            dict: 队列的服务字段（service、type、model、language、prompt_style），空队列返回空字典
+        """
+        with self.lock:
+            rows = self._conn.execute("SELECT key, value FROM meta").fetchall()
+        return {row["key"]: row["value"] for row in rows}
+
+    def add_job(self, config, output_path, source_path, content_format, separator, plan):
+        """
+        加入一个手册页
+
+        Args:
+            config: 分块使用的服务配置，第一次加入时记为队列的服务字段
+            output_path: 译文文件路径
+            source_path: 原文文件路径
+            content_format: 内容格式（'text' 或 'roff'）
+            separator: 合并译文时块之间的分隔符
+            plan: [(翻译单元列表, 内容块, 已有译文或 None)]
+
+        Returns:
+            bool: 是否加入，同一译文已在队列中且未写出时返回 False
+
+        Raises:
+            ValueError: 当配置的目标语言与队列不一致时
+        """
+        fields = {
+            "service": config.get('service') or config.get('type', 'chatgpt'),
+            "type": config.get('type', 'chatgpt').lower(),
+            "model": config.get('model', ''),
+            "language": config.get('language', ''),
+            "prompt_style": config.get('prompt_style', DEFAULT_PROMPT_STYLE),
+        }
+        output_path = os.path.abspath(output_path)
+
+        def add(conn):
+            meta = {row["key"]: row["value"]
+                    for row in conn.execute("SELECT key, value FROM meta")}
+            if not meta:
+                conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", fields.items())
+            elif meta["language"] != fields["language"]:
+                raise ValueError(f"目标语言与队列不一致（队列为 {meta['language']}）")
+
+            if conn.execute("SELECT 1 FROM jobs WHERE output_path=?",
+                            (output_path,)).fetchone():
+                return False
+            job_id = conn.execute(
+                "INSERT INTO jobs (output_path, source_path, content_format, separator, "
+                "chunks, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (output_path, source_path, content_format, separator, len(plan), time.time())
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO chunks (job_id, idx, content, units, status, result) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, i, content, json.dumps(units, ensure_ascii=False),
+                  PENDING if translation is None else DONE, translation)
+                 for i, (units, content, translation) in enumerate(plan)]
+            )
+            return True
+
+        return self._transaction(add)
+
+    def claim(self, owner, limit, lease, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        领取待翻译的块：未领取的块，以及租约已过期（worker 崩溃或失联）的块
+
+        租约过期的块已达到领取次数上限时标记为失败，不再领取。
+
+        Args:
+            owner: worker 标识
+            limit: 最多领取的块数
+            lease: 租约时长（秒）
+            max_attempts: 每个块最多被领取的次数
+
+        Returns:
+            list: [(块 ID, 内容, 内容格式)]
+        """
+        def claim(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE chunks SET status=?, owner=NULL, error=? "
+                "WHERE status=? AND lease_expires<? AND attempts>=?",
+                (FAILED, "租约过期次数过多", LEASED, now, max_attempts))
+            rows = conn.execute(
+                "SELECT chunks.id, chunks.content, jobs.content_format FROM chunks "
+                "JOIN jobs ON jobs.id = chunks.job_id "
+                "WHERE chunks.status=? OR (chunks.status=? AND chunks.lease_expires<?) "
+                "ORDER BY chunks.id LIMIT ?",
+                (PENDING, LEASED, now, limit)).fetchall()
+            conn.executemany(
+                "UPDATE chunks SET status=?, owner=?, lease_expires=?, attempts=attempts+1 "
+                "WHERE id=?",
+                [(LEASED, owner, now + lease, row["id"]) for row in rows])
+            return [(row["id"], row["content"], row["content_format"]) for row in rows]
+
+        return self._transaction(claim)
+
+    def renew(self, owner, chunk_ids, lease):
+        """
+        为仍在翻译的块续约
+
+        Returns:
+            int: 续约成功的块数（租约已被其他 worker 接管的块不计入）
+        """
+        if not chunk_ids:
+            return 0
+
+        def renew(conn):
+            expires = time.time() + lease
+            return sum(conn.execute(
+                "UPDATE chunks SET lease_expires=? WHERE id=? AND owner=? AND status=?",
+                (expires, chunk_id, owner, LEASED)).rowcount for chunk_id in chunk_ids)
+
+        return self._transaction(renew)
+
+    def complete(self, chunk_id, result, config):
+        """
+        记录块的译文
+
+        租约过期后才返回的译文同样采用（翻译结果与由哪个 worker 完成无关），
+        已由其他 worker 完成的块保留先完成的译文。
+
+        Args:
+            chunk_id: 块 ID
+            result: 译文
+            config: 完成翻译的 worker 的服务配置
+        """
+        service = config.get('service') or config.get('type', 'chatgpt')
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE chunks SET status=?, result=?, owner=NULL, error=NULL, service=?, model=? "
+            "WHERE id=? AND status!=?",
+            (DONE, result, service, config.get('model', ''), chunk_id, DONE)))
+
+    def fail(self, chunk_id, owner, error, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        记录块翻译失败：未达到领取次数上限时放回队列，否则标记为失败
+
+        Args:
+            chunk_id: 块 ID
+            owner: worker 标识
+            error: 错误信息
+            max_attempts: 每个块最多被领取的次数
+        """
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE chunks SET status=CASE WHEN attempts>=? THEN ? ELSE ? END, "
+            "owner=NULL, lease_expires=0, error=? WHERE id=? AND owner=? AND status=?",
+            (max_attempts, FAILED, PENDING, error, chunk_id, owner, LEASED)))
+
+    def release(self, owner):
+        """
+        把 worker 领取的块全部放回队列（worker 正常退出或被中断时调用，不计入领取次数）
+
+        Returns:
+            int: 放回的块数
+        """
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE chunks SET status=?, owner=NULL, lease_expires=0, attempts=attempts-1 "
+            "WHERE owner=? AND status=?",
+            (PENDING, owner, LEASED)).rowcount)
+
+    def retry_failed(self):
+        """
+        把失败的块放回队列并重新计算领取次数
+
+        Returns:
+            int: 放回的块数
+        """
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE chunks SET status=?, attempts=0, lease_expires=0 WHERE status=?",
+            (PENDING, FAILED)).rowcount)
+
+    def unfinished(self):
+        """
+        Returns:
+            int: 尚未完成也未失败的块数（包括其他 worker 正在翻译的块）
+        """
+        with self.lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks WHERE status IN (?, ?)",
+                                      (PENDING, LEASED)).fetchone()[0]
+
+    def completed_jobs(self):
+        """
+        Returns:
+            list: 全部块都已完成的手册页记录
+        """
+        with self.lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE NOT EXISTS (SELECT 1 FROM chunks "
+                "WHERE chunks.job_id = jobs.id AND chunks.status != ?) ORDER BY id",
+                (DONE,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def job_chunks(self, job_id):
+        """
+        Returns:
+            list: 手册页按顺序排列的 (翻译单元列表, 译文, 服务, 模型)
+        """
+        with self.lock:
+            rows = self._conn.execute(
+                "SELECT units, result, service, model FROM chunks WHERE job_id=? ORDER BY idx",
+                (job_id,)).fetchall()
+        return [(json.loads(row["units"]), row["result"], row["service"], row["model"])
+                for row in rows]
+
+    def remove_job(self, job_id):
+        """删除已写出的手册页及其块"""
+        def remove(conn):
+            conn.execute("DELETE FROM chunks WHERE job_id=?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+        self._transaction(remove)
+
+    def status(self):
+        """
+        Returns:
+            dict: 各状态的块数、手册页数和持有租约的 worker
+        """
+        with self.lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM chunks GROUP BY status").fetchall())
+            jobs = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            workers = self._conn.execute(
+                "SELECT owner, COUNT(*) FROM chunks WHERE status=? AND lease_expires>=? "
+                "GROUP BY owner ORDER BY owner", (LEASED, time.time())).fetchall()
+            failed = self._conn.execute(
+                "SELECT jobs.output_path, chunks.idx, chunks.error FROM chunks "
+                "JOIN jobs ON jobs.id = chunks.job_id WHERE chunks.status=? "
+                "ORDER BY chunks.id LIMIT 20", (FAILED,)).fetchall()
+        return {
+            "jobs": jobs,
+            "chunks": {status: counts.get(status, 0) for status in (PENDING, LEASED, DONE, FAILED)},
+            "workers": {owner: count for owner, count in workers},
+            "failed": [tuple(row) for row in failed],
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self._conn.close()
+
+
+def default_queue_path():
+    """
+    获取工作队列数据库路径（环境变量 MANZH_QUEUE 优先，否则为数据目录下的 work_queue.db）
+
+    Returns:
+        str: 数据库路径
+    """
+    return os.environ.get("MANZH_QUEUE") or os.path.join(get_data_dir(), QUEUE_NAME)
+
+
+def enqueue_pages(queue, pages, config, output_dir, incremental=True):
+    """
+    拆分手册页并加入队列，已有译文时只加入新增或修改的段落
+
+    Args:
+        queue: WorkQueue
+        pages: ManPage 列表
+        config: 决定块大小的服务配置
+        output_dir: 译文保存目录
+        incremental: 是否与已有译文的记录对比
+
+    Returns:
+        tuple: (加入的手册页数, 需要翻译的块数)
+    """
+    chunk_size = chunk_token_budget(config)
+    added = 0
+    chunks = 0
+    for page in pages:
+        try:
+            content = page.loader()
+            page_queue = TranslationQueue(chunk_size=chunk_size, show_progress=False,
+                                          size_func=estimate_tokens)
+            units = page_queue.split_units(content)
+            output_path = page_output_path(page, output_dir)
+            previous = (load_sidecar(output_path, config, page_queue.content_format)
+                        if incremental else [])
+            plan = [(segment_units, page_queue.join_units(segment_units), translation)
+                    for segment_units, translation
+                    in plan_segments(units, previous, page_queue.group_units)]
+            if not queue.add_job(config, output_path, page.source_path,
+                                 page_queue.content_format, page_queue.separator, plan):
+                print(f"跳过 {page}：已在队列中", file=sys.stderr)
+                continue
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"跳过 {page}：{str(e)}", file=sys.stderr)
+            continue
+        added += 1
+        chunks += sum(1 for _, _, translation in plan if translation is None)
+    return added, chunks
+
+
+def worker_id():
+    """
+    Returns:
+        str: 当前 worker 的标识（主机名:进程号）
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(queue, config, max_workers=None, lease=DEFAULT_LEASE,
+               max_attempts=DEFAULT_MAX_ATTEMPTS, metrics=None):
+    """
+    领取并翻译队列中的块，直至队列中没有未完成的块
+
+    领取的块数不超过线程数，完成一块即补领一块；后台线程定期为正在翻译的块续约。
+    其他 worker 仍在翻译时继续等待，它们的租约过期后接手剩余的块。
+
+    Args:
+        queue: WorkQueue
+        config: 本 worker 使用的服务配置
+        max_workers: 线程数，默认为服务的最大并发数
+        lease: 租约时长（秒）
+        max_attempts: 每个块最多被领取的次数
+        metrics: 可选的运行指标（RunMetrics）
+
+    Returns:
+        dict: 本 worker 完成和失败的块数
+
+    Raises:
+        ValueError: 当服务的目标语言与队列不一致时
+    """
+    language = queue.meta().get("language")
+    if language is not None and language != config.get('language', ''):
+        raise ValueError(f"服务的目标语言与队列不一致（队列为 {language}）")
+
+    owner = worker_id()
+    if max_workers is None:
+        # 实际并发由服务调度器自适应控制，线程数取其上限
+        max_workers = get_service_scheduler(config).max_concurrency
+    service = get_translation_service(config)
+    cache = SingleFlightCache()
+    memory = create_translation_memory()
+    chunk_size = chunk_token_budget(config)
+    inflight = {}  # future -> 块 ID
+    inflight_lock = threading.Lock()
+    stats = {"done": 0, "failed": 0}
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(lease / 3):
+            with inflight_lock:
+                chunk_ids = list(inflight.values())
+            try:
+                queue.renew(owner, chunk_ids, lease)
+            except sqlite3.Error as e:
+                print(f"\n警告：续约失败：{str(e)}", file=sys.stderr)
+
+    def translate_chunk(chunk_id, content, content_format):
+        # 每个块使用独立的翻译队列：连续失败的计数不会在长时间运行的 worker 中累积
+        chunk_queue = TranslationQueue(chunk_size=chunk_size, max_retries=3, memory=memory,
+                                       cache=cache, show_progress=False,
+                                       size_func=estimate_tokens,
+                                       result_handler=lambda i, result:
+                                           queue.complete(i, result, config))
+        chunk_queue.content_format = content_format
+        chunk_queue.separator = '\n' if content_format == 'roff' else '\n\n'
+        chunk_queue.total_chunks = 1
+        chunk_queue.metrics = metrics
+        return translate_worker((chunk_id, content), config, chunk_queue, service,
+                                submitted_at=time.monotonic())
+
+    renewer = threading.Thread(target=heartbeat, daemon=True)
+    renewer.start()
+    print(f"worker {owner} 使用 {max_workers} 个线程领取任务...", file=sys.stderr)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                free = max_workers - len(inflight)
+                if free > 0:
+                    for chunk_id, content, content_format in queue.claim(
+                            owner, free, lease, max_attempts):
+                        future = executor.submit(translate_chunk, chunk_id, content,
+                                                 content_format)
+                        with inflight_lock:
+                            inflight[future] = chunk_id
+                if not inflight:
+                    if not queue.unfinished():
+                        break
+                    # 其余块由其他 worker 持有，等待完成或租约过期
+                    time.sleep(POLL_INTERVAL)
+                    continue
+
+                done, _ = wait(list(inflight), timeout=POLL_INTERVAL,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    with inflight_lock:
+                        chunk_id = inflight.pop(future)
+                    try:
+                        ok = future.result()
+                        error = "翻译失败"
+                    except Exception as e:
+                        ok = False
+                        error = str(e)
+                    if ok:
+                        stats["done"] += 1
+                    else:
+                        stats["failed"] += 1
+                        queue.fail(chunk_id, owner, error, max_attempts)
+                    print(f"\rworker {owner}：完成 {stats['done']} 块，失败 {stats['failed']} 块",
+                          end="", file=sys.stderr)
+    finally:
+        stop.set()
+        # 被中断时把尚未完成的块放回队列，无需等待租约过期
+        queue.release(owner)
+        if memory is not None:
+            memory.close()
+        print(file=sys.stderr)
+    return stats
+
+
+def collect(queue):
+    """
+    写出全部块都已完成的手册页（压缩后原子替换），并保存增量翻译记录和译文清单，
+    全部写出后更新一次 man 索引
+
+    Returns:
+        int: 写出的手册页数
+    """
+    meta = queue.meta()
+    manifest = create_translation_manifest()
+    installer = create_man_installer(manifest)
+    written = 0
+    try:
+        for job in queue.completed_jobs():
+            chunks = queue.job_chunks(job["id"])
+            output_path = job["output_path"]
+            try:
+                output_path = installer.install(output_path, job["separator"].join(
+                    result for _, result, _, _ in chunks) + "\n")
+                # 增量翻译记录使用加入队列时的服务字段，下次加入队列时按相同字段对比
+                save_sidecar(output_path, meta, job["content_format"],
+                             [(units, result) for units, result, _, _ in chunks])
+            except OSError as e:
+                print(f"写出 {output_path} 失败：{str(e)}", file=sys.stderr)
+                continue
+            # 译文清单记录实际完成翻译的服务（复用已有译文的块不计入）
+            services = sorted({service for _, _, service, _ in chunks if service})
+            models = sorted({model for _, _, _, model in chunks if model})
+            record_manifest(manifest, output_path, job["source_path"],
+                            dict(meta, service="+".join(services) or meta.get("service", ""),
+                                 model="+".join(models) or meta.get("model", "")),
+                            job["chunks"])
+            queue.remove_job(job["id"])
+            written += 1
+            print(f"已保存：{output_path}", file=sys.stderr)
+    finally:
+        installer.close()
+        if manifest is not None:
+            manifest.close()
+    return written
+
+
+def show_status(queue):
+    """显示队列进度"""
+    info = queue.status()
+    chunks = info["chunks"]
+    total = sum(chunks.values())
+    print(f"手册页：{info['jobs']}（已写出的手册页不再计入）")
+    print(f"内容块：共 {total}，待领取 {chunks[PENDING]}，翻译中 {chunks[LEASED]}，"
+          f"已完成 {chunks[DONE]}，失败 {chunks[FAILED]}")
+    for owner, count in info["workers"].items():
+        print(f"  worker {owner}：正在翻译 {count} 块")
+    for output_path, index, error in info["failed"]:
+        print(f"  失败：{output_path} 第 {index + 1} 块：{error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ManZH 持久化工作队列")
+    parser.add_argument("--queue", help="队列数据库路径（默认为环境变量 MANZH_QUEUE 或数据目录下的 "
+                                        "work_queue.db；多台机器共享时放在共享目录中）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = subparsers.add_parser("enqueue", help="把手册页拆分为块加入队列")
+    source = enqueue.add_mutually_exclusive_group(required=True)
+    source.add_argument("commands", nargs="*", default=[], help="要翻译的命令名称列表")
+    source.add_argument("-s", "--section", help="加入 MANPATH 中指定章节的全部手册页")
+    source.add_argument("-d", "--dir", help="加入目录中的 roff 源文件")
+    enqueue.add_argument("-o", "--output-dir", default=TRANSLATED_DIR, help="译文保存目录")
+    enqueue.add_argument("--service", help="决定块大小的翻译服务（默认使用 default_service）")
+    enqueue.add_argument("--no-incremental", action="store_true",
+                         help="忽略已有译文的记录，完整重新翻译")
+
+    work = subparsers.add_parser("work", help="领取并翻译队列中的块")
+    work.add_argument("--service", help="本 worker 使用的翻译服务（默认使用 default_service）")
+    work.add_argument("-j", "--workers", type=int,
+                      help="线程数（默认使用服务配置的 max_concurrency）")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE,
+                      help=f"租约时长（秒，默认 {DEFAULT_LEASE}）")
+    work.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                      help=f"每个块最多被领取的次数（默认 {DEFAULT_MAX_ATTEMPTS}）")
+    work.add_argument("--metrics", metavar="FILE",
+                      help="将每个块的耗时、重试和 token 用量追加到 JSON Lines 文件")
+
+    subparsers.add_parser("collect", help="写出全部块都已完成的手册页")
+    subparsers.add_parser("status", help="查看队列进度")
+    subparsers.add_parser("retry", help="把失败的块放回队列")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue or default_queue_path())
+    try:
+        if args.command == "enqueue":
+            if args.section:
+                pages = pages_from_section(args.section)
+            elif args.dir:
+                pages = pages_from_directory(args.dir)
+            else:
+                pages = pages_from_commands(args.commands)
+            config = load_config(service_name=args.service)
+            try:
+                added, chunks = enqueue_pages(queue, pages, config, args.output_dir,
+                                              incremental=not args.no_incremental)
+            except ValueError as e:
+                print(f"错误：{str(e)}", file=sys.stderr)
+                sys.exit(1)
+            print(f"已加入 {added} 个手册页，{chunks} 个块需要翻译", file=sys.stderr)
+        elif args.command == "work":
+            config = load_config(service_name=args.service)
+            metrics = create_run_metrics(config, mode="worker", path=args.metrics)
+            try:
+                stats = run_worker(queue, config, max_workers=args.workers, lease=args.lease,
+                                   max_attempts=args.max_attempts, metrics=metrics)
+            except ValueError as e:
+                print(f"错误：{str(e)}", file=sys.stderr)
+                sys.exit(1)
+            finally:
+                write_run_metrics(metrics)
+            print(f"本 worker 完成 {stats['done']} 块，失败 {stats['failed']} 块", file=sys.stderr)
+        elif args.command == "collect":
+            print(f"写出 {collect(queue)} 个手册页", file=sys.stderr)
+        elif args.command == "status":
+            show_status(queue)
+        elif args.command == "retry":
+            print(f"已把 {queue.retry_failed()} 个失败的块放回队列", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("\n已中断", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()